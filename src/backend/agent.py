@@ -1,108 +1,58 @@
 import os
 import json
+import time
+import asyncio
 import logging
-from typing import List, Dict, Any
-from openai import OpenAI
-from tools import (
-    roll_dice, get_room_details, get_character_data, update_character_data, 
-    rules_lookup, get_monster_stats, move_character
+import weakref
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+from executor import run_blocking
+from tools import roll_dice, get_room_details, find_character_id, room_monster_state
+from tool_registry import TOOL_REGISTRY, TOOLS, PURE, READ_ONLY, MUTATING, prefix_hash
+from turn_state import TurnState
+from dice import DiceRoller, roller_for
+from tracing import span, add_to_span
+from command_router import (
+    COMMAND_ROUTER, READS_DB, match_command, resolve_command, record_routed, record_fallthrough, record_llm_turn
 )
+from game_response import NarrationStream, RAW, RAW_TEXT_NOTE, parse_game_response, parse_stats, response_format
 
-logger = logging.getLogger(__name__)
-from dotenv import load_dotenv
+from content_cache import content_cache
+from response_cache import response_cache
+from context_builder import build_turn_messages, compact_tool_result, count_message_tokens
+# Every LLM call goes through the gateway (admission control, priority queue, retries)
+from llm_gateway import classify_priority, gateway
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 MODEL_NAME = os.getenv("LLM_MODEL", "gpt-4o")
 
-# Tool Schemas for OpenAI
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "roll_dice",
-            "description": "Roll dice using standard notation (e.g. 1d20+3).",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "notation": {"type": "string", "description": "Dice notation e.g. 1d20+5"},
-                    "reason": {"type": "string", "description": "Reason for the roll"}
-                },
-                "required": ["notation"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_room_details",
-            "description": "Get details about a specific room.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "room_key": {"type": "string", "description": "The unique key of the room e.g. room_1"}
-                },
-                "required": ["room_key"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "rules_lookup",
-            "description": "Lookup a D&D 5e rule.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "topic": {"type": "string", "description": "The rule topic to search for"}
-                },
-                "required": ["topic"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "update_character_data",
-            "description": "Update character stats (HP, Gold, Inventory).",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "character_name": {"type": "string"},
-                    "changes": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "field": {"type": "string", "enum": ["hp", "gold"]},
-                                "operation": {"type": "string", "enum": ["increment", "decrement", "set"]},
-                                "value": {"type": "integer"}
-                            },
-                            "required": ["field", "operation", "value"]
-                        }
-                    }
-                },
-                "required": ["character_name", "changes"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "move_character",
-            "description": "Move the character to a different room via a known exit.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "character_name": {"type": "string"},
-                    "room_key": {"type": "string", "description": "Target room key (e.g. room_2)"}
-                },
-                "required": ["character_name", "room_key"]
-            }
-        }
-    }
-]
+# Turn mode, selectable per deployment:
+#   two_call    - tool-selection call, then a JSON follow-up after any tool use
+#   single_call - prefetch the current room and a few dice rolls into the prompt
+#                 and ask for the final JSON in the first call; falls back to the
+#                 two-call path only if the model still calls a tool
+TURN_MODE = os.getenv("TURN_MODE", "two_call")
+SINGLE_CALL = TURN_MODE == "single_call"
+PREROLLED_D20S = int(os.getenv("PREROLLED_D20S", "3"))
+
+# How turns were resolved, for verifying the fast path
+turn_stats = {"turns": 0, "single_call": 0, "two_call": 0, "fast_path_fallbacks": 0}
+
+# One lock per character: turns for the same character run one at a time so
+# their state changes never interleave, while other characters and sessions
+# proceed in parallel. Locks are keyed on the character row the request
+# resolves to, so a request with and one without an adventure_id still share
+# it. Locks are dropped once no turn holds or awaits them.
+_character_locks: "weakref.WeakValueDictionary[Any, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+async def character_lock(character_name: str, adventure_id: Optional[int] = None) -> asyncio.Lock:
+    character_id = await run_blocking(find_character_id, character_name, adventure_id)
+    # An unknown character's turn only reports it missing; the request is key enough
+    key = character_id if character_id is not None else (adventure_id, character_name)
+    lock = _character_locks.get(key)
+    if lock is None:
+        lock = _character_locks[key] = asyncio.Lock()
+    return lock
 
 SYSTEM_PROMPT = """
 You are the Dungeon Master (DM) for a solo D&D 5e adventure called 'The Wailing Glacier'.
@@ -113,12 +63,17 @@ GUIDELINES:
 2. **Use Tools**:
     - Use `get_room_details` when the player enters a new room or asks for details.
     - Use `rules_lookup` if you are unsure about a mechanic.
+    - Use `get_monster_stats` for a monster's AC, HP and attacks before resolving combat.
     - Use `roll_dice` for ANY outcome that is uncertain (attacks, checks, saves).
     - Use `update_character_data` to track HP changes, gold, etc.
+    - Use `move_character` to move through an exit of the current room, one room at a time; `find_path` plans longer routes.
+    - Use `set_flags` to record world state (doors opened, traps sprung, quest steps) instead of restating it in narration, and `get_flags` to read flags not shown in the context. Prefix a room's flags with its key, e.g. room_2.ward_broken.
 3. **Response Format**:
     - Provide a JSON response with:
         - `narration`: The story text to show the user.
         - `out_of_character`: (Optional) Mechanics logic explaining what happened (e.g. "Rolled 15 vs DC 12, Success").
+        - `dice_rolls`: The rolls this turn, each with `purpose`, `notation`, `result` and (for checks) `dc` and `success`.
+        - `next_prompt_suggestion`: (Optional) A short hint at what the player might do next.
     - DO NOT output plain text outside the JSON.
 
 4. **Game State**:
@@ -126,114 +81,561 @@ GUIDELINES:
     - If the player hits 0 HP, they are unconscious (death saves).
 
 Remember: You are the interface to the world.
-"""
+""".strip()
 
-def process_player_action(player_input: str, character_name: str, session_history: List[Dict]) -> Dict[str, Any]:
+# The static request prefix: system prompt first, then the tool schemas
+# (built once by tool_registry). Everything per-turn comes after it, so the
+# provider's prompt cache can reuse the prefix across turns and sessions.
+PROMPT_PREFIX_HASH = prefix_hash(SYSTEM_PROMPT)
+
+# Provider prompt-cache effectiveness, per LLM request
+prompt_cache_stats = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+
+def execute_tool(function_name: str, function_args: Dict[str, Any], turn: Optional[TurnState] = None) -> str:
     """
-    Main loop to process a turn.
+    Run a single tool call synchronously and return its JSON-encoded result.
+
+    Mutating calls on the character taking the turn, and flag reads and
+    writes, go to `turn` in memory (TurnState implements those tools under
+    the same names); it is written back once, when the turn ends.
+    """
+    spec = TOOL_REGISTRY.get(function_name)
+    if spec is None:
+        return json.dumps({"error": f"Unknown tool: {function_name}"})
+    func = spec.func
+    if spec.seeded and turn is not None:
+        function_args = {**function_args, "rng": turn.dice}
+    if spec.scoped:
+        # Tools only ever see the adventure of the character taking the turn
+        function_args = {**function_args, "adventure_id": turn.adventure_id if turn else None}
+        if turn is not None and (spec.per_turn or (spec.kind == MUTATING and turn.owns(function_args.get("character_name")))):
+            func = getattr(turn, function_name)
+
+    try:
+        return json.dumps(func(**function_args))
+    except Exception as e:
+        logger.error(f"Tool execution failed: {e}")
+        return json.dumps({"error": str(e)})
+
+def prefetch_context(char_data: Dict[str, Any], dice: Optional[DiceRoller] = None) -> Optional[str]:
+    """
+    Results of the cheap deterministic tools, resolved before the first call:
+    the current room (with exits and live monsters) and pre-rolled d20s.
+    """
+    if "error" in char_data:
+        return None
+    room = content_cache.get_room_by_id(char_data.get("location_room_id"))
+    if not room:
+        return None
+    details = get_room_details(room['room_key'], room['adventure_id'])
+    rolls = [roll_dice("1d20", rng=dice)["total"] for _ in range(PREROLLED_D20S)]
+    return (
+        f"Current room (prefetched, no need to call get_room_details for it): "
+        f"{json.dumps(details, separators=(',', ':'), ensure_ascii=False)}\n"
+        f"Pre-rolled d20s: {rolls}. Use them in order for checks, attacks and saves "
+        f"(add modifiers yourself) instead of calling roll_dice. "
+        f"Call other tools only if the action changes game state. "
+        f"Otherwise reply directly with the final JSON."
+    )
+
+def _load_turn_context(character_name: str, adventure_id: Optional[int],
+                       session_id: Optional[str]) -> Tuple[TurnState, Optional[str]]:
+    turn = TurnState.load(character_name, adventure_id, roller_for(session_id or character_name))
+    return turn, prefetch_context(turn.character, turn.dice) if SINGLE_CALL else None
+
+async def load_turn_context(character_name: str, adventure_id: Optional[int] = None,
+                            session_id: Optional[str] = None) -> Tuple[TurnState, Optional[str]]:
+    """The turn's unit of work (and prefetched tool results in single_call mode), off the event loop."""
+    with span("context"):
+        return await run_blocking(_load_turn_context, character_name, adventure_id, session_id)
+
+async def finish_turn(turn: TurnState) -> None:
+    """Write back what the turn changed (one UPDATE, only if anything did)."""
+    if turn.dirty:
+        with span("flush"):
+            await run_blocking(turn.flush)
+
+def turn_snapshot(turn: TurnState) -> Dict[str, Any]:
+    with span("snapshot"):
+        return turn.snapshot()
+
+async def route_turn(player_input: str, turn: TurnState) -> Optional[Dict[str, Any]]:
+    """Resolve a mechanical command locally (see command_router); None when the turn needs the LLM."""
+    if not COMMAND_ROUTER:
+        return None
+    started = time.perf_counter()
+    with span("route") as route_span:
+        command = match_command(player_input)
+        result = None
+        if command is not None:
+            if command.intent in READS_DB:
+                result = await run_blocking(resolve_command, command, turn)
+            else:
+                result = resolve_command(command, turn)
+        if route_span is not None:
+            route_span.attrs["outcome"] = command.intent if result is not None else "llm"
+    if result is None:
+        record_fallthrough()
+        return None
+    record_routed(command.intent, time.perf_counter() - started)
+    logger.info(f"Routed '{player_input}' for {turn.character_name} locally as {command.intent}")
+    return result
+
+def build_messages(player_input: str, character_name: str, session_history: List[Dict],
+                   char_data: Dict[str, Any], prefetched: Optional[str],
+                   flags: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict], Dict[str, int]]:
+    """Assemble the prompt for the first LLM call of a turn, within the token budget."""
+    with span("prompt"):
+        messages, stats = build_turn_messages(SYSTEM_PROMPT, character_name, char_data, player_input, session_history,
+                                              flags=flags)
+    if prefetched:
+        messages.insert(len(messages) - 1, {"role": "system", "content": prefetched})
+    return messages, stats
+
+def failed_turn(narration: str, detail: str) -> Dict[str, Any]:
+    """Result of a turn the LLM could not complete; `failed` keeps it out of the session history and story log."""
+    return {"narration": narration, "out_of_character": detail, "failed": True}
+
+async def cache_lookup(player_input: str, char_data: Dict[str, Any],
+                       flags: Optional[Dict[str, Any]] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """(cache key, cached response) for this turn; key is None when caching is off."""
+    if not response_cache.enabled or "error" in char_data:
+        return None, None
+    with span("cache_lookup"):
+        return await run_blocking(_cached_response, player_input, char_data, flags)
+
+def _cached_response(player_input: str, char_data: Dict[str, Any],
+                     flags: Optional[Dict[str, Any]]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    # Live monster HP/status is not in the character row, so it is read here
+    monsters = room_monster_state(char_data.get("location_room_id"))
+    key = response_cache.key_for(player_input, char_data, MODEL_NAME, flags=flags, prompt=PROMPT_PREFIX_HASH,
+                                 monsters=monsters)
+    return key, response_cache.get(key)
+
+async def cache_store(key: Optional[str], tool_names: List[str], result: Dict[str, Any]) -> None:
+    """
+    Cache a finished turn unless it had side effects. Only turns that used no
+    tools or read-only lookups qualify; dice (including the pre-rolled ones in
+    single_call mode) and state changes always bypass.
+    """
+    if key is None:
+        return
+    side_effects = SINGLE_CALL or any(
+        name not in TOOL_REGISTRY or TOOL_REGISTRY[name].kind != READ_ONLY for name in tool_names
+    )
+    if side_effects or result.get("out_of_character") == RAW_TEXT_NOTE:
+        response_cache.bypass()
+        return
+    await run_blocking(response_cache.put, key, result)
+
+# Re-ask the model when even the local repair cannot read its reply (non-streaming turns only)
+PARSE_RETRIES = int(os.getenv("PARSE_RETRIES", "0"))
+RETRY_PROMPT = "Your last reply was not valid JSON. Reply again with only the JSON object in the required format."
+
+def record_turn_path(used_tools: bool) -> None:
+    turn_stats["turns"] += 1
+    if used_tools:
+        turn_stats["two_call"] += 1
+        if SINGLE_CALL:
+            turn_stats["fast_path_fallbacks"] += 1
+    else:
+        turn_stats["single_call"] += 1
+
+def record_usage(usage: Any) -> Optional[int]:
+    """Prompt tokens reported by the provider, if any; also counts the cached share."""
+    if usage is None:
+        return None
+    prompt = getattr(usage, "prompt_tokens", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    if prompt:
+        prompt_cache_stats["requests"] += 1
+        prompt_cache_stats["prompt_tokens"] += prompt
+        prompt_cache_stats["cached_tokens"] += cached
+        add_to_span(prompt_tokens=prompt, cached_tokens=cached,
+                    completion_tokens=getattr(usage, "completion_tokens", None) or 0)
+    return prompt
+
+def cached_token_ratio() -> float:
+    """Share of all prompt tokens so far that the provider served from its prompt cache."""
+    total = prompt_cache_stats["prompt_tokens"]
+    return prompt_cache_stats["cached_tokens"] / total if total else 0.0
+
+def log_turn_tokens(character_name: str, stats: Dict[str, int], prompt_tokens: List[Optional[int]], follow_up_estimate: Optional[int] = None) -> None:
+    logger.info(
+        f"Turn tokens for {character_name}: estimated={stats['total']} "
+        f"(fixed={stats['fixed']}, history={stats['history']} in {stats['history_messages']} msgs, recap={stats['recap']}), "
+        f"follow_up_estimated={follow_up_estimate}, provider_prompt_tokens={prompt_tokens}"
+    )
+
+async def run_tool_call(tool_call_id: str, function_name: str, arguments: str,
+                        turn: Optional[TurnState] = None) -> Dict[str, Any]:
+    """Execute one tool call and wrap it as a `tool` message."""
+    try:
+        function_args = json.loads(arguments or "{}")
+    except json.JSONDecodeError as e:
+        function_args = None
+        tool_result = json.dumps({"error": f"Invalid tool arguments: {e}"})
+
+    if function_args is not None:
+        logger.info(f"Executing tool: {function_name} with args {function_args}")
+        spec = TOOL_REGISTRY.get(function_name)
+        # Names come from the model; keep unknown ones out of the metric labels
+        with span("tool", tool=function_name if spec is not None else "unknown"):
+            if spec is not None and spec.kind == PURE:
+                tool_result = execute_tool(function_name, function_args, turn)
+            else:
+                tool_result = await run_blocking(execute_tool, function_name, function_args, turn)
+
+    return {
+        "role": "tool",
+        "tool_call_id": tool_call_id,
+        "name": function_name,
+        "content": compact_tool_result(tool_result)
+    }
+
+def _mutation_key(function_name: str, arguments: str) -> Optional[str]:
+    """Serialization key for a mutating call (the character it touches), else None."""
+    spec = TOOL_REGISTRY.get(function_name)
+    if spec is None or spec.kind != MUTATING:
+        return None
+    try:
+        return str(json.loads(arguments or "{}").get("character_name", ""))
+    except (json.JSONDecodeError, AttributeError):
+        return ""
+
+def dispatch_tool_calls(calls: List[Tuple[str, str, str]], turn: Optional[TurnState] = None) -> List["asyncio.Task"]:
     """
-    
-    # 1. Fetch Context
-    char_data = get_character_data(character_name)
-    current_room_key = "room_1" # Default fallback
-    if isinstance(char_data, dict) and "location_room_id" in char_data:
-        # We need to map ID to Key. For MVP, let's just cheat and query room details by ID? 
-        # Or better, just get current room details here. 
-        # I'll rely on the agent to call get_room_details based on context or history, 
-        # BUT providing it in the prompt is better.
-        pass
-
-    context_message = f"""
-    Current Character State: {json.dumps(char_data)}
-    Player Input: "{player_input}"
+    Start all tool calls of one LLM turn concurrently.
+
+    `calls` is a list of (tool_call_id, function_name, arguments); scoped tools
+    run against the adventure (and unit of work) of `turn`. Pure and
+    read-only calls start immediately; mutating calls on the same character run
+    one after another in the order the model issued them. Returns one task per
+    call, in the original order, each resolving to the `tool` message.
     """
+    tails: Dict[str, asyncio.Task] = {}
+    tasks = []
+
+    for call_id, function_name, arguments in calls:
+        key = _mutation_key(function_name, arguments)
+        previous = tails.get(key) if key is not None else None
+
+        async def run(call_id=call_id, function_name=function_name, arguments=arguments, previous=previous):
+            if previous is not None:
+                await asyncio.wait([previous])
+            return await run_tool_call(call_id, function_name, arguments, turn)
+
+        task = asyncio.ensure_future(run())
+        if key is not None:
+            tails[key] = task
+        tasks.append(task)
+
+    return tasks
 
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
+def parse_reply(final_content: Optional[str]) -> Tuple[Dict[str, Any], str]:
+    """Validate the model's final reply (repairing it locally if needed); returns (result, outcome)."""
+    with span("parse") as parse_span:
+        result, outcome = parse_game_response(final_content)
+        if parse_span is not None:
+            parse_span.attrs["outcome"] = outcome
+    return result, outcome
+
+async def retry_reply(messages: List[Dict], final_content: str, prompt_tokens: List[Optional[int]],
+                      priority: int) -> Optional[str]:
+    """Ask the model once more for a reply that parses; None if the call fails."""
+    parse_stats["retries"] += 1
+    messages = messages + [
+        {"role": "assistant", "content": final_content},
+        {"role": "user", "content": RETRY_PROMPT},
     ]
-    
-    # Add history (last 5 turns)
-    messages.extend(session_history[-5:])
-    
-    messages.append({"role": "user", "content": context_message})
+    try:
+        with span("llm_retry"):
+            response = await gateway.create(
+                priority=priority,
+                model=MODEL_NAME,
+                messages=messages,
+                tools=TOOLS,
+                tool_choice="none",
+                **response_format()
+            )
+            prompt_tokens.append(record_usage(response.usage))
+            return response.choices[0].message.content
+    except Exception as e:
+        logger.error(f"LLM Retry Error: {e}")
+        return None
+
+async def process_player_action(player_input: str, character_name: str, session_history: List[Dict],
+                                adventure_id: Optional[int] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Main loop to process a turn.
+
+    `adventure_id` picks the character when the same name exists in several
+    adventures; turns for one character are serialized. Dice come from the
+    session's roller (`session_id`, default the character name). The result
+    carries the character's state after the turn as `updated_state`.
+    """
+    with span("turn", character=character_name, mode=TURN_MODE):
+        with span("lock_wait"):
+            lock = await character_lock(character_name, adventure_id)
+            await lock.acquire()
+        try:
+            # 1. Fetch Context
+            turn, prefetched = await load_turn_context(character_name, adventure_id, session_id)
+            try:
+                result = await route_turn(player_input, turn)
+                if result is None:
+                    result = await _process_player_action(player_input, character_name, session_history, turn, prefetched)
+            finally:
+                await finish_turn(turn)
+            return {**result, "updated_state": turn_snapshot(turn)}
+        finally:
+            lock.release()
+
+async def _process_player_action(player_input: str, character_name: str, session_history: List[Dict],
+                                 turn: TurnState, prefetched: Optional[str]) -> Dict[str, Any]:
+    char_data = turn.character
+    flags = turn.relevant_flags()
+    cache_key, cached = await cache_lookup(player_input, char_data, flags)
+    if cached is not None:
+        logger.info(f"Response cache hit for {character_name}: {player_input}")
+        return cached
+
+    started = time.perf_counter()
+    messages, stats = build_messages(player_input, character_name, session_history, char_data, prefetched, flags)
+    priority = classify_priority(player_input)
+    prompt_tokens = []
+    follow_up_estimate = None
+    tool_names: List[str] = []
 
     logger.info(f"Processing action for {character_name}: {player_input}")
 
     # 2. LLM Call
     try:
-        logger.info("Sending request to LLM...")
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=messages,
-            tools=TOOLS,
-            tool_choice="auto"
-        )
-        logger.info("Received response from LLM.")
+        with span("llm_1"):
+            response = await gateway.create(
+                priority=priority,
+                model=MODEL_NAME,
+                messages=messages,
+                tools=TOOLS,
+                tool_choice="auto",
+                **response_format()
+            )
+            prompt_tokens.append(record_usage(response.usage))
     except Exception as e:
         logger.error(f"LLM Error: {e}")
-        return {"narration": "Error connecting to AI brain.", "out_of_character": str(e)}
+        return failed_turn("Error connecting to AI brain.", str(e))
 
     response_message = response.choices[0].message
     tool_calls = response_message.tool_calls
+    record_turn_path(bool(tool_calls))
 
     # 3. Handle Tool Calls
     if tool_calls:
         logger.info(f"LLM requested {len(tool_calls)} tools.")
         messages.append(response_message)
+        tool_names = [tc.function.name for tc in tool_calls]
         
-        for tool_call in tool_calls:
-            function_name = tool_call.function.name
-            function_args = json.loads(tool_call.function.arguments)
-            logger.info(f"Executing tool: {function_name} with args {function_args}")
-            
-            tool_result = "{}"
-            
-            try:
-                if function_name == "roll_dice":
-                    tool_result = json.dumps(roll_dice(**function_args))
-                elif function_name == "get_room_details":
-                    tool_result = json.dumps(get_room_details(**function_args))
-                elif function_name == "rules_lookup":
-                    tool_result = json.dumps(rules_lookup(**function_args))
-                elif function_name == "update_character_data":
-                    tool_result = json.dumps(update_character_data(**function_args))
-                elif function_name == "move_character":
-                    tool_result = json.dumps(move_character(**function_args))
-            except Exception as e:
-                logger.error(f"Tool execution failed: {e}")
-                tool_result = json.dumps({"error": str(e)})
-
-            messages.append({
-                "role": "tool",
-                "tool_call_id": tool_call.id,
-                "name": function_name,
-                "content": tool_result
-            })
+        tasks = dispatch_tool_calls([
+            (tc.id, tc.function.name, tc.function.arguments) for tc in tool_calls
+        ], turn)
+        messages.extend(await asyncio.gather(*tasks))
         
         # 4. Final Response after tools
-        logger.info("Sending follow-up request to LLM with tool outputs...")
+        follow_up_estimate = count_message_tokens(messages)
         try:
-            final_response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=messages,
-                response_format={ "type": "json_object" } # Ensure JSON output
-            )
-            final_content = final_response.choices[0].message.content
+            with span("llm_2"):
+                final_response = await gateway.create(
+                    priority=priority,
+                    model=MODEL_NAME,
+                    messages=messages,
+                    # Same tools as the first call so the cached prefix matches; none may be called now
+                    tools=TOOLS,
+                    tool_choice="none",
+                    **response_format()
+                )
+                final_content = final_response.choices[0].message.content
+                prompt_tokens.append(record_usage(final_response.usage))
         except Exception as e:
             logger.error(f"LLM Follow-up Error: {e}")
-            return {"narration": "The DM struggles to describe the outcome.", "out_of_character": f"Follow-up Error: {str(e)}"}
+            return failed_turn("The DM struggles to describe the outcome.", f"Follow-up Error: {str(e)}")
     else:
         logger.info("No tools called. Using direct response.")
         final_content = response_message.content
 
-    logger.info(f"Final LLM content: {final_content}")
+    log_turn_tokens(character_name, stats, prompt_tokens, follow_up_estimate)
+    logger.debug(f"Final LLM content: {final_content}")
 
     # Parse JSON output
+    result, outcome = parse_reply(final_content)
+    for _ in range(PARSE_RETRIES):
+        if outcome != RAW:
+            break
+        retried = await retry_reply(messages, final_content, prompt_tokens, priority)
+        if retried is None:
+            break
+        final_content = retried
+        result, outcome = parse_reply(final_content)
+    record_llm_turn(time.perf_counter() - started)
+    await cache_store(cache_key, tool_names, result)
+    return result
+
+async def stream_player_action(player_input: str, character_name: str, session_history: List[Dict],
+                               adventure_id: Optional[int] = None,
+                               session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of `process_player_action`.
+
+    Yields events as the turn progresses:
+      - {"event": "tool_call", "data": {"name", "arguments"}}
+      - {"event": "tool_result", "data": {"name", "result"}}
+      - {"event": "narration", "data": {"delta"}}   (narration tokens as they arrive)
+      - {"event": "final", "data": {"narration", "out_of_character", "updated_state"}}
+    """
+    with span("turn", character=character_name, mode=TURN_MODE, stream=True):
+        with span("lock_wait"):
+            lock = await character_lock(character_name, adventure_id)
+            await lock.acquire()
+        try:
+            turn, prefetched = await load_turn_context(character_name, adventure_id, session_id)
+            try:
+                routed = await route_turn(player_input, turn)
+                if routed is not None:
+                    events = _routed_events(routed)
+                else:
+                    events = _stream_player_action(player_input, character_name, session_history, turn, prefetched)
+                async for event in events:
+                    if event["event"] == "final":
+                        await finish_turn(turn)
+                        event = {"event": "final", "data": {**event["data"], "updated_state": turn_snapshot(turn)}}
+                    yield event
+            finally:
+                # Also covers a client that disconnects mid-turn
+                await finish_turn(turn)
+        finally:
+            lock.release()
+
+async def _routed_events(result: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    yield {"event": "narration", "data": {"delta": result["narration"]}}
+    yield {"event": "final", "data": result}
+
+async def _stream_player_action(player_input: str, character_name: str, session_history: List[Dict],
+                                turn: TurnState, prefetched: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+    char_data = turn.character
+    flags = turn.relevant_flags()
+    cache_key, cached = await cache_lookup(player_input, char_data, flags)
+    if cached is not None:
+        logger.info(f"Response cache hit for {character_name}: {player_input}")
+        yield {"event": "narration", "data": {"delta": cached.get("narration", "")}}
+        yield {"event": "final", "data": cached}
+        return
+
+    started = time.perf_counter()
+    messages, stats = build_messages(player_input, character_name, session_history, char_data, prefetched, flags)
+    priority = classify_priority(player_input)
+    logger.info(f"Streaming action for {character_name}: {player_input}")
+    prompt_tokens = []
+    follow_up_estimate = None
+
+    narration = NarrationStream()
+    content_parts = []
+    tool_calls: Dict[int, Dict[str, Any]] = {}
+
+    # 1. First call: stream narration directly, or collect tool call deltas
     try:
-        if not final_content:
-             return {"narration": "The DM is silent."}
-        return json.loads(final_content)
-    except json.JSONDecodeError:
-        logger.warning("Failed to parse JSON from LLM. Returning raw content.")
-        # Fallback if model fails to output JSON despite instructions
-        return {"narration": final_content, "out_of_character": "Model output raw text."}
+        with span("llm_1"):
+            stream = await gateway.create(
+                priority=priority,
+                model=MODEL_NAME,
+                messages=messages,
+                tools=TOOLS,
+                tool_choice="auto",
+                stream=True,
+                stream_options={"include_usage": True},
+                **response_format()
+            )
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    prompt_tokens.append(record_usage(chunk.usage))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                for tc in delta.tool_calls or []:
+                    call = tool_calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                    if tc.id:
+                        call["id"] = tc.id
+                    if tc.function and tc.function.name:
+                        call["name"] += tc.function.name
+                    if tc.function and tc.function.arguments:
+                        call["arguments"] += tc.function.arguments
+                if delta.content and not tool_calls:
+                    content_parts.append(delta.content)
+                    text = narration.feed(delta.content)
+                    if text:
+                        yield {"event": "narration", "data": {"delta": text}}
+    except Exception as e:
+        logger.error(f"LLM Error: {e}")
+        yield {"event": "final", "data": failed_turn("Error connecting to AI brain.", str(e))}
+        return
+
+    # 2. Tool phase
+    record_turn_path(bool(tool_calls))
+    if tool_calls:
+        calls = [tool_calls[i] for i in sorted(tool_calls)]
+        logger.info(f"LLM requested {len(calls)} tools.")
+        messages.append({
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+                for c in calls
+            ]
+        })
+
+        for call in calls:
+            yield {"event": "tool_call", "data": {"name": call["name"], "arguments": call["arguments"]}}
+
+        # Results are reported as they finish but fed back to the model in call order
+        tasks = dispatch_tool_calls([(c["id"], c["name"], c["arguments"]) for c in calls], turn)
+        for finished in asyncio.as_completed(tasks):
+            tool_message = await finished
+            yield {"event": "tool_result", "data": {"name": tool_message["name"], "result": tool_message["content"]}}
+        messages.extend(task.result() for task in tasks)
+
+        # 3. Follow-up call, streamed
+        narration = NarrationStream()
+        content_parts = []
+        follow_up_estimate = count_message_tokens(messages)
+        try:
+            with span("llm_2"):
+                stream = await gateway.create(
+                    priority=priority,
+                    model=MODEL_NAME,
+                    messages=messages,
+                    tools=TOOLS,
+                    tool_choice="none",
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **response_format()
+                )
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        prompt_tokens.append(record_usage(chunk.usage))
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    content_parts.append(chunk.choices[0].delta.content)
+                    text = narration.feed(chunk.choices[0].delta.content)
+                    if text:
+                        yield {"event": "narration", "data": {"delta": text}}
+        except Exception as e:
+            logger.error(f"LLM Follow-up Error: {e}")
+            yield {"event": "final", "data": failed_turn("The DM struggles to describe the outcome.", f"Follow-up Error: {str(e)}")}
+            return
+
+    final_content = "".join(content_parts)
+    log_turn_tokens(character_name, stats, prompt_tokens, follow_up_estimate)
+    logger.debug(f"Final LLM content: {final_content}")
+    result, _ = parse_reply(final_content)
+    record_llm_turn(time.perf_counter() - started)
+    await cache_store(cache_key, [c["name"] for c in tool_calls.values()], result)
+    yield {"event": "final", "data": result}
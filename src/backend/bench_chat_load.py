@@ -0,0 +1,99 @@
+"""
+Load benchmark for /chat against a local fake LLM server.
+
+Runs N concurrent player sessions (one character each) through the FastAPI
+app in-process and reports p50/p99 turn latency, plus /health latency while
+the load is running to show the event loop is not blocked.
+
+Usage: python bench_chat_load.py [--sessions 1 10 100] [--turns 5] [--latency 0.05]
+                                 [--turn-mode two_call|single_call]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from bench_utils import percentile, setup_database
+from fake_llm import FakeLLMServer
+
+
+async def run_session(http, session, turns, latencies):
+    for i in range(turns):
+        start = time.perf_counter()
+        res = await http.post("/chat", json={
+            "message": f"I look around carefully ({i})",
+            "character_name": f"Hero{session}",
+            "session_id": f"bench-{session}",
+        })
+        res.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+async def probe_health(http, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await http.get("/health")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def run_level(app, sessions, turns):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+        latencies, health = [], []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe_health(http, stop, health))
+        start = time.perf_counter()
+        await asyncio.gather(*(run_session(http, session, turns, latencies) for session in range(sessions)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+
+    return {
+        "sessions": sessions,
+        "turns": len(latencies),
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.mean(latencies),
+        "throughput": len(latencies) / elapsed,
+        "health_p99": percentile(health, 99) if health else 0.0,
+    }
+
+
+async def main(args):
+    import logging
+    logging.disable(logging.INFO)
+
+    from main import app
+    from agent import turn_stats
+    from init_db import create_test_character
+
+    # One character per session; turns of the same character are serialized
+    for session in range(max(args.sessions)):
+        create_test_character(f"Hero{session}", quiet=True)
+
+    print(f"{'sessions':>8} {'turns':>6} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'turns/s':>8} {'/health p99 ms':>15}")
+    for sessions in args.sessions:
+        r = await run_level(app, sessions, args.turns)
+        print(f"{r['sessions']:>8} {r['turns']:>6} {r['p50'] * 1000:>8.1f} {r['p99'] * 1000:>8.1f} "
+              f"{r['mean'] * 1000:>8.1f} {r['throughput']:>8.1f} {r['health_p99'] * 1000:>15.1f}")
+    print(f"turn mode {args.turn_mode}: {turn_stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency per call (s)")
+    parser.add_argument("--turn-mode", default="two_call", choices=["two_call", "single_call"])
+    args = parser.parse_args()
+
+    with FakeLLMServer(latency=args.latency) as llm:
+        os.environ["LLM_BASE_URL"] = llm.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        os.environ["TURN_MODE"] = args.turn_mode
+        setup_database()
+        asyncio.run(main(args))
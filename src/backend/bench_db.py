@@ -0,0 +1,93 @@
+"""
+Micro-benchmark of database.execute_query on the Wailing Glacier dataset.
+
+Compares the old connect-per-query behaviour against the pooled, WAL-tuned
+per-thread connections, for the query mix of a typical turn.
+
+Usage: python bench_db.py [--seconds 2] [--threads 1 4]
+"""
+import argparse
+import sqlite3
+import threading
+import time
+
+from bench_utils import setup_database
+
+
+def legacy_execute_query(query, args=(), fetch_one=False, fetch_all=False, commit=False):
+    """The original execute_query: a fresh connection for every statement."""
+    import database
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, args)
+        if commit:
+            conn.commit()
+        if fetch_one:
+            result = cursor.fetchone()
+            return dict(result) if result else None
+        if fetch_all:
+            return [dict(row) for row in cursor.fetchall()]
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+# (query, args, kwargs) for one simulated turn: room lookup, character read,
+# rule lookup and an HP write.
+TURN_QUERIES = [
+    ("SELECT * FROM room WHERE room_key = ? AND adventure_id = ?", ("room_1", 1), {"fetch_one": True}),
+    ("SELECT * FROM room_exit WHERE from_room_id = ?", (1,), {"fetch_all": True}),
+    ("""SELECT mi.instance_name, mi.current_hp, mi.status, m.name as template_name
+        FROM monster_instance mi JOIN monster m ON mi.monster_id = m.id
+        WHERE mi.room_id = ? AND mi.status = 'alive'""", (1,), {"fetch_all": True}),
+    ("SELECT * FROM character WHERE name = ?", ("Kraven",), {"fetch_one": True}),
+    ("SELECT topic, summary, mechanics_json FROM rule WHERE topic LIKE ? OR tags LIKE ? LIMIT 1",
+     ("%grapple%", "%grapple%"), {"fetch_one": True}),
+    ("UPDATE character SET hp = ? WHERE name = ?", (24, "Kraven"), {"commit": True}),
+]
+
+
+def run_queries(execute, seconds, counter, index):
+    deadline = time.perf_counter() + seconds
+    done = 0
+    while time.perf_counter() < deadline:
+        for query, args, kwargs in TURN_QUERIES:
+            execute(query, args, **kwargs)
+        done += len(TURN_QUERIES)
+    counter[index] = done
+
+
+def measure(execute, seconds, threads):
+    counter = [0] * threads
+    workers = [
+        threading.Thread(target=run_queries, args=(execute, seconds, counter, i))
+        for i in range(threads)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counter) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    setup_database()
+    from database import execute_query
+
+    print(f"{'threads':>7} {'legacy q/s':>12} {'pooled q/s':>12} {'speedup':>8}")
+    for threads in args.threads:
+        legacy = measure(legacy_execute_query, args.seconds, threads)
+        pooled = measure(execute_query, args.seconds, threads)
+        print(f"{threads:>7} {legacy:>12.0f} {pooled:>12.0f} {pooled / legacy:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
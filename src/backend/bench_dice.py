@@ -0,0 +1,85 @@
+"""
+Rolls-per-second benchmark for the dice engine.
+
+Compares the original regex-per-call roll_dice with the cached parser
+(single rolls through the tool and through a DiceRoller) and with the bulk
+APIs used for encounter simulation. Bulk rolls use NumPy when it is
+installed; the backend line says which one ran. Also checks that two rollers
+with the same seed produce the same rolls.
+
+Usage: python bench_dice.py [--seconds 1] [--bulk 100000]
+"""
+import argparse
+import random
+import re
+import time
+
+import dice
+from dice import DiceRoller
+from tools import roll_dice
+
+NOTATIONS = ["1d20+5", "2d6+3", "1d20+2 adv", "4d6kh3", "1d8+1d6+2"]
+
+
+def legacy_roll_dice(notation, reason=""):
+    """The original roll_dice: XdY+Z only, parsed with a regex on every call."""
+    match = re.match(r"(\d+)d(\d+)([\+\-]\d+)?", notation.strip().lower())
+    if not match:
+        return {"error": f"Invalid dice notation: {notation}"}
+    num_dice = int(match.group(1) or 1)
+    die_faces = int(match.group(2))
+    modifier_str = match.group(3) or "+0"
+    modifier = int(modifier_str)
+    rolls = [random.randint(1, die_faces) for _ in range(num_dice)]
+    total = sum(rolls) + modifier
+    return {
+        "purpose": reason,
+        "notation": notation,
+        "total": total,
+        "individual_rolls": rolls,
+        "modifier": modifier,
+        "result_str": f"{rolls} {modifier_str} = {total}"
+    }
+
+
+def rate(fn, seconds):
+    """Calls of `fn` per second (each call may roll many times; see callers)."""
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        fn()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0, help="time per measurement")
+    parser.add_argument("--bulk", type=int, default=100_000, help="rolls per bulk call")
+    args = parser.parse_args()
+
+    roller = DiceRoller(seed=1)
+    print(f"bulk backend: {'numpy' if dice.np is not None else 'python'}")
+    print(f"{'case':<38} {'rolls/s':>14}")
+
+    legacy = rate(lambda: legacy_roll_dice("1d20+5"), args.seconds)
+    print(f"{'legacy roll_dice 1d20+5':<38} {legacy:>14,.0f}")
+    for notation in NOTATIONS:
+        print(f"{'roll_dice ' + notation:<38} {rate(lambda: roll_dice(notation, rng=roller), args.seconds):>14,.0f}")
+    print(f"{'DiceRoller.roll 1d20+5':<38} {rate(lambda: roller.roll('1d20+5'), args.seconds):>14,.0f}")
+
+    for notation in ("1d20+5", "2d6+3", "1d20+2 adv"):
+        bulk = rate(lambda: roller.roll_many(notation, args.bulk), args.seconds) * args.bulk
+        print(f"{'roll_many ' + notation:<38} {bulk:>14,.0f}")
+    attacks = rate(lambda: roller.attacks(args.bulk, 5, 15, "1d8+3"), args.seconds) * args.bulk
+    print(f"{'attacks +5 vs AC15, 1d8+3':<38} {attacks:>14,.0f}")
+
+    a, b = DiceRoller(seed=42), DiceRoller(seed=42)
+    same = [a.roll(n)["total"] for n in NOTATIONS * 20] == [b.roll(n)["total"] for n in NOTATIONS * 20]
+    same = same and list(a.roll_many("2d6", 1000)) == list(b.roll_many("2d6", 1000))
+    print(f"seeded replay: {'ok' if same else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
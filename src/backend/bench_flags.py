@@ -0,0 +1,130 @@
+"""
+Game flag benchmark: SQL per turn and prompt size.
+
+1. Plays --turns turns that each read --reads flags and set --writes flags,
+   once through TurnState (flags from flag_store, written with the character
+   at the end of the turn) and once the way a per-call tool would do it (one
+   SELECT per flag read, one transaction per flag written). Reports the SQL
+   statements and transactions per turn and the time per turn.
+2. Compares first-call prompt tokens when the DM restates world state in each
+   narration against carrying the same state as a Flags line.
+
+Usage: python bench_flags.py [--turns 500] [--reads 4] [--writes 2] [--history 10 50 200]
+"""
+import argparse
+import json
+import time
+
+from bench_utils import setup_database
+
+# The same world state, as the DM would restate it and as flags. Kraven starts
+# in room_1; flags of the other rooms stay out of the prompt.
+STATE_SENTENCE = (" The ward on the archway lies broken and the ice door stands open. Far below, the harpy's"
+                  " nest is empty, the wisps' shrine is dark, and the Frost key hangs at your belt.")
+STATE_FLAGS = {"room_1.ward_broken": True, "room_1.ice_door": "open", "room_2.nest_empty": True,
+               "room_3.shrine_dark": True, "has_frost_key": True}
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = 0
+        self.transactions = 0
+
+    def __call__(self, sql):
+        sql = sql.lstrip().upper()
+        if sql.startswith("BEGIN"):
+            self.transactions += 1
+        elif sql.startswith(("SELECT", "UPDATE", "INSERT", "DELETE")):
+            self.statements += 1
+
+
+def turn_with_state(turn_state, name, names, turn_index, writes):
+    turn = turn_state.TurnState.load(name)
+    turn.get_flags(names)
+    turn.update_character_data(name, [{"field": "gold", "operation": "increment", "value": 1}])
+    turn.set_flags({f"quest.step_{w}": turn_index for w in range(writes)})
+    turn.relevant_flags()
+    turn.flush()
+
+
+def turn_per_call(database, tools, name, names, turn_index, writes):
+    character = tools.get_character_data(name)
+    for flag in names:
+        database.execute_query(
+            "SELECT value FROM game_flag WHERE adventure_id = ? AND name = ?",
+            (character["adventure_id"], flag), fetch_one=True
+        )
+    tools.update_character_data(name, [{"field": "gold", "operation": "increment", "value": 1}])
+    for w in range(writes):
+        with database.transaction() as conn:
+            conn.execute(
+                """INSERT INTO game_flag (adventure_id, name, value) VALUES (?, ?, ?)
+                   ON CONFLICT (adventure_id, name) DO UPDATE SET value = excluded.value""",
+                (character["adventure_id"], f"quest.step_{w}", json.dumps(turn_index))
+            )
+
+
+def measure(label, counter, turns, play):
+    counter.statements = counter.transactions = 0
+    start = time.perf_counter()
+    for i in range(turns):
+        play(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {counter.statements / turns:>10.1f} {counter.transactions / turns:>13.1f} "
+          f"{elapsed / turns * 1e6:>10.0f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--reads", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=2)
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+
+    setup_database()
+    import logging
+    logging.disable(logging.INFO)
+    import database
+    import tools
+    import turn_state
+    from agent import SYSTEM_PROMPT
+    from bench_prompt_size import scripted_history
+    from content_cache import content_cache
+    from context_builder import build_turn_messages, count_message_tokens
+    from flag_store import flag_store
+
+    content_cache.warm()
+    adventure_id = tools.get_character_data("Kraven")["adventure_id"]
+    flag_store.set_many(adventure_id, STATE_FLAGS)
+    names = sorted(STATE_FLAGS)[:args.reads]
+
+    counter = StatementCounter()
+    database.get_db_connection().set_trace_callback(counter)
+    print(f"{'':<22} {'stmts/turn':>10} {'txns/turn':>13} {'time/turn':>12}")
+    measure("per-call flag SQL", counter, args.turns,
+            lambda i: turn_per_call(database, tools, "Kraven", names, i, args.writes))
+    measure("TurnState + flag_store", counter, args.turns,
+            lambda i: turn_with_state(turn_state, "Kraven", names, i, args.writes))
+    database.get_db_connection().set_trace_callback(None)
+
+    # The per-turn quest flags are adventure-wide and would join the prompt
+    flag_store.set_many(adventure_id, {f"quest.step_{w}": None for w in range(args.writes)})
+    char_data = tools.get_character_data("Kraven")
+    player_input = "I step through the archway."
+    flags = turn_state.TurnState.load("Kraven").relevant_flags()
+    print(f"\nprompt tokens ({len(flags)} flags in the prompt)")
+    print(f"{'history msgs':>12} {'state narrated':>15} {'flags line':>11} {'saved':>7}")
+    for length in args.history:
+        history = scripted_history(length)
+        narrated = [
+            {**m, "content": m["content"] + STATE_SENTENCE} if m["role"] == "assistant" else m for m in history
+        ]
+        with_prose, _ = build_turn_messages(SYSTEM_PROMPT, "Kraven", char_data, player_input, narrated)
+        with_flags, _ = build_turn_messages(SYSTEM_PROMPT, "Kraven", char_data, player_input, history, flags=flags)
+        prose_tokens, flag_tokens = count_message_tokens(with_prose), count_message_tokens(with_flags)
+        print(f"{length:>12} {prose_tokens:>15} {flag_tokens:>11} {1 - flag_tokens / prose_tokens:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
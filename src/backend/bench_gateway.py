@@ -0,0 +1,146 @@
+"""
+LLM gateway benchmark against a fake provider that rate-limits.
+
+The fake LLM answers 429 (with Retry-After) to any request beyond
+--capacity in flight and to a random --error-rate of the rest, like a
+provider at its limit. Three runs:
+
+1. Burst: --sessions players send turns at once, half of them fighting and
+   half chatting out of character. Compares calling the provider directly
+   (the SDK's own two retries) with the gateway, whose concurrency is capped
+   at the provider's capacity: failed turns, 429s seen, latency, and the wait
+   of combat turns against idle ones.
+2. Tail: a light load where --slow-rate of calls take --slow-latency, with
+   and without hedging after --hedge-after seconds.
+3. Coalescing: --duplicates identical requests at once; the provider should
+   see one.
+
+Usage: python bench_gateway.py [--sessions 60] [--turns 2] [--capacity 8] [--error-rate 0.05]
+                               [--latency 0.1] [--slow-rate 0.1] [--slow-latency 1.0] [--hedge-after 0.3]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from bench_utils import percentile, setup_database
+from fake_llm import FakeLLMServer
+
+COMBAT_LINE = "I attack the harpy with my axe ({})"
+IDLE_LINE = "ooc: how is the pacing so far? ({})"
+FAILED = ("Error connecting to AI brain.", "The DM struggles to describe the outcome.")
+
+
+async def play(http, session, turns, line, latencies, failures):
+    for i in range(turns):
+        began = time.perf_counter()
+        res = await http.post("/chat", json={
+            "message": line.format(i),
+            "character_name": f"Hero{session}",
+            "session_id": f"gateway-{session}",
+        })
+        res.raise_for_status()
+        if res.json()["narration"] in FAILED:
+            failures.append(res.json().get("out_of_character"))
+        else:
+            latencies.append(time.perf_counter() - began)
+
+
+async def run(app, sessions, turns, combat_share=0.5):
+    import httpx
+
+    combat, idle, failures = [], [], []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            play(http, s, turns, COMBAT_LINE if s < sessions * combat_share else IDLE_LINE,
+                 combat if s < sessions * combat_share else idle, failures)
+            for s in range(sessions)
+        ))
+        elapsed = time.perf_counter() - start
+    return combat, idle, failures, elapsed
+
+
+def ms(samples, pct):
+    return f"{percentile(samples, pct) * 1000:.0f}" if samples else "-"
+
+
+def configure(llm_gateway, enabled, **settings):
+    """Switch the gateway on or off; the client is rebuilt so SDK retries match."""
+    llm_gateway.gateway.enabled = enabled
+    for name, value in settings.items():
+        setattr(llm_gateway.gateway, name, value)
+    llm_gateway._client = None
+    llm_gateway.gateway.stats.clear()
+
+
+async def main(args, llm):
+    import logging
+    logging.disable(logging.ERROR)
+
+    import llm_gateway
+    from init_db import create_test_character
+    from main import app
+
+    for session in range(args.sessions):
+        create_test_character(f"Hero{session}", quiet=True)
+    state = llm.app.state
+
+    print(f"1. burst: {args.sessions} sessions x {args.turns} turns, provider capacity {args.capacity}, "
+          f"{args.error_rate:.0%} random 429s")
+    print(f"{'':<9} {'failed':>6} {'provider 429s':>13} {'max in flight':>13} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'combat p50':>10} {'idle p50':>9} {'elapsed':>8}")
+    for label, enabled in (("direct", False), ("gateway", True)):
+        configure(llm_gateway, enabled, max_concurrency=args.capacity, hedge_after=0)
+        state.rate_limited = state.max_in_flight = 0
+        state.error_rate, state.capacity, state.slow_rate = args.error_rate, args.capacity, 0.0
+        combat, idle, failures, elapsed = await run(app, args.sessions, args.turns)
+        done = combat + idle
+        print(f"{label:<9} {len(failures):>6} {state.rate_limited:>13} {state.max_in_flight:>13} {ms(done, 50):>7} "
+              f"{ms(done, 99):>7} {ms(combat, 50):>10} {ms(idle, 50):>9} {elapsed:>7.1f}s")
+    snapshot = llm_gateway.gateway.snapshot()
+    print(f"gateway: retries={snapshot.get('retries', 0)} rate_limited={snapshot.get('rate_limited', 0)} "
+          f"queue wait p50 combat={snapshot['wait']['combat']['p50_ms']}ms idle={snapshot['wait']['idle']['p50_ms']}ms")
+
+    sessions = max(1, args.capacity // 4)
+    print(f"\n2. tail: {sessions} sessions x {args.turns * 5} turns, {args.slow_rate:.0%} of calls take "
+          f"{args.slow_latency:.1f}s")
+    print(f"{'':<9} {'p50 ms':>7} {'p99 ms':>7} {'hedged':>7} {'hedge wins':>10}")
+    for label, hedge_after in (("no hedge", 0), ("hedge", args.hedge_after)):
+        configure(llm_gateway, True, max_concurrency=args.capacity, hedge_after=hedge_after)
+        state.error_rate, state.capacity, state.slow_rate = 0.0, args.capacity, args.slow_rate
+        combat, idle, failures, _ = await run(app, sessions, args.turns * 5, combat_share=1.0)
+        stats = llm_gateway.gateway.stats
+        print(f"{label:<9} {ms(combat, 50):>7} {ms(combat, 99):>7} {stats['hedged']:>7} {stats['hedge_wins']:>10}")
+
+    from agent import MODEL_NAME
+    configure(llm_gateway, True, hedge_after=0)
+    state.slow_rate = 0.0
+    before = state.request_count
+    messages = [{"role": "user", "content": "Describe the chasm."}]
+    await asyncio.gather(*(
+        llm_gateway.gateway.create(model=MODEL_NAME, messages=messages) for _ in range(args.duplicates)
+    ))
+    print(f"\n3. coalescing: {args.duplicates} identical requests -> {state.request_count - before} provider call(s), "
+          f"{llm_gateway.gateway.stats['coalesced']} coalesced")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=60)
+    parser.add_argument("--turns", type=int, default=2, help="turns per session")
+    parser.add_argument("--capacity", type=int, default=8, help="requests the fake provider serves at once")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="share of random 429s")
+    parser.add_argument("--latency", type=float, default=0.1, help="fake LLM latency per call (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.1)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--hedge-after", type=float, default=0.3)
+    parser.add_argument("--duplicates", type=int, default=20)
+    args = parser.parse_args()
+
+    with FakeLLMServer(latency=args.latency, slow_latency=args.slow_latency, seed=1) as llm:
+        os.environ["LLM_BASE_URL"] = llm.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        setup_database()
+        asyncio.run(main(args, llm))
@@ -0,0 +1,81 @@
+"""
+Prompt-size comparison: the original message assembly vs context_builder.
+
+Plays a scripted Wailing Glacier conversation of increasing length and reports
+the first-call prompt tokens for both, plus the follow-up call carrying a
+get_room_details result.
+
+Usage: python bench_prompt_size.py [--history 0 10 50 200]
+"""
+import argparse
+import json
+
+from bench_utils import setup_database
+
+PLAYER_LINES = [
+    "I look around the ledge, searching for handholds.",
+    "I listen carefully to the song drifting down from above.",
+    "I press on toward the cavern, keeping my shield raised.",
+    "I study the frost giant murals for any clue about the ward.",
+]
+DM_LINES = [
+    "The wind howls through the chasm as you edge along the ledge. Ice crunches under your boots and the song grows louder, promising warmth.",
+    "You make out words in the melody, sweet and sorrowful, urging you closer to the edge. Your grip tightens on the frozen rock.",
+    "The ledge widens into a cavern of blue ice lit from within. Carvings of towering giants cover every wall.",
+    "The murals show giants binding souls into blocks of ice. Runes around the archway pulse faintly as you approach.",
+]
+
+
+def scripted_history(length):
+    history = []
+    for i in range(length):
+        if i % 2 == 0:
+            history.append({"role": "user", "content": PLAYER_LINES[(i // 2) % len(PLAYER_LINES)]})
+        else:
+            history.append({
+                "role": "assistant",
+                "content": DM_LINES[(i // 2) % len(DM_LINES)],
+                "out_of_character": "Perception check: 14 vs DC 12, success.",
+            })
+    return history
+
+
+def legacy_messages(system_prompt, char_data, player_input, history):
+    """Message assembly as it was before context_builder."""
+    context_message = f"""
+    Current Character State: {json.dumps(char_data)}
+    Player Input: "{player_input}"
+    """
+    return [{"role": "system", "content": system_prompt}] + history[-5:] + [{"role": "user", "content": context_message}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, nargs="+", default=[0, 10, 50, 200])
+    args = parser.parse_args()
+
+    setup_database()
+    from agent import SYSTEM_PROMPT
+    from context_builder import build_turn_messages, compact_tool_result, count_message_tokens
+    from tools import get_character_data, get_room_details
+
+    char_data = get_character_data("Kraven")
+    room_result = json.dumps(get_room_details("room_1", char_data["adventure_id"]))
+    player_input = "I creep toward the edge and peer down into the chasm."
+
+    print(f"{'history msgs':>12} {'legacy':>8} {'builder':>8} {'saved':>7} {'legacy+tool':>12} {'builder+tool':>13}")
+    for length in args.history:
+        history = scripted_history(length)
+        legacy = legacy_messages(SYSTEM_PROMPT, char_data, player_input, history)
+        built, _ = build_turn_messages(SYSTEM_PROMPT, "Kraven", char_data, player_input, history)
+
+        legacy_tokens = count_message_tokens(legacy)
+        built_tokens = count_message_tokens(built)
+        legacy_follow = legacy_tokens + count_message_tokens([{"role": "tool", "content": room_result}])
+        built_follow = built_tokens + count_message_tokens([{"role": "tool", "content": compact_tool_result(room_result)}])
+        saved = 1 - built_tokens / legacy_tokens
+        print(f"{length:>12} {legacy_tokens:>8} {built_tokens:>8} {saved:>6.0%} {legacy_follow:>12} {built_follow:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Room graph benchmark on generated adventures.
+
+Builds a random dungeon of --rooms rooms (a spanning tree of two-way
+passages plus --loops extra ones), then times building the graph, exit
+checks by direction and by target room, and shortest-path queries from a
+cold and a warm start room. Paths are checked against a plain BFS over the
+exit rows. Also reports the build time of a small adventure, where paths
+from every room are precomputed.
+
+Usage: python bench_room_graph.py [--rooms 5000] [--loops 0.2] [--queries 20000] [--seed 1]
+"""
+import argparse
+import random
+import time
+from collections import deque
+
+from bench_utils import percentile
+from room_graph import ROOM_GRAPH_PRECOMPUTE_ROOMS, AdventureGraph
+
+DIRECTIONS = ["north", "south", "east", "west", "up", "down", "deeper", "back", "inward", "forward"]
+
+
+def generate(rooms: int, loops: float, rng: random.Random):
+    """Room and exit rows shaped like the database ones."""
+    room_rows = [{"id": i + 1, "adventure_id": 1, "room_key": f"room_{i + 1}"} for i in range(rooms)]
+    exit_rows = []
+    used = {}
+
+    def connect(a, b):
+        free = [d for d in DIRECTIONS if d not in used.setdefault(a, set())]
+        back = [d for d in DIRECTIONS if d not in used.setdefault(b, set())]
+        if not free or not back:
+            return
+        there, here = rng.choice(free), rng.choice(back)
+        used[a].add(there)
+        used[b].add(here)
+        exit_rows.append({"adventure_id": 1, "from_room_id": a, "direction": there, "to_room_id": b, "description": ""})
+        exit_rows.append({"adventure_id": 1, "from_room_id": b, "direction": here, "to_room_id": a, "description": ""})
+
+    for i in range(2, rooms + 1):
+        connect(rng.randint(max(1, i - 50), i - 1), i)
+    for _ in range(int(rooms * loops)):
+        a, b = rng.sample(range(1, rooms + 1), 2)
+        connect(a, b)
+    return room_rows, exit_rows
+
+
+def bfs_distance(exit_rows, start, goal):
+    adjacency = {}
+    for e in exit_rows:
+        adjacency.setdefault(e["from_room_id"], []).append(e["to_room_id"])
+    seen, queue = {start: 0}, deque([start])
+    while queue:
+        room = queue.popleft()
+        for nxt in adjacency.get(room, []):
+            if nxt not in seen:
+                seen[nxt] = seen[room] + 1
+                queue.append(nxt)
+    return seen.get(goal)
+
+
+def timed(fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=5000)
+    parser.add_argument("--loops", type=float, default=0.2, help="extra passages per room")
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    rooms, exits = generate(args.rooms, args.loops, rng)
+    start = time.perf_counter()
+    graph = AdventureGraph(1, rooms, exits)
+    print(f"{args.rooms} rooms, {len(exits)} exits: built in {(time.perf_counter() - start) * 1000:.1f}ms "
+          f"(paths precomputed: {graph.precomputed})")
+
+    small_rooms, small_exits = generate(ROOM_GRAPH_PRECOMPUTE_ROOMS, args.loops, rng)
+    start = time.perf_counter()
+    AdventureGraph(1, small_rooms, small_exits)
+    print(f"{ROOM_GRAPH_PRECOMPUTE_ROOMS} rooms with every path precomputed: built in "
+          f"{(time.perf_counter() - start) * 1000:.1f}ms")
+
+    probes = [rng.choice(exits) for _ in range(1000)]
+    via = timed(lambda i: graph.exit_via(probes[i % 1000]["from_room_id"], probes[i % 1000]["direction"]), args.queries)
+    to = timed(lambda i: graph.exit_to(probes[i % 1000]["from_room_id"], probes[i % 1000]["to_room_id"]), args.queries)
+    print(f"exit by direction {via * 1e9:.0f}ns, exit to room {to * 1e9:.0f}ns")
+
+    pairs = [(rng.randint(1, args.rooms), rng.randint(1, args.rooms)) for _ in range(200)]
+    cold = []
+    for a, b in pairs:
+        start = time.perf_counter()
+        graph.path(a, b)
+        cold.append(time.perf_counter() - start)
+    warm = timed(lambda i: graph.path(*pairs[i % len(pairs)]), args.queries)
+    print(f"path, new start room: p50={percentile(cold, 50) * 1000:.2f}ms p99={percentile(cold, 99) * 1000:.2f}ms; "
+          f"cached start room: {warm * 1e6:.1f}us")
+
+    wrong = 0
+    for a, b in pairs[:50]:
+        steps = graph.path(a, b)
+        expected = bfs_distance(exits, a, b)
+        if (None if steps is None else len(steps)) != expected:
+            wrong += 1
+        elif steps:
+            room = a
+            for step in steps:
+                if step["from_room_id"] != room or graph.exit_to(room, step["to_room_id"]) is None:
+                    wrong += 1
+                    break
+                room = step["to_room_id"]
+            wrong += room != b
+    print(f"path check against plain BFS: {'ok' if not wrong else f'{wrong} wrong'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Local command router benchmark.
+
+Plays a mix of player turns against the fake LLM: mechanical commands (dice,
+inventory, HP, gold, looking around, moving between the first two rooms)
+and free-form actions that need the DM. The Frost Harpy is marked dead first
+so the characters can walk between the ledge and the mural chamber. Every
+character's session runs its turns in order; sessions run concurrently.
+
+Reports the router's hit rate, turn latency for routed and LLM turns, the
+latency saved, and checks that routed turns made no LLM request.
+
+Usage: python bench_router.py [--sessions 20] [--turns 30] [--latency 0.4] [--seed 7]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from bench_utils import percentile, setup_database
+from fake_llm import FakeLLMServer
+
+# (input, weight); roughly what players type between story beats
+TRAFFIC = [
+    ("roll a d20", 6),
+    ("I roll 2d6+3 for damage", 3),
+    ("roll d20 with advantage", 2),
+    ("check my inventory", 5),
+    ("What's my HP?", 5),
+    ("how much gold do I have", 3),
+    ("stats", 2),
+    ("look around", 5),
+    ("where am I?", 2),
+    ("go inward", 4),
+    ("go back", 4),
+    ("I search the frozen mural for hidden runes", 8),
+    ("I try to talk to the wailing voice", 5),
+    ("I sharpen my sword and listen for danger", 4),
+    ("roll for initiative", 2),
+]
+
+
+# Tasks whose current turn the router resolved
+_routed_tasks = set()
+
+
+def track_routing():
+    """Wrap agent.route_turn to note which turns it resolved (it runs in the turn's own task)."""
+    import agent
+
+    original = agent.route_turn
+
+    async def route_turn(player_input, turn):
+        result = await original(player_input, turn)
+        if result is not None:
+            _routed_tasks.add(asyncio.current_task())
+        return result
+
+    agent.route_turn = route_turn
+
+
+async def play(session: int, turns: int, rng: random.Random, timings):
+    import agent
+
+    name = f"Hero{session}"
+    inputs, weights = zip(*TRAFFIC)
+    for _ in range(turns):
+        text = rng.choices(inputs, weights)[0]
+        start = time.perf_counter()
+        await agent.process_player_action(text, name, [], session_id=f"s{session}")
+        elapsed = time.perf_counter() - start
+        task = asyncio.current_task()
+        timings.append((text, task in _routed_tasks, elapsed))
+        _routed_tasks.discard(task)
+
+
+async def run(sessions: int, turns: int, seed: int, llm):
+    import logging
+    logging.disable(logging.INFO)
+
+    from command_router import router_snapshot
+    from database import execute_query
+    from init_db import create_test_character
+
+    execute_query("UPDATE monster_instance SET status = 'dead' WHERE instance_name = 'Frost Harpy of the Chasm'", commit=True)
+    for s in range(sessions):
+        create_test_character(f"Hero{s}", quiet=True)
+
+    track_routing()
+    timings = []
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    await asyncio.gather(*(play(s, turns, random.Random(rng.random()), timings) for s in range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    routed = [t for _, r, t in timings if r]
+    llm_turns = [t for _, r, t in timings if not r]
+    stats = router_snapshot()
+    print(f"turns={len(timings)} elapsed={elapsed:.1f}s llm_requests={llm.app.state.request_count}")
+    print(f"router hit rate={stats['hit_rate']:.0%} ({stats['routed']} routed, {stats['fell_through']} to the LLM) "
+          f"intents={stats['intents']}")
+    if routed:
+        print(f"routed turns  p50={percentile(routed, 50) * 1000:.2f}ms p99={percentile(routed, 99) * 1000:.2f}ms")
+    if llm_turns:
+        print(f"LLM turns     p50={percentile(llm_turns, 50) * 1000:.0f}ms p99={percentile(llm_turns, 99) * 1000:.0f}ms")
+    print(f"latency saved: {stats['saved_ms'] or 0} ms in total "
+          f"(mean routed {stats['mean_routed_ms']}ms vs mean LLM turn {stats['mean_llm_turn_ms']}ms)")
+
+    # Every LLM turn of the fake DM makes two requests (tool call, then the reply)
+    expected = 2 * len(llm_turns)
+    print(f"routed turns made no LLM request: {'ok' if llm.app.state.request_count == expected else 'FAILED'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=30, help="turns per session")
+    parser.add_argument("--latency", type=float, default=0.4, help="fake LLM seconds per request")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with FakeLLMServer(latency=args.latency) as llm:
+        os.environ["LLM_BASE_URL"] = llm.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        setup_database()
+        asyncio.run(run(args.sessions, args.turns, args.seed, llm))
+
+
+if __name__ == "__main__":
+    main()
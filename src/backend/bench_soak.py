@@ -0,0 +1,198 @@
+"""
+Multi-tenant soak test: many parties playing at once against the fake LLM.
+
+Clones the Wailing Glacier into a second adventure and creates one character
+per party, alternating adventures so every character name exists in both.
+Each party plays its own session through /chat, sending turns in small
+concurrent bursts, and every turn makes the fake DM spend one gold of the
+acting character. Afterwards each character must have lost exactly one gold
+per turn and each session must hold exactly its own story_log lines; any
+mismatch means state leaked between sessions or adventures, or two turns of
+one character interleaved.
+
+Usage: python bench_soak.py [--parties 500] [--turns 4] [--burst 2] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import time
+
+from bench_utils import percentile, setup_database
+from fake_llm import FakeLLMServer
+import fake_llm
+
+STARTING_GOLD = 15
+_SHEET_NAME = re.compile(r'"name":"([^"]+)"')
+
+
+def spending_tool_calls(body):
+    """Room lookup, a roll, and one gold spent by whoever is acting this turn."""
+    sheet = next(m["content"] for m in reversed(body["messages"]) if m.get("role") == "user")
+    name = _SHEET_NAME.search(sheet).group(1)
+    return [
+        fake_llm._tool_call("get_room_details", {"room_key": "room_1"}),
+        fake_llm._tool_call("roll_dice", {"notation": "1d20+3", "reason": "haggling"}),
+        fake_llm._tool_call("update_character_data", {
+            "character_name": name,
+            "changes": [{"field": "gold", "operation": "decrement", "value": 1}],
+        }),
+    ]
+
+
+def clone_adventure(source_id: int, new_id: int) -> None:
+    """Copy an adventure's rooms, exits and monsters under a new adventure id."""
+    from database import transaction
+
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO adventure (id, name, description) SELECT ?, name || ' (copy)', description FROM adventure WHERE id = ?",
+            (new_id, source_id)
+        )
+        conn.execute(
+            """
+            INSERT INTO room (adventure_id, room_key, title, short_description, full_description)
+            SELECT ?, room_key, title, short_description, full_description FROM room WHERE adventure_id = ?
+            """,
+            (new_id, source_id)
+        )
+        # Map every source room id to its copy through the room key
+        room_map = """
+            SELECT src.id AS old_id, dst.id AS new_id FROM room src
+            JOIN room dst ON dst.room_key = src.room_key AND dst.adventure_id = ?
+            WHERE src.adventure_id = ?
+        """
+        conn.execute(
+            f"""
+            INSERT INTO room_exit (adventure_id, from_room_id, direction, to_room_id, description)
+            SELECT ?, f.new_id, e.direction, t.new_id, e.description FROM room_exit e
+            JOIN ({room_map}) f ON f.old_id = e.from_room_id
+            JOIN ({room_map}) t ON t.old_id = e.to_room_id
+            WHERE e.adventure_id = ?
+            """,
+            (new_id, new_id, source_id, new_id, source_id, source_id)
+        )
+        conn.execute(
+            f"""
+            INSERT INTO monster_instance (adventure_id, room_id, monster_id, instance_name, current_hp, status, notes)
+            SELECT ?, r.new_id, m.monster_id, m.instance_name, m.current_hp, m.status, m.notes FROM monster_instance m
+            JOIN ({room_map}) r ON r.old_id = m.room_id
+            WHERE m.adventure_id = ?
+            """,
+            (new_id, new_id, source_id, source_id)
+        )
+        conn.execute(
+            """
+            UPDATE adventure SET starting_room_id = (
+                SELECT dst.id FROM room src JOIN room dst ON dst.room_key = src.room_key AND dst.adventure_id = ?
+                WHERE src.id = (SELECT starting_room_id FROM adventure WHERE id = ?)
+            ) WHERE id = ?
+            """,
+            (new_id, source_id, new_id)
+        )
+
+
+def party(index):
+    """(adventure_id, character_name, session_id) for a party; names repeat across adventures."""
+    return 1 + index % 2, f"Hero{index // 2}", f"party-{index}"
+
+
+async def play(http, index, turns, burst, latencies, errors):
+    adventure_id, name, session_id = party(index)
+    for start in range(0, turns, burst):
+        async def turn(i):
+            began = time.perf_counter()
+            try:
+                res = await http.post("/chat", json={
+                    "message": f"I haggle with the merchant ({i})",
+                    "character_name": name,
+                    "adventure_id": adventure_id,
+                    "session_id": session_id,
+                })
+                res.raise_for_status()
+                latencies.append(time.perf_counter() - began)
+            except Exception as e:
+                errors.append(f"{session_id} turn {i}: {e!r}")
+        await asyncio.gather(*(turn(i) for i in range(start, min(start + burst, turns))))
+
+
+def check_isolation(parties, turns):
+    """Problems found in the final state (empty when every party stayed isolated)."""
+    from database import execute_query
+
+    problems = []
+    for index in range(parties):
+        adventure_id, name, session_id = party(index)
+        char = execute_query(
+            "SELECT gold FROM character WHERE name = ? AND adventure_id = ?", (name, adventure_id), fetch_one=True
+        )
+        if char["gold"] != STARTING_GOLD - turns:
+            problems.append(f"{name} in adventure {adventure_id}: gold {char['gold']}, expected {STARTING_GOLD - turns}")
+        lines = execute_query(
+            "SELECT COUNT(*) AS n, COUNT(DISTINCT turn_index) AS distinct_turns, MIN(adventure_id) AS lo, MAX(adventure_id) AS hi "
+            "FROM story_log WHERE session_id = ?",
+            (session_id,), fetch_one=True
+        )
+        if lines["n"] != 2 * turns or lines["distinct_turns"] != lines["n"] \
+                or not lines["lo"] == lines["hi"] == adventure_id:
+            problems.append(f"{session_id}: {dict(lines)} story_log rows, expected {2 * turns} in adventure {adventure_id}")
+    return problems
+
+
+async def main(args):
+    import logging
+    logging.disable(logging.INFO)
+    import httpx
+
+    from init_db import create_test_character
+    from main import app
+    from session_store import session_store
+    from content_cache import content_cache
+
+    clone_adventure(1, 2)
+    for index in range(args.parties):
+        adventure_id, name, _ = party(index)
+        create_test_character(name, adventure_id, quiet=True)
+    content_cache.invalidate()
+
+    latencies, errors = [], []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://soak", timeout=300) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            play(http, index, args.turns, args.burst, latencies, errors) for index in range(args.parties)
+        ))
+        elapsed = time.perf_counter() - start
+    await session_store.flush()
+
+    total = args.parties * args.turns
+    print(f"parties={args.parties} turns={total} elapsed={elapsed:.1f}s throughput={len(latencies) / elapsed:.1f} turns/s")
+    if latencies:
+        print(f"latency p50={percentile(latencies, 50) * 1000:.0f}ms p99={percentile(latencies, 99) * 1000:.0f}ms "
+              f"mean={statistics.mean(latencies) * 1000:.0f}ms")
+    print(f"errors={len(errors)} error_rate={len(errors) / total:.2%}")
+    for error in errors[:10]:
+        print(f"  {error}")
+
+    problems = check_isolation(args.parties, args.turns) if not errors else []
+    for problem in problems[:10]:
+        print(f"  isolation: {problem}")
+    print("isolation: " + ("FAILED" if problems else "skipped (errors)" if errors else "ok"))
+    return 1 if errors or problems else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parties", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=4, help="turns per party")
+    parser.add_argument("--burst", type=int, default=2, help="turns a party sends at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency per call (s)")
+    args = parser.parse_args()
+
+    fake_llm.default_tool_calls = spending_tool_calls
+    with FakeLLMServer(latency=args.latency) as llm:
+        os.environ["LLM_BASE_URL"] = llm.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        setup_database()
+        raise SystemExit(asyncio.run(main(args)))
@@ -0,0 +1,107 @@
+"""
+Cold-start and prompt-cache benchmark.
+
+1. Cold start: imports the API (`import main`) in fresh interpreters and
+   reports the median wall time, the slowest modules from `-X importtime`,
+   and whether the OpenAI SDK got imported (it should not be until the first
+   LLM call).
+2. Prompt cache: plays turns for several characters against the fake LLM,
+   which mimics provider prompt caching, and reports the share of prompt
+   tokens served from the cache, overall and for each request of a turn.
+
+Usage: python bench_startup.py [--runs 5] [--sessions 4] [--turns 5]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_utils import HERE, setup_database
+from fake_llm import FakeLLMServer
+
+
+def cold_start(runs):
+    code = "import main, sys; print('openai' in sys.modules)"
+    times, loads_sdk = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - start)
+        loads_sdk = out.stdout.strip().endswith("True")
+
+    profile = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=HERE, capture_output=True, text=True, check=True
+    )
+    # Lines look like "import time: self [us] | cumulative | <indent>module", two spaces per level
+    direct = []
+    for line in profile.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit() and parts[2].startswith("   ") and parts[2][3] != " ":
+            direct.append((int(parts[1]), parts[2].strip()))
+
+    print(f"cold start: import main median={statistics.median(times) * 1000:.0f}ms "
+          f"min={min(times) * 1000:.0f}ms over {runs} runs; openai SDK imported at startup: {loads_sdk}")
+    print("  slowest imports made by main (cumulative):")
+    for us, name in sorted(direct, reverse=True)[:8]:
+        print(f"  {us / 1000:>8.1f}ms  {name}")
+
+
+async def prompt_cache(sessions, turns):
+    import logging
+    logging.disable(logging.INFO)
+
+    import agent
+    from init_db import create_test_character
+
+    for s in range(sessions):
+        create_test_character(f"Hero{s}", quiet=True)
+
+    # Per position in the turn (first call, follow-up): [prompt tokens, cached tokens]
+    by_call = {}
+    for t in range(turns):
+        for s in range(sessions):
+            calls = []
+            original = agent.record_usage
+
+            def record(usage):
+                calls.append((usage.prompt_tokens, usage.prompt_tokens_details.cached_tokens))
+                return original(usage)
+
+            agent.record_usage = record
+            try:
+                await agent.process_player_action(f"I search the ledge ({t})", f"Hero{s}", [], session_id=f"s{s}")
+            finally:
+                agent.record_usage = original
+            for i, (prompt, cached) in enumerate(calls):
+                totals = by_call.setdefault(i, [0, 0])
+                totals[0] += prompt
+                totals[1] += cached
+
+    stats = agent.prompt_cache_stats
+    print(f"prompt cache: {stats['requests']} requests, {stats['prompt_tokens']} prompt tokens, "
+          f"{stats['cached_tokens']} cached ({agent.cached_token_ratio():.0%}); prefix {agent.PROMPT_PREFIX_HASH}")
+    for i, (prompt, cached) in sorted(by_call.items()):
+        label = "first call" if i == 0 else f"follow-up {i}"
+        print(f"  {label:<12} {cached / prompt if prompt else 0:.0%} of {prompt} tokens cached")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters for the cold-start timing")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    args = parser.parse_args()
+
+    with FakeLLMServer(latency=0) as llm:
+        os.environ["LLM_BASE_URL"] = llm.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        setup_database()
+        cold_start(args.runs)
+        asyncio.run(prompt_cache(args.sessions, args.turns))
+
+
+if __name__ == "__main__":
+    main()
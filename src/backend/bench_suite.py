@@ -0,0 +1,355 @@
+"""
+End-to-end benchmark suite: scripted Wailing Glacier sessions through the API.
+
+Each scenario is a fixed list of player lines played through /chat (or
+/chat/stream) in one session, with the LLM replayed from a cassette
+(llm_replay) and dice seeded (DICE_SEED), so every round sends the same
+requests and ends in the same state. Before each round the database is
+restored from a snapshot and the session, flag and dice state is reset.
+
+Per scenario it reports, in the manner of pytest-benchmark, min / max / mean
+/ stddev / median / IQR of turn latency and turns per second over --rounds
+rounds (after --warmup), plus SQL statements per turn, prompt tokens sent
+per turn and the peak memory traced during one extra round. The results are
+compared with bench_baseline.json; the script exits non-zero if any
+scenario got slower, ran more queries, sent more tokens or used more memory
+than the tolerance allows, or if a turn failed.
+
+Usage:
+    python bench_suite.py                   replay and compare with the baseline
+    python bench_suite.py --record          re-record the cassette first (scripted fake DM;
+                                            --provider live records the real API instead)
+    python bench_suite.py --save-baseline   accept the current results as the baseline
+    python bench_suite.py --json results.json --rounds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+from bench_utils import HERE, percentile, setup_database
+
+BASELINE_PATH = os.path.join(HERE, "bench_baseline.json")
+CASSETTE_PATH = os.path.join(HERE, "cassettes", "wailing_glacier.jsonl")
+SUITE_DICE_SEED = "20240"
+
+# name -> (endpoint, player lines)
+SCENARIOS = {
+    "harpy_fight": ("/chat", [
+        "look around",
+        "I attack the Frost Harpy with my longsword",
+        "I raise my shield and strike the harpy again",
+        "I drink my potion of healing",
+        "check my inventory",
+        "roll 1d20+3 for courage",
+    ]),
+    "glacier_walk": ("/chat/stream", [
+        "I search the ledge for handholds",
+        "I climb inward toward the frozen murals",
+        "I study the frost giant murals",
+        "go deeper",
+        "What do the rules say about grappling?",
+        "how much gold do I have",
+    ]),
+}
+
+# metric -> (relative tolerance, absolute slack) before a change counts as a regression
+TOLERANCES = {
+    "turn_median_ms": (0.50, 5.0),
+    "db_queries_per_turn": (0.0, 0.5),
+    "prompt_tokens_per_turn": (0.05, 0.0),
+    "peak_memory_kb": (0.25, 512.0),
+}
+FAILED = ("Error connecting to AI brain.", "The DM struggles to describe the outcome.")
+
+
+# ---------------------------------------------------------------------------
+# Scripted fake DM, used to record the cassette offline
+# ---------------------------------------------------------------------------
+
+_SHEET_NAME = re.compile(r'"name":"([^"]+)"')
+_PLAYER_INPUT = re.compile(r'Player Input: "(.*)"')
+
+
+def _turn(body):
+    sheet = next(m["content"] for m in reversed(body["messages"]) if m.get("role") == "user")
+    return _SHEET_NAME.search(sheet).group(1), _PLAYER_INPUT.search(sheet).group(1).lower()
+
+
+def scripted_tool_calls(body):
+    """What the fake DM does for each scripted line."""
+    from fake_llm import _tool_call as call
+
+    name, line = _turn(body)
+    if "potion" in line:
+        return [call("update_character_data", {"character_name": name, "changes": [
+            {"field": "hp", "operation": "increment", "value": 7},
+            {"field": "inventory", "operation": "remove_item", "value": {"name": "Potion of Healing"}},
+        ]})]
+    if "attack" in line or "strike" in line:
+        return [
+            call("get_monster_stats", {"monster_name": "Frost Harpy"}),
+            call("roll_dice", {"notation": "1d20+5", "reason": "longsword attack"}),
+            call("roll_dice", {"notation": "1d8+3", "reason": "longsword damage"}),
+            call("update_character_data", {"character_name": name, "changes": [
+                {"field": "hp", "operation": "decrement", "value": 3},
+            ]}),
+        ]
+    if "search" in line:
+        return [
+            call("roll_dice", {"notation": "1d20+3", "reason": "perception"}),
+            call("set_flags", {"flags": {"room_1.handholds_found": True}}),
+        ]
+    if "inward" in line or "deeper" in line:
+        return [call("move_character", {"character_name": name, "direction": "inward" if "inward" in line else "deeper"})]
+    if "murals" in line:
+        return [
+            call("get_room_details", {"room_key": "room_2"}),
+            call("set_flags", {"flags": {"room_2.murals_read": True, "knows_ward_secret": True}}),
+        ]
+    if "rules" in line:
+        return [call("rules_lookup", {"topic": "grapple"})]
+    return [call("get_room_details", {"room_key": "room_1"})]
+
+
+def scripted_narration(body):
+    _, line = _turn(body)
+    return {
+        "narration": f"The glacier answers your action: {line}.",
+        "out_of_character": "Resolved by the scripted DM.",
+        "next_prompt_suggestion": "Press on.",
+    }
+
+
+# ---------------------------------------------------------------------------
+# Playing scenarios
+# ---------------------------------------------------------------------------
+
+def session_id(scenario):
+    return f"suite-{scenario}"
+
+
+def turn_queries():
+    """SQL statements run inside turn spans so far."""
+    from tracing import metrics
+    return sum(count for (root, phase, _), count in metrics.db_queries.items() if root == phase == "turn")
+
+
+async def reset_world(snapshot):
+    """Restore the database snapshot and forget everything the last round left in memory."""
+    import context_builder
+    from database import get_db_connection
+    from dice import reseed, session_seed
+    from flag_store import flag_store
+    from session_store import session_store
+
+    await session_store.flush()
+    snapshot.backup(get_db_connection())
+    session_store._sessions.clear()
+    flag_store.invalidate()
+    context_builder._last_sheets.clear()
+    for scenario in SCENARIOS:
+        reseed(session_id(scenario), session_seed(session_id(scenario)))
+
+
+async def play_turn(http, endpoint, scenario, line):
+    payload = {"message": line, "character_name": "Kraven", "session_id": session_id(scenario)}
+    if endpoint == "/chat":
+        res = await http.post(endpoint, json=payload)
+        res.raise_for_status()
+        return res.json()
+    done = None
+    async with http.stream("POST", endpoint, json=payload) as res:
+        res.raise_for_status()
+        event = None
+        async for text in res.aiter_lines():
+            if text.startswith("event: "):
+                event = text[7:]
+            elif text.startswith("data: ") and event in ("done", "error"):
+                done = {"event": event, **json.loads(text[6:])}
+    return done or {"narration": FAILED[0]}
+
+
+async def play_round(http, scenario, samples=None):
+    """Play a scenario once; returns (failed turns, SQL statements, prompt tokens)."""
+    from llm_replay import replay_stats
+
+    endpoint, lines = SCENARIOS[scenario]
+    failures, queries, tokens = [], turn_queries(), replay_stats["prompt_tokens"]
+    for line in lines:
+        started = time.perf_counter()
+        result = await play_turn(http, endpoint, scenario, line)
+        if samples is not None:
+            samples.append(time.perf_counter() - started)
+        if result.get("event") == "error" or result.get("narration") in FAILED:
+            failures.append(f"{scenario}: '{line}' -> {result.get('out_of_character') or result.get('detail')}")
+    return failures, turn_queries() - queries, replay_stats["prompt_tokens"] - tokens
+
+
+async def record(http, snapshot):
+    for scenario in SCENARIOS:
+        await reset_world(snapshot)
+        failures, _, _ = await play_round(http, scenario)
+        if failures:
+            raise SystemExit("Recording failed:\n  " + "\n  ".join(failures))
+
+
+async def measure(http, snapshot, scenario, rounds, warmup):
+    import llm_gateway
+
+    samples, failures = [], []
+    queries = tokens = 0
+    for i in range(warmup + rounds):
+        await reset_world(snapshot)
+        llm_gateway.get_client().cassette.rewind()
+        measured = i >= warmup
+        round_failures, round_queries, round_tokens = await play_round(http, scenario, samples if measured else None)
+        failures += round_failures
+        if measured:
+            queries += round_queries
+            tokens += round_tokens
+
+    await reset_world(snapshot)
+    llm_gateway.get_client().cassette.rewind()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    await play_round(http, scenario)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    turns = rounds * len(SCENARIOS[scenario][1])
+    q1, q3 = percentile(samples, 25), percentile(samples, 75)
+    return {
+        "rounds": rounds,
+        "turns": turns,
+        "min_ms": min(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+        "mean_ms": statistics.mean(samples) * 1000,
+        "stddev_ms": statistics.stdev(samples) * 1000 if len(samples) > 1 else 0.0,
+        "turn_median_ms": statistics.median(samples) * 1000,
+        "iqr_ms": (q3 - q1) * 1000,
+        "ops": len(samples) / sum(samples),
+        "db_queries_per_turn": queries / turns,
+        "prompt_tokens_per_turn": tokens / turns,
+        "peak_memory_kb": peak / 1024,
+        "failures": failures,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def print_results(results):
+    print(f"\n{'Name (time in ms)':<18} {'Min':>7} {'Max':>8} {'Mean':>7} {'StdDev':>7} {'Median':>7} {'IQR':>6} "
+          f"{'OPS':>7} {'Rounds':>6} {'q/turn':>7} {'tok/turn':>9} {'peak KB':>8}")
+    for name, r in results.items():
+        print(f"{name:<18} {r['min_ms']:>7.2f} {r['max_ms']:>8.2f} {r['mean_ms']:>7.2f} {r['stddev_ms']:>7.2f} "
+              f"{r['turn_median_ms']:>7.2f} {r['iqr_ms']:>6.2f} {r['ops']:>7.1f} {r['rounds']:>6} "
+              f"{r['db_queries_per_turn']:>7.2f} {r['prompt_tokens_per_turn']:>9.1f} {r['peak_memory_kb']:>8.0f}")
+
+
+def regressions(results, baseline, latency_tolerance=None):
+    problems = []
+    for name, r in results.items():
+        problems += r["failures"]
+        expected = baseline.get("scenarios", {}).get(name)
+        if expected is None:
+            problems.append(f"{name}: no baseline (run with --save-baseline)")
+            continue
+        for metric, (relative, slack) in TOLERANCES.items():
+            if metric == "turn_median_ms" and latency_tolerance is not None:
+                relative = latency_tolerance
+            limit = expected[metric] * (1 + relative) + slack
+            if r[metric] > limit:
+                problems.append(f"{name}: {metric} {r[metric]:.2f} > {limit:.2f} (baseline {expected[metric]:.2f})")
+    return problems
+
+
+async def main(args):
+    import logging
+    logging.disable(logging.WARNING)
+    import sqlite3
+
+    import httpx
+    import llm_replay
+    from database import get_db_connection
+    from main import app
+
+    snapshot = sqlite3.connect(":memory:")
+    get_db_connection().backup(snapshot)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://suite", timeout=120) as http:
+        if args.record:
+            llm_replay.use("record", args.cassette)
+            await record(http, snapshot)
+            llm_replay.use("off")
+            print(f"Recorded {llm_replay.replay_stats['recorded']} LLM calls to {args.cassette}")
+        if not os.path.exists(args.cassette):
+            raise SystemExit(f"No cassette at {args.cassette}; run with --record first")
+
+        llm_replay.use("replay", args.cassette)
+        results = {}
+        for scenario in args.scenarios or SCENARIOS:
+            results[scenario] = await measure(http, snapshot, scenario, args.rounds, args.warmup)
+
+    print_results(results)
+    stats = llm_replay.replay_stats
+    print(f"replayed {stats['replayed']} LLM calls: {stats['exact']} exact, {stats['loose']} by shape, "
+          f"{stats['misses']} missing")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"scenarios": {
+                name: {metric: round(r[metric], 2) for metric in TOLERANCES} for name, r in results.items()
+            }}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    problems = regressions(results, baseline, args.latency_tolerance)
+    for problem in problems:
+        print(f"REGRESSION  {problem}")
+    print("FAILED" if problems else "ok: within the baseline")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS))
+    parser.add_argument("--cassette", default=CASSETTE_PATH)
+    parser.add_argument("--record", action="store_true", help="re-record the cassette before measuring")
+    parser.add_argument("--provider", choices=["fake", "live"], default="fake",
+                        help="what to record against: the scripted fake DM or the API in OPENAI_API_KEY/LLM_BASE_URL")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--latency-tolerance", type=float, help="relative slack on median turn latency (default 0.5)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    os.environ["DICE_SEED"] = SUITE_DICE_SEED
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    if args.record and args.provider == "fake":
+        import fake_llm
+        fake_llm.default_tool_calls = scripted_tool_calls
+        fake_llm.default_narration = scripted_narration
+        with fake_llm.FakeLLMServer(latency=0.02, token_delay=0.001) as llm:
+            os.environ["LLM_BASE_URL"] = llm.base_url
+            setup_database()
+            sys.exit(asyncio.run(main(args)))
+    setup_database()
+    sys.exit(asyncio.run(main(args)))
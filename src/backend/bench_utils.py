@@ -0,0 +1,26 @@
+"""Shared helpers for the bench_*.py scripts."""
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def setup_database():
+    """
+    Build a throwaway Wailing Glacier database and point the backend at it.
+    Must run before `database` is imported anywhere.
+    """
+    db_path = os.path.join(tempfile.mkdtemp(prefix="holodeck-bench-"), "holodeck.db")
+    os.environ["DB_PATH"] = db_path
+
+    import init_db
+    init_db.init_db()
+    return db_path
@@ -0,0 +1,282 @@
+"""
+Local command router: resolves purely mechanical player commands without
+calling the LLM.
+
+Rolling dice ("roll a d20", "roll 2d6+3 with advantage"), checking
+inventory, HP, gold or status, looking around and moving through a known
+exit ("go back", "head deeper") are recognized by a small set of regular
+expressions. They are resolved with the same tools the DM would call. The
+narration is built from templates and the room text, and state changes go
+through the turn's TurnState like any tool call.
+
+Anything else falls through to the LLM. So do moves that need a DM: leaving
+a room with live monsters, walking into one, or a character at 0 HP. Hit
+rate and the latency saved against the LLM turns seen so far are kept in
+`router_stats`. COMMAND_ROUTER=0 turns the router off.
+"""
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from content_cache import content_cache
+from game_response import GameResponse
+from tools import get_room_details, roll_dice
+from turn_state import TurnState
+
+COMMAND_ROUTER = os.getenv("COMMAND_ROUTER", "1") == "1"
+
+
+class Command(NamedTuple):
+    intent: str
+    args: Dict[str, str]
+
+
+# Leading filler that does not change the command
+_FILLER = re.compile(r"^(?:(?:please|ok(?:ay)?|so|now|then|let me|let's|lets|i want to|i'd like to|i will|i'll|i|can i|could i|dm,?)\s+)+")
+_CONTRACTIONS = {"what's": "what is", "where's": "where is", "how's": "how is", "i'm": "i am"}
+
+# Direction words -> the exit direction they usually mean
+DIRECTION_SYNONYMS = {
+    "n": "north", "s": "south", "e": "east", "w": "west",
+    "ne": "northeast", "nw": "northwest", "se": "southeast", "sw": "southwest",
+    "u": "up", "d": "down", "upward": "up", "upwards": "up", "downward": "down", "downwards": "down",
+    "return": "back", "backward": "back", "backwards": "back", "retreat": "back",
+    "ahead": "forward", "forwards": "forward", "onward": "forward", "onwards": "forward", "on": "forward",
+    "in": "inward", "inside": "inward", "inwards": "inward", "further": "deeper", "farther": "deeper",
+    "out": "outward", "outside": "outward",
+}
+DIRECTIONS = set(DIRECTION_SYNONYMS) | set(DIRECTION_SYNONYMS.values()) | {"deeper", "inward", "outward"}
+_DIRECTION = "|".join(sorted(DIRECTIONS, key=len, reverse=True))
+
+_MOVE_VERB = r"(?:go|head|walk|move|run|travel|continue|proceed|climb|step|press|venture)"
+_ITEMS = r"(?:inventory|inv|backpack|pack|bag|gear|items|equipment|belongings)"
+
+# (intent, pattern) in match order; patterns see normalized input
+PATTERNS: List[Tuple[str, "re.Pattern"]] = [
+    ("roll", re.compile(
+        r"^(?:roll|throw)(?: (?:a|an|one|the))? (?P<notation>\d*\s*d\s*(?:\d+|%)[\dd%+\-khl\s]*?)"
+        r"(?: (?:with |at |in )?(?P<mode>advantage|disadvantage|adv|dis))?(?: for (?P<reason>[\w\s']+))?$")),
+    ("inventory", re.compile(
+        rf"^(?:(?:check|show|open|view|search|look (?:at|in|through)|go through) (?:my |the )?)?(?:my )?{_ITEMS}$"
+        rf"|^what (?:do i have|am i carrying|is in my {_ITEMS}|items do i have)$")),
+    ("hp", re.compile(
+        r"^(?:(?:what is|check|show|tell me) )?(?:my )?(?:hp|hit points|health|hitpoints)$"
+        r"|^how many (?:hp|hit points) (?:do i have|have i got)(?: left)?$|^how (?:hurt|injured|wounded|healthy) am i$")),
+    ("gold", re.compile(
+        r"^(?:(?:what is|check|show|count) )?(?:my )?(?:gold|money|coins|purse)$"
+        r"|^how much (?:gold|money) (?:do i have|have i got)(?: left)?$")),
+    ("status", re.compile(
+        r"^(?:(?:what is|check|show|view) )?(?:my )?(?:status|stats|character sheet|sheet|character|conditions)$")),
+    ("look", re.compile(
+        r"^(?:look|look around|l|where am i|what do i see|look at (?:the )?room"
+        r"|describe (?:the )?(?:room|area|surroundings)|(?:what are the )?exits|where can i go)$")),
+    ("move", re.compile(
+        rf"^(?:(?:{_MOVE_VERB})(?: (?:to the|toward|towards|through the))? )?(?P<direction>{_DIRECTION})"
+        r"(?: (?:exit|way|passage|tunnel|door))?$|^(?P<back>go back|turn back|head back|return)$")),
+]
+
+router_stats = {"routed": 0, "fell_through": 0, "routed_seconds": 0.0, "llm_turns": 0, "llm_seconds": 0.0}
+intent_counts: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+def normalize(text: str) -> str:
+    text = text.strip().lower().replace("’", "'")
+    text = re.sub(r"[.!?]+$", "", text).strip()
+    text = re.sub(r"\s+", " ", text)
+    for short, long in _CONTRACTIONS.items():
+        text = text.replace(short, long)
+    text = _FILLER.sub("", text)
+    return re.sub(r"\s+please$", "", text)
+
+
+def match_command(player_input: str) -> Optional[Command]:
+    """The mechanical command in `player_input`, or None if it needs the DM."""
+    if len(player_input) > 80:
+        return None
+    text = normalize(player_input)
+    for intent, pattern in PATTERNS:
+        match = pattern.match(text)
+        if match:
+            return Command(intent, {k: v for k, v in match.groupdict().items() if v})
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Handlers: (command, turn) -> response dict, or None to fall through
+# ---------------------------------------------------------------------------
+
+def _reply(narration: str, out_of_character: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+    return GameResponse(narration=narration, out_of_character=out_of_character, **fields).to_result()
+
+
+def _item_list(items: List[Dict[str, Any]]) -> str:
+    names = [f"{item['name']} x{item['qty']}" if item.get("qty", 1) != 1 else item["name"] for item in items]
+    if len(names) < 2:
+        return "".join(names)
+    return ", ".join(names[:-1]) + " and " + names[-1]
+
+
+def _exits_line(exits: List[Dict[str, Any]]) -> str:
+    if not exits:
+        return "There is no obvious way onward."
+    return "Exits: " + ", ".join(e["direction"] for e in exits) + "."
+
+
+def _room_text(details: Dict[str, Any]) -> str:
+    parts = [f"{details['title']}. {details['full_description']}"]
+    for m in details["monsters"]:
+        parts.append(f"{m['instance_name']} is here.")
+    parts.append(_exits_line(details["exits"]))
+    return "\n\n".join(parts)
+
+
+def _current_room(turn: TurnState) -> Optional[Dict[str, Any]]:
+    return content_cache.get_room_by_id(turn.character.get("location_room_id"))
+
+
+def resolve_roll(command: Command, turn: TurnState) -> Optional[Dict[str, Any]]:
+    reason = command.args.get("reason", "").strip()
+    result = roll_dice(command.args["notation"], reason, command.args.get("mode"), rng=turn.dice)
+    if "error" in result:
+        return None
+    label = f" for {reason}" if reason else ""
+    narration = f"You roll {result['expression']}{label}: {result['total']}."
+    if result.get("critical"):
+        narration += " A natural 20!"
+    elif result.get("fumble"):
+        narration += " A natural 1."
+    record = {"purpose": reason or "roll", "notation": result["expression"], "result": result["total"]}
+    return _reply(narration, result["result_str"], dice_rolls=[record])
+
+
+def resolve_inventory(command: Command, turn: TurnState) -> Optional[Dict[str, Any]]:
+    items = turn.character.get("inventory") or []
+    if not items:
+        return _reply("Your pack is empty.")
+    return _reply(f"You are carrying {_item_list(items)}.")
+
+
+def resolve_hp(command: Command, turn: TurnState) -> Optional[Dict[str, Any]]:
+    hp, max_hp = turn.character.get("hp"), turn.character.get("max_hp")
+    if hp is not None and hp <= 0:
+        return _reply("You are unconscious at 0 hit points.", "Make death saving throws at the start of your turns.")
+    return _reply(f"You have {hp} of {max_hp} hit points.")
+
+
+def resolve_gold(command: Command, turn: TurnState) -> Optional[Dict[str, Any]]:
+    gold = turn.character.get("gold") or 0
+    return _reply(f"You have {gold} gold piece{'s' if gold != 1 else ''}.")
+
+
+def resolve_status(command: Command, turn: TurnState) -> Optional[Dict[str, Any]]:
+    char = turn.character
+    lines = [f"{char['name']}, level {char.get('level')} {char.get('class')}: "
+             f"{char.get('hp')}/{char.get('max_hp')} HP, {char.get('gold') or 0} gold."]
+    if char.get("abilities"):
+        lines.append(", ".join(f"{k.upper()} {v}" for k, v in char["abilities"].items()) + ".")
+    conditions = char.get("conditions") or []
+    lines.append(f"Conditions: {', '.join(conditions)}." if conditions else "No conditions.")
+    room = _current_room(turn)
+    if room:
+        lines.append(f"Location: {room['title']}.")
+    return _reply(" ".join(lines))
+
+
+def resolve_look(command: Command, turn: TurnState) -> Optional[Dict[str, Any]]:
+    room = _current_room(turn)
+    if not room:
+        return None
+    return _reply(_room_text(get_room_details(room["room_key"], room["adventure_id"])))
+
+
+def resolve_move(command: Command, turn: TurnState) -> Optional[Dict[str, Any]]:
+    room = _current_room(turn)
+    hp = turn.character.get("hp")
+    if not room or (hp is not None and hp <= 0):
+        return None
+    here = get_room_details(room["room_key"], room["adventure_id"])
+    if here["monsters"]:
+        return None     # leaving a fight is the DM's call
+
+    word = "back" if "back" in command.args else command.args["direction"]
+    graph = content_cache.get_graph(room["adventure_id"])
+    exit_ = graph.exit_via(room["id"], word) or graph.exit_via(room["id"], DIRECTION_SYNONYMS.get(word, word))
+    if exit_ is None:
+        return _reply(f"You can't go {DIRECTION_SYNONYMS.get(word, word)} from here. {_exits_line(here['exits'])}")
+
+    target = content_cache.get_room_by_id(exit_["to_room_id"])
+    there = get_room_details(target["room_key"], room["adventure_id"])
+    if there["monsters"]:
+        return None     # walking into an encounter is the DM's call too
+    moved = turn.move_character(turn.character["name"], direction=exit_["direction"])
+    if "error" in moved:
+        return None
+    narration = f"{exit_['description']}\n\n{_room_text(there)}" if exit_["description"] else _room_text(there)
+    return _reply(narration, moved["message"])
+
+
+HANDLERS: Dict[str, Callable[[Command, TurnState], Optional[Dict[str, Any]]]] = {
+    "roll": resolve_roll,
+    "inventory": resolve_inventory,
+    "hp": resolve_hp,
+    "gold": resolve_gold,
+    "status": resolve_status,
+    "look": resolve_look,
+    "move": resolve_move,
+}
+
+# Intents whose handlers read live monster state from the DB (run them on the tool pool)
+READS_DB = {"look", "move"}
+
+
+def resolve_command(command: Command, turn: TurnState) -> Optional[Dict[str, Any]]:
+    """The response for a matched command, or None if it should go to the LLM after all."""
+    if not turn.found:
+        return None
+    return HANDLERS[command.intent](command, turn)
+
+
+# ---------------------------------------------------------------------------
+# Stats
+# ---------------------------------------------------------------------------
+
+def record_routed(intent: str, seconds: float) -> None:
+    with _stats_lock:
+        router_stats["routed"] += 1
+        router_stats["routed_seconds"] += seconds
+        intent_counts[intent] += 1
+
+
+def record_fallthrough() -> None:
+    with _stats_lock:
+        router_stats["fell_through"] += 1
+
+
+def record_llm_turn(seconds: float) -> None:
+    """Time of a turn the LLM handled, the baseline for the latency the router saves."""
+    with _stats_lock:
+        router_stats["llm_turns"] += 1
+        router_stats["llm_seconds"] += seconds
+
+
+def router_snapshot() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(router_stats)
+        intents = dict(intent_counts)
+    routed, seen = stats["routed"], stats["routed"] + stats["fell_through"]
+    routed_ms = stats["routed_seconds"] / routed * 1000 if routed else 0.0
+    llm_ms = stats["llm_seconds"] / stats["llm_turns"] * 1000 if stats["llm_turns"] else None
+    return {
+        "enabled": COMMAND_ROUTER,
+        "routed": routed,
+        "fell_through": stats["fell_through"],
+        "hit_rate": round(routed / seen, 4) if seen else 0.0,
+        "intents": intents,
+        "mean_routed_ms": round(routed_ms, 3),
+        "mean_llm_turn_ms": round(llm_ms, 1) if llm_ms is not None else None,
+        # Estimated: each routed turn would have taken an average LLM turn
+        "saved_ms": round(routed * (llm_ms - routed_ms)) if llm_ms is not None else None,
+    }
@@ -0,0 +1,189 @@
+"""
+In-memory cache of static adventure content.
+
+Rooms, exits, monster templates and rules are written once by init_db and
+never change during play, so they are loaded into dictionaries (with their
+JSON columns already parsed) and served from memory. Exits are kept only as
+a room graph per adventure (see room_graph), which serves exit lookups,
+movement checks and paths. Mutable state such as monster_instance HP/status is NOT cached and
+still comes from the database.
+
+The cache is warmed at API startup and lazily on first use; init_db calls
+`invalidate()` after re-ingesting content.
+"""
+import json
+import logging
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from database import execute_query
+from room_graph import AdventureGraph, build_graphs
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on memoized rules_lookup topics (free-text from the model)
+RULE_MATCH_CACHE_SIZE = 1024
+
+# bm25() column weights for rule_fts (topic, summary, tags, mechanics)
+RULE_FIELD_WEIGHTS = "10.0, 2.0, 5.0, 1.0"
+RULE_QUERY_WORD = re.compile(r"\w+")
+
+
+class ContentCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.rooms: Dict[tuple, Dict[str, Any]] = {}           # (adventure_id, room_key) -> room
+        self.rooms_by_id: Dict[int, Dict[str, Any]] = {}
+        self.graphs: Dict[int, AdventureGraph] = {}            # adventure_id -> room graph
+        self.monsters: Dict[str, Dict[str, Any]] = {}          # name / srd_name -> stat block
+        self.monsters_by_id: Dict[int, Dict[str, Any]] = {}
+        self.rules: List[Dict[str, Any]] = []
+        self.rules_by_id: Dict[int, Dict[str, Any]] = {}
+        self._rule_matches: Dict[tuple, List[Dict[str, Any]]] = {}
+
+    def warm(self) -> None:
+        """(Re)load all static content from the database."""
+        rooms = execute_query("SELECT * FROM room ORDER BY id", fetch_all=True)
+        exits = execute_query("SELECT * FROM room_exit ORDER BY id", fetch_all=True)
+        monsters = execute_query("SELECT * FROM monster ORDER BY id", fetch_all=True)
+        rules = execute_query("SELECT * FROM rule ORDER BY id", fetch_all=True)
+
+        rooms_by_key = {(r['adventure_id'], r['room_key']): r for r in rooms}
+        rooms_by_id = {r['id']: r for r in rooms}
+
+        graphs = build_graphs(rooms, exits)
+
+        monsters_by_name: Dict[str, Dict[str, Any]] = {}
+        monsters_by_id = {}
+        for m in monsters:
+            stats = dict(m)
+            if stats.get('meta_json'):
+                try:
+                    stats.update(json.loads(stats['meta_json']))
+                    del stats['meta_json']
+                except ValueError:
+                    pass
+            monsters_by_id[m['id']] = stats
+            monsters_by_name.setdefault(m['name'], stats)
+            if m['srd_name']:
+                monsters_by_name.setdefault(m['srd_name'], stats)
+
+        for rule in rules:
+            rule['_search'] = (rule['topic'] or '').lower(), (rule['tags'] or '').lower()
+            result = {"topic": rule['topic'], "summary": rule['summary'], "mechanics_json": rule['mechanics_json']}
+            if result.get('mechanics_json'):
+                try:
+                    result['mechanics'] = json.loads(result['mechanics_json'])
+                    del result['mechanics_json']
+                except ValueError:
+                    pass
+            rule['_result'] = result
+
+        with self._lock:
+            self.rooms, self.rooms_by_id = rooms_by_key, rooms_by_id
+            self.graphs = graphs
+            self.monsters, self.monsters_by_id = monsters_by_name, monsters_by_id
+            self.rules = rules
+            self.rules_by_id = {r['id']: r for r in rules}
+            self._rule_matches = {}
+            self._loaded = True
+
+        logger.info(
+            f"Content cache warmed: {len(rooms)} rooms, {len(exits)} exits, "
+            f"{len(monsters)} monsters, {len(rules)} rules."
+        )
+
+    def invalidate(self) -> None:
+        """Drop cached content; the next lookup reloads it."""
+        with self._lock:
+            self._loaded = False
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.warm()
+
+    def get_room(self, room_key: str, adventure_id: int) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        return self.rooms.get((adventure_id, room_key))
+
+    def get_room_by_id(self, room_id: int) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        return self.rooms_by_id.get(room_id)
+
+    def get_graph(self, adventure_id: Optional[int]) -> Optional[AdventureGraph]:
+        self._ensure_loaded()
+        return self.graphs.get(adventure_id)
+
+    def get_monster(self, monster_name: str) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        return self.monsters.get(monster_name)
+
+    def get_monster_by_id(self, monster_id: int) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        return self.monsters_by_id.get(monster_id)
+
+    def search_rules(self, topic: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """
+        Top `limit` rules for `topic`, ranked by BM25 over the rule_fts index.
+
+        Results are memoized per normalized query until the next invalidate().
+        If rule_fts cannot be queried (e.g. SQLite built without FTS5) it falls
+        back to a substring scan.
+        """
+        self._ensure_loaded()
+        words = RULE_QUERY_WORD.findall(topic.lower())
+        cache_key = (" ".join(words), limit)
+        if cache_key in self._rule_matches:
+            return self._rule_matches[cache_key]
+
+        if not words:
+            matches = []
+        else:
+            try:
+                matches = self._search_rules_fts(words, limit)
+            except sqlite3.OperationalError:
+                matches = self._search_rules_scan(topic.lower(), limit)
+
+        if len(self._rule_matches) >= RULE_MATCH_CACHE_SIZE:
+            self._rule_matches.clear()
+        self._rule_matches[cache_key] = matches
+        return matches
+
+    def _search_rules_fts(self, words: List[str], limit: int) -> List[Dict[str, Any]]:
+        # Each word as a quoted prefix term, OR-ed so partial matches still rank
+        match_expr = " OR ".join(f'"{w}"*' for w in words)
+        rows = execute_query(
+            f"""
+            SELECT rowid AS id,
+                   snippet(rule_fts, -1, '[', ']', '...', 16) AS snippet,
+                   bm25(rule_fts, {RULE_FIELD_WEIGHTS}) AS score
+            FROM rule_fts
+            WHERE rule_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+            """,
+            (match_expr, limit),
+            fetch_all=True
+        )
+        results = []
+        for row in rows:
+            rule = self.rules_by_id.get(row['id'])
+            if rule:
+                results.append(dict(rule['_result'], snippet=row['snippet'], score=round(-row['score'], 3)))
+        return results
+
+    def _search_rules_scan(self, needle: str, limit: int) -> List[Dict[str, Any]]:
+        results = []
+        for rule in self.rules:
+            rule_topic, rule_tags = rule['_search']
+            if needle in rule_topic or needle in rule_tags:
+                results.append(dict(rule['_result']))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+content_cache = ContentCache()
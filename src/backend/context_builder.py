@@ -0,0 +1,238 @@
+"""
+Prompt assembly under a token budget.
+
+Builds the messages for a turn from the system prompt, a compact character
+sheet (plus what changed since the previous turn), as much recent history as
+fits in PROMPT_TOKEN_BUDGET, and a short "Previously:" recap of the older
+turns that were dropped. Tool outputs sent back for the follow-up call are
+capped at TOOL_RESULT_MAX_TOKENS each.
+
+Token counts use tiktoken when it is installed, otherwise a ~4 chars/token
+estimate.
+"""
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from content_cache import content_cache
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "4"))
+RECAP_MAX_TOKENS = int(os.getenv("RECAP_MAX_TOKENS", "120"))
+TOOL_RESULT_MAX_TOKENS = int(os.getenv("TOOL_RESULT_MAX_TOKENS", "600"))
+
+# Per-message framing overhead in the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+try:
+    import tiktoken
+    try:
+        _encoding = tiktoken.encoding_for_model(os.getenv("LLM_MODEL", "gpt-4o"))
+    except KeyError:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    total = 0
+    for m in messages:
+        content = m.get("content") if isinstance(m, dict) else getattr(m, "content", None)
+        total += MESSAGE_OVERHEAD_TOKENS + count_tokens(content or "")
+        tool_calls = m.get("tool_calls") if isinstance(m, dict) else getattr(m, "tool_calls", None)
+        for tc in tool_calls or []:
+            fn = tc["function"] if isinstance(tc, dict) else tc.function
+            name = fn["name"] if isinstance(fn, dict) else fn.name
+            arguments = fn["arguments"] if isinstance(fn, dict) else fn.arguments
+            total += count_tokens(name) + count_tokens(arguments)
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Character sheet
+# ---------------------------------------------------------------------------
+
+# Last sheet sent per (adventure, character), to report what changed between turns
+_last_sheets: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_last_sheets_lock = threading.Lock()
+LAST_SHEETS_MAX = 4096
+
+
+def compact_sheet(char_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Only the fields the DM needs, with ids, timestamps and empty values dropped."""
+    if "error" in char_data:
+        return dict(char_data)
+
+    sheet = {
+        "name": char_data.get("name"),
+        "class": char_data.get("class"),
+        "level": char_data.get("level"),
+        "hp": f"{char_data.get('hp')}/{char_data.get('max_hp')}",
+        "gold": char_data.get("gold"),
+        "abilities": char_data.get("abilities"),
+        "skills": char_data.get("skills"),
+        "inventory": [
+            f"{i.get('name')} x{i.get('qty', 1)}" if i.get("qty", 1) != 1 else i.get("name")
+            for i in char_data.get("inventory") or []
+        ],
+        "conditions": char_data.get("conditions"),
+    }
+    room = content_cache.get_room_by_id(char_data.get("location_room_id"))
+    if room:
+        sheet["location"] = f"{room['room_key']} ({room['title']})"
+    return {k: v for k, v in sheet.items() if v not in (None, [], {}, "")}
+
+
+def sheet_delta(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+    if previous is None:
+        return {}
+    return {k: v for k, v in current.items() if previous.get(k) != v}
+
+
+def character_context(character_name: str, char_data: Dict[str, Any]) -> str:
+    """
+    Compact sheet plus the fields that changed since this character's last turn.
+
+    Each request is stateless for the model, so the sheet itself is still sent;
+    the delta just points the DM at what moved.
+    """
+    sheet = compact_sheet(char_data)
+    # Same-named characters in different adventures are different characters
+    key = f"{char_data.get('adventure_id')}:{character_name}"
+    with _last_sheets_lock:
+        delta = sheet_delta(_last_sheets.get(key), sheet)
+        _last_sheets[key] = sheet
+        _last_sheets.move_to_end(key)
+        while len(_last_sheets) > LAST_SHEETS_MAX:
+            _last_sheets.popitem(last=False)
+
+    text = f"Character: {json.dumps(sheet, separators=(',', ':'), ensure_ascii=False)}"
+    if delta:
+        text += f"\nChanged since last turn: {json.dumps(delta, separators=(',', ':'), ensure_ascii=False)}"
+    return text
+
+
+# ---------------------------------------------------------------------------
+# History
+# ---------------------------------------------------------------------------
+
+_SENTENCE = re.compile(r"(.+?[.!?])(\s|$)", re.S)
+
+
+def _first_sentence(text: str, max_chars: int = 140) -> str:
+    text = " ".join((text or "").split())
+    match = _SENTENCE.match(text)
+    sentence = match.group(1) if match else text
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 3].rstrip() + "..."
+
+
+def summarize_turns(turns: List[Dict[str, Any]], max_tokens: int = RECAP_MAX_TOKENS) -> str:
+    """
+    Extractive recap of older turns: the first sentence of each message,
+    keeping the most recent ones when the recap would exceed `max_tokens`.
+    """
+    lines = []
+    for m in turns:
+        content = m.get("content")
+        if not content:
+            continue
+        speaker = "Player" if m.get("role") == "user" else "DM"
+        lines.append(f"{speaker}: {_first_sentence(content)}")
+
+    recap: List[str] = []
+    used = count_tokens("Previously:")
+    for line in reversed(lines):
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        recap.append(line)
+        used += cost
+    if not recap:
+        return ""
+    return "Previously:\n" + "\n".join(reversed(recap))
+
+
+def _clean_history(session_history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Keep only role/content of user/assistant messages (clients send extra keys)."""
+    return [
+        {"role": m["role"], "content": m["content"]}
+        for m in session_history
+        if m.get("role") in ("user", "assistant") and m.get("content")
+    ]
+
+
+def build_turn_messages(
+    system_prompt: str,
+    character_name: str,
+    char_data: Dict[str, Any],
+    player_input: str,
+    session_history: List[Dict[str, Any]],
+    budget: int = PROMPT_TOKEN_BUDGET,
+    flags: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Assemble the first-call messages within `budget` tokens.
+
+    `flags` are the game flags that matter in the current room; they ride in
+    the context message so world state need not be narrated in the history.
+    Returns (messages, stats) where stats breaks down the estimated tokens.
+    """
+    flag_line = f"\nFlags: {json.dumps(flags, separators=(',', ':'))}" if flags else ""
+    context_message = f"""{character_context(character_name, char_data)}{flag_line}
+Player Input: "{player_input}\""""
+
+    system = {"role": "system", "content": system_prompt}
+    user = {"role": "user", "content": context_message}
+    fixed = count_message_tokens([system, user])
+
+    history = _clean_history(session_history)
+    remaining = budget - fixed - RECAP_MAX_TOKENS - MESSAGE_OVERHEAD_TOKENS
+
+    # Newest-first until the budget or message cap is hit
+    kept: List[Dict[str, str]] = []
+    history_tokens = 0
+    for m in reversed(history):
+        cost = count_message_tokens([m])
+        if len(kept) >= HISTORY_MAX_MESSAGES or history_tokens + cost > remaining:
+            break
+        kept.append(m)
+        history_tokens += cost
+    kept.reverse()
+
+    dropped = history[:len(history) - len(kept)]
+    recap = summarize_turns(dropped)
+
+    messages = [system]
+    if recap:
+        messages.append({"role": "system", "content": recap})
+    messages.extend(kept)
+    messages.append(user)
+
+    recap_tokens = count_message_tokens(messages[1:2]) if recap else 0
+    stats = {
+        "fixed": fixed,
+        "history": history_tokens,
+        "history_messages": len(kept),
+        "recap": recap_tokens,
+        "total": fixed + history_tokens + recap_tokens,
+    }
+    return messages, stats
+
+
+def compact_tool_result(content: str, max_tokens: int = TOOL_RESULT_MAX_TOKENS) -> str:
+    """Cap a tool result sent back to the model for the follow-up call."""
+    if count_tokens(content) <= max_tokens:
+        return content
+    # ~4 chars per token; cut and flag it so the model knows
+    return content[:max_tokens * 4] + "...(truncated)"
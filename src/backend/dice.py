@@ -0,0 +1,295 @@
+"""
+Dice engine: 5e notation, seedable per-session rollers and bulk rolls.
+
+Notation (case and spaces are ignored):
+    1d20+5, d20, d%         dice terms with flat modifiers
+    2d6+1d4+3, 1d8-1        any number of terms joined by + or -
+    4d6kh3, 2d20kl1         keep the highest / lowest N (dh/dl drop them)
+    1d20+5 adv, 1d20 dis    advantage / disadvantage on the first d20
+A critical hit doubles the dice of every term; modifiers are added once.
+
+Parsed notations are cached, so a repeated roll skips the parser. Each play
+session rolls with its own DiceRoller; when DICE_SEED is set every roller is
+seeded from it and the session id, so replaying a session's turns in order
+reproduces its rolls. Bulk rolls (`roll_many`, `attacks`) use NumPy when it
+is installed and plain Python otherwise.
+"""
+import hashlib
+import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DICE_SEED = os.getenv("DICE_SEED")
+MAX_DICE_ROLLERS = int(os.getenv("MAX_DICE_ROLLERS", "10000"))
+MAX_DICE = 1000
+MAX_SIDES = 10000
+
+
+class DiceError(ValueError):
+    """Raised for notation that cannot be parsed or rolled."""
+
+
+class DiceTerm(NamedTuple):
+    sign: int       # +1 or -1
+    count: int
+    sides: int
+    keep: int       # dice kept; equals count when none are dropped
+    highest: bool   # keep the highest (True) or lowest (False) dice
+
+
+class DiceExpression(NamedTuple):
+    terms: Tuple[DiceTerm, ...]
+    modifier: int
+    notation: str               # canonical form, e.g. "2d20kh1+5"
+    d20_index: Optional[int]    # term whose kept die is the natural d20, if any
+
+
+_TERM = re.compile(r"([+-])(?:(\d*)d(\d+|%)(?:(kh|kl|dh|dl|k)(\d+))?|(\d+))")
+_MODE = re.compile(r"(advantage|adv|disadvantage|dis)$")
+_MODES = {
+    None: None, "": None, "normal": None, "none": None,
+    "adv": "advantage", "advantage": "advantage",
+    "dis": "disadvantage", "disadvantage": "disadvantage",
+}
+
+
+def _format(terms: Tuple[DiceTerm, ...], modifier: int) -> str:
+    parts = []
+    for t in terms:
+        keep = ""
+        if t.keep < t.count:
+            keep = f"{'kh' if t.highest else 'kl'}{t.keep}"
+        parts.append(f"{'-' if t.sign < 0 else '+'}{t.count}d{t.sides}{keep}")
+    if modifier:
+        parts.append(f"{modifier:+d}")
+    return "".join(parts).lstrip("+")
+
+
+def _normalize_mode(mode: Optional[str]) -> Optional[str]:
+    key = mode.strip().lower() if isinstance(mode, str) else mode
+    if key not in _MODES:
+        raise DiceError(f"Unknown roll mode: {mode}")
+    return _MODES[key]
+
+
+@lru_cache(maxsize=2048)
+def parse(notation: str, mode: Optional[str] = None) -> DiceExpression:
+    """Parse notation (plus an optional advantage/disadvantage mode) into a DiceExpression."""
+    text = "".join(str(notation).lower().split())
+    mode = _normalize_mode(mode)
+    suffix = _MODE.search(text)
+    if suffix:
+        mode = mode or _normalize_mode(suffix.group(1))
+        text = text[:suffix.start()]
+    if not text.startswith(("+", "-")):
+        text = "+" + text
+
+    terms: List[DiceTerm] = []
+    modifier = 0
+    pos = 0
+    while pos < len(text):
+        match = _TERM.match(text, pos)
+        if not match:
+            raise DiceError(f"Invalid dice notation: {notation}")
+        pos = match.end()
+        sign = -1 if match.group(1) == "-" else 1
+        if match.group(6) is not None:
+            modifier += sign * int(match.group(6))
+            continue
+
+        count = int(match.group(2) or 1)
+        sides = 100 if match.group(3) == "%" else int(match.group(3))
+        if not 1 <= count <= MAX_DICE or not 1 <= sides <= MAX_SIDES:
+            raise DiceError(f"Dice out of range in {notation}")
+        keep, highest = count, True
+        if match.group(4):
+            n = int(match.group(5))
+            op = match.group(4)
+            if op in ("kh", "k"):
+                keep = n
+            elif op == "kl":
+                keep, highest = n, False
+            elif op == "dl":
+                keep = count - n
+            else:  # dh
+                keep, highest = count - n, False
+            if not 0 < keep <= count:
+                raise DiceError(f"Cannot keep {keep} of {count} dice in {notation}")
+        terms.append(DiceTerm(sign, count, sides, keep, highest))
+
+    if not terms:
+        raise DiceError(f"No dice in notation: {notation}")
+
+    if mode:
+        # Advantage / disadvantage: roll the first plain d20 twice, keep one
+        index = next((i for i, t in enumerate(terms) if t.sides == 20 and t.count == 1), None)
+        if index is None:
+            raise DiceError(f"{mode.capitalize()} needs a single d20 term: {notation}")
+        terms[index] = DiceTerm(terms[index].sign, 2, 20, 1, mode == "advantage")
+
+    d20_index = next((i for i, t in enumerate(terms) if t.sides == 20 and t.keep == 1), None)
+    return DiceExpression(tuple(terms), modifier, _format(tuple(terms), modifier), d20_index)
+
+
+class DiceRoller:
+    """A seedable source of rolls (one per play session)."""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(64)
+        self.random = random.Random(self.seed)
+        self._numpy_rng = None
+
+    def numpy_rng(self):
+        if self._numpy_rng is None:
+            self._numpy_rng = np.random.default_rng(self.seed)
+        return self._numpy_rng
+
+    # -- single rolls ----------------------------------------------------------
+
+    def roll(self, notation: str, mode: Optional[str] = None, critical: bool = False) -> Dict[str, Any]:
+        """Roll once; returns the total with every term's dice and any natural 20/1."""
+        expr = parse(notation, mode)
+        rand = self.random.random
+        total = expr.modifier
+        terms = []
+        for t in expr.terms:
+            count, keep = (t.count * 2, t.keep * 2) if critical else (t.count, t.keep)
+            sides = t.sides
+            rolls = [int(rand() * sides) + 1] if count == 1 else [int(rand() * sides) + 1 for _ in range(count)]
+            kept = rolls if keep == count else sorted(rolls, reverse=t.highest)[:keep]
+            subtotal = sum(kept)
+            total += t.sign * subtotal
+            terms.append({"dice": f"{count}d{sides}", "rolls": rolls, "kept": kept, "sign": t.sign})
+
+        result = {"expression": expr.notation, "total": total, "terms": terms, "modifier": expr.modifier}
+        if expr.d20_index is not None and not critical:
+            natural = terms[expr.d20_index]["kept"][0]
+            result.update(natural=natural, critical=natural == 20, fumble=natural == 1)
+        return result
+
+    def total(self, notation: str, mode: Optional[str] = None, critical: bool = False) -> int:
+        """Just the total of one roll, without the per-die breakdown (for hot loops)."""
+        expr = parse(notation, mode)
+        rand = self.random.random
+        total = expr.modifier
+        for t in expr.terms:
+            count, keep = (t.count * 2, t.keep * 2) if critical else (t.count, t.keep)
+            sides = t.sides
+            if count == 1:
+                total += t.sign * (int(rand() * sides) + 1)
+                continue
+            rolls = [int(rand() * sides) + 1 for _ in range(count)]
+            if keep < count:
+                rolls = sorted(rolls, reverse=t.highest)[:keep]
+            total += t.sign * sum(rolls)
+        return total
+
+    # -- bulk rolls ------------------------------------------------------------
+
+    def roll_many(self, notation: str, n: int, mode: Optional[str] = None, critical: bool = False):
+        """
+        Totals of `n` independent rolls: a NumPy int array when NumPy is
+        installed, otherwise a list of ints.
+        """
+        expr = parse(notation, mode)
+        if np is not None:
+            gen = self.numpy_rng()
+            totals = np.full(n, expr.modifier, dtype=np.int64)
+            for t in expr.terms:
+                count, keep = (t.count * 2, t.keep * 2) if critical else (t.count, t.keep)
+                faces = gen.integers(1, t.sides + 1, size=(n, count))
+                if keep < count:
+                    faces.sort(axis=1)
+                    faces = faces[:, count - keep:] if t.highest else faces[:, :keep]
+                totals += t.sign * faces.sum(axis=1)
+            return totals
+
+        rand = self.random.random
+        totals = [expr.modifier] * n
+        for t in expr.terms:
+            count, keep = (t.count * 2, t.keep * 2) if critical else (t.count, t.keep)
+            sides, sign = t.sides, t.sign
+            if count == 1:
+                for i in range(n):
+                    totals[i] += sign * (int(rand() * sides) + 1)
+            elif keep == count:
+                for i in range(n):
+                    totals[i] += sign * sum([int(rand() * sides) + 1 for _ in range(count)])
+            else:
+                for i in range(n):
+                    rolls = sorted([int(rand() * sides) + 1 for _ in range(count)], reverse=t.highest)
+                    totals[i] += sign * sum(rolls[:keep])
+        return totals
+
+    def attacks(self, n: int, attack_bonus: int, target_ac: int, damage: str,
+                mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Resolve `n` attack rolls at once. A natural 20 always hits and doubles
+        the damage dice, a natural 1 always misses. Returns per-attack
+        `hits`, `crits` and `damage` (NumPy arrays, or lists without NumPy).
+        """
+        naturals = self.roll_many("1d20", n, mode)
+        if np is not None:
+            crits = naturals == 20
+            hits = crits | ((naturals != 1) & (naturals + attack_bonus >= target_ac))
+            damage_rolls = np.where(
+                crits,
+                self.roll_many(damage, n, critical=True),
+                self.roll_many(damage, n)
+            )
+            return {"hits": hits, "crits": crits, "damage": np.where(hits, np.maximum(damage_rolls, 0), 0)}
+
+        crits = [d == 20 for d in naturals]
+        hits = [c or (d != 1 and d + attack_bonus >= target_ac) for d, c in zip(naturals, crits)]
+        damage_rolls = []
+        for hit, crit in zip(hits, crits):
+            damage_rolls.append(max(0, self.roll(damage, critical=crit)["total"]) if hit else 0)
+        return {"hits": hits, "crits": crits, "damage": damage_rolls}
+
+
+# ---------------------------------------------------------------------------
+# Per-session rollers
+# ---------------------------------------------------------------------------
+
+_rollers: "OrderedDict[str, DiceRoller]" = OrderedDict()
+_rollers_lock = threading.Lock()
+
+
+def session_seed(session_id: str) -> Optional[int]:
+    """Deterministic seed for a session when DICE_SEED is set, else None (random)."""
+    if DICE_SEED is None:
+        return None
+    digest = hashlib.sha256(f"{DICE_SEED}:{session_id}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def roller_for(session_id: str) -> DiceRoller:
+    """The session's roller, created (and seeded) on first use."""
+    with _rollers_lock:
+        roller = _rollers.get(session_id)
+        if roller is None:
+            roller = _rollers[session_id] = DiceRoller(session_seed(session_id))
+        _rollers.move_to_end(session_id)
+        while len(_rollers) > MAX_DICE_ROLLERS:
+            _rollers.popitem(last=False)
+        return roller
+
+
+def reseed(session_id: str, seed: int) -> DiceRoller:
+    """Restart a session's rolls from `seed`, e.g. to replay its turns."""
+    with _rollers_lock:
+        roller = _rollers[session_id] = DiceRoller(seed)
+        return roller
+
+
+# Rolls made outside any session
+default_roller = DiceRoller(session_seed("default"))
@@ -0,0 +1,333 @@
+"""
+Headless encounter simulator for balancing monsters without the LLM.
+
+Fights a character row against the live monsters of a room (or any monster
+templates) thousands of times, split across worker processes, and reports
+win rate, rounds to finish and the character's remaining HP. Stat blocks come
+from `get_monster_stats`, rolls from the dice engine behind `roll_dice`, and
+HP changes follow the `update_character_data` rules (damage floors at 0).
+
+Each simulated round: the side that won initiative attacks first; the
+character attacks the first monster still standing, every living monster
+attacks the character with its first action. A natural 20 hits and doubles
+the damage dice, a natural 1 misses. Fights still going after --max-rounds
+count as draws.
+
+Usage: python encounter_sim.py --character Kraven --room room_1 [--encounters 100000]
+       python encounter_sim.py --character Kraven --monster "Frost Harpy" --count 2 \\
+                               [--monster-hp 30] [--monster-ac 12] [--processes 8] [--seed 1]
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dice import DiceRoller, parse
+from tools import _apply_number, get_monster_stats
+
+# Weapon damage dice, and which weapons may use Dexterity
+WEAPON_DICE = {
+    "club": "1d4", "dagger": "1d4", "handaxe": "1d6", "mace": "1d6", "quarterstaff": "1d6",
+    "spear": "1d6", "shortsword": "1d6", "scimitar": "1d6", "battleaxe": "1d8", "longsword": "1d8",
+    "rapier": "1d8", "warhammer": "1d8", "greataxe": "1d12", "greatsword": "2d6", "maul": "2d6",
+}
+FINESSE = {"dagger", "rapier", "scimitar", "shortsword"}
+# name -> (base AC, max Dex bonus or None for unlimited)
+ARMOR = {
+    "leather armor": (11, None), "studded leather": (12, None), "hide armor": (12, 2),
+    "chain shirt": (13, 2), "scale mail": (14, 2), "breastplate": (14, 2), "half plate": (15, 2),
+    "ring mail": (14, 0), "chain mail": (16, 0), "splint": (17, 0), "plate": (18, 0),
+}
+
+_DAMAGE = re.compile(r"^\s*([0-9d+\-\s]+)")
+
+
+class Combatant(NamedTuple):
+    name: str
+    hp: int
+    ac: int
+    attack_bonus: int
+    damage: str         # dice notation, e.g. "1d8+3"
+    attacks: int        # attacks per round
+    initiative: int     # Dexterity modifier
+
+
+def _modifier(score: Optional[int]) -> int:
+    return ((score or 10) - 10) // 2
+
+
+def character_combatant(char: Dict[str, Any]) -> Combatant:
+    """Attack and defence numbers for a character row, from its class, level, abilities and gear."""
+    abilities = char.get("abilities") or {}
+    items = [str(i.get("name", "")).lower() for i in char.get("inventory") or []]
+    str_mod, dex_mod = _modifier(abilities.get("str")), _modifier(abilities.get("dex"))
+    level = char.get("level") or 1
+    proficiency = 2 + (level - 1) // 4
+
+    weapon = next((i for i in items if i in WEAPON_DICE), None)
+    ability = max(str_mod, dex_mod) if weapon in FINESSE else str_mod
+    damage = f"{WEAPON_DICE[weapon]}{ability:+d}" if weapon else f"1d1{str_mod:+d}"
+
+    armor = next((ARMOR[i] for i in items if i in ARMOR), None)
+    if armor:
+        base, max_dex = armor
+        ac = base + (dex_mod if max_dex is None else min(dex_mod, max_dex))
+    else:
+        ac = 10 + dex_mod
+    if "shield" in items:
+        ac += 2
+
+    extra_attack = (char.get("class") or "").lower() == "fighter" and level >= 5
+    return Combatant(
+        name=char["name"], hp=char.get("hp") or char.get("max_hp") or 1, ac=ac,
+        attack_bonus=ability + proficiency, damage=damage,
+        attacks=2 if extra_attack else 1, initiative=dex_mod,
+    )
+
+
+def monster_combatant(template: Dict[str, Any], name: Optional[str] = None, hp: Optional[int] = None) -> Combatant:
+    """Combat numbers for a monster template (as returned by get_monster_stats)."""
+    action = next((a for a in template.get("actions") or [] if "to_hit" in a), None)
+    if action:
+        match = _DAMAGE.match(action.get("damage", ""))
+        damage = "".join(match.group(1).split()) if match else "1d4"
+        attack_bonus = int(action["to_hit"])
+    else:
+        damage, attack_bonus = "1d4", 0
+    parse(damage)   # fail early on notation the dice engine cannot roll
+    return Combatant(
+        name=name or template["name"],
+        hp=hp or template.get("hp") or template.get("base_hp") or 1,
+        ac=template.get("ac") or template.get("base_ac") or 10,
+        attack_bonus=attack_bonus, damage=damage, attacks=1,
+        initiative=_modifier((template.get("abilities") or {}).get("dex")),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Simulation (runs in worker processes; no database access)
+# ---------------------------------------------------------------------------
+
+def _attack(roller: DiceRoller, attacker: Combatant, target_ac: int) -> int:
+    """Damage dealt by one attack (0 on a miss)."""
+    natural = roller.total("1d20")
+    if natural == 1:
+        return 0
+    if natural == 20:
+        return max(0, roller.total(attacker.damage, critical=True))
+    if natural + attacker.attack_bonus < target_ac:
+        return 0
+    return max(0, roller.total(attacker.damage))
+
+
+def simulate(character: Combatant, monsters: List[Combatant], encounters: int,
+             seed: int, max_rounds: int) -> Dict[str, Any]:
+    """Run `encounters` fights; returns counters that `merge` can add up."""
+    roller = DiceRoller(seed)
+    wins, losses, hp_left = Counter(), Counter(), Counter()
+    draws = 0
+    total_rounds = 0
+    monster_init = max(m.initiative for m in monsters)
+
+    for _ in range(encounters):
+        hp = character.hp
+        monster_hp = [m.hp for m in monsters]
+        character_first = roller.total("1d20") + character.initiative >= roller.total("1d20") + monster_init
+        target = 0
+        rounds = 0
+        while rounds < max_rounds:
+            rounds += 1
+            for side in ((0, 1) if character_first else (1, 0)):
+                if side == 0:
+                    for _ in range(character.attacks):
+                        damage = _attack(roller, character, monsters[target].ac)
+                        if damage:
+                            monster_hp[target] = _apply_number("hp", monster_hp[target], "decrement", damage)
+                            while target < len(monsters) and monster_hp[target] == 0:
+                                target += 1
+                        if target == len(monsters):
+                            break
+                    if target == len(monsters):
+                        break
+                else:
+                    for i in range(target, len(monsters)):
+                        if monster_hp[i] > 0:
+                            damage = _attack(roller, monsters[i], character.ac)
+                            if damage:
+                                hp = _apply_number("hp", hp, "decrement", damage)
+                                if hp == 0:
+                                    break
+                    if hp == 0:
+                        break
+            if target == len(monsters) or hp == 0:
+                break
+
+        total_rounds += rounds
+        if target == len(monsters):
+            wins[rounds] += 1
+            hp_left[hp] += 1
+        elif hp == 0:
+            losses[rounds] += 1
+        else:
+            draws += 1
+
+    return {"wins": wins, "losses": losses, "hp_left": hp_left, "draws": draws, "rounds": total_rounds}
+
+
+def _simulate_chunk(args: Tuple) -> Dict[str, Any]:
+    return simulate(*args)
+
+
+def merge(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged = {"wins": Counter(), "losses": Counter(), "hp_left": Counter(), "draws": 0, "rounds": 0}
+    for r in results:
+        for key in ("wins", "losses", "hp_left"):
+            merged[key].update(r[key])
+        merged["draws"] += r["draws"]
+        merged["rounds"] += r["rounds"]
+    return merged
+
+
+def run(character: Combatant, monsters: List[Combatant], encounters: int, processes: int,
+        seed: int = 0, max_rounds: int = 100, chunk_size: int = 5000) -> Dict[str, Any]:
+    """Split the encounters into seeded chunks and simulate them across `processes` workers."""
+    chunks = []
+    remaining = encounters
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        chunks.append((character, monsters, size, seed * 1_000_003 + len(chunks), max_rounds))
+        remaining -= size
+
+    if processes <= 1:
+        return merge([_simulate_chunk(c) for c in chunks])
+    with multiprocessing.Pool(processes) as pool:
+        return merge(pool.map(_simulate_chunk, chunks))
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def counter_percentile(counter: Counter, pct: float) -> Optional[int]:
+    total = sum(counter.values())
+    if not total:
+        return None
+    threshold = pct / 100 * (total - 1)
+    seen = 0
+    for value in sorted(counter):
+        seen += counter[value]
+        if seen > threshold:
+            return value
+    return max(counter)
+
+
+def counter_mean(counter: Counter) -> Optional[float]:
+    total = sum(counter.values())
+    return sum(v * n for v, n in counter.items()) / total if total else None
+
+
+def describe(c: Combatant) -> str:
+    attacks = f"{c.attacks}x " if c.attacks > 1 else ""
+    return f"{c.name} (HP {c.hp}, AC {c.ac}, {attacks}{c.attack_bonus:+d} to hit, {c.damage})"
+
+
+def report(character: Combatant, monsters: List[Combatant], result: Dict[str, Any], encounters: int,
+           elapsed: float, processes: int) -> None:
+    wins, losses, hp_left = result["wins"], result["losses"], result["hp_left"]
+    n_wins = sum(wins.values())
+    print(f"{describe(character)}")
+    print(f"  vs {', '.join(describe(m) for m in monsters)}")
+    print(f"encounters {encounters:,}  rounds {result['rounds']:,}  time {elapsed:.1f}s  "
+          f"({result['rounds'] / elapsed:,.0f} rounds/s on {processes} process{'es' if processes != 1 else ''})")
+    print(f"win rate {n_wins / encounters:.1%}  loss rate {sum(losses.values()) / encounters:.1%}  "
+          f"draws {result['draws'] / encounters:.1%}")
+
+    for label, counter in (("rounds to win", wins), ("rounds to lose", losses)):
+        if counter:
+            print(f"{label:<15} mean {counter_mean(counter):.1f}  p50 {counter_percentile(counter, 50)}  "
+                  f"p90 {counter_percentile(counter, 90)}  max {max(counter)}")
+    if hp_left:
+        print(f"{'HP left (wins)':<15} mean {counter_mean(hp_left):.1f}  p10 {counter_percentile(hp_left, 10)}  "
+              f"p50 {counter_percentile(hp_left, 50)}  p90 {counter_percentile(hp_left, 90)}")
+        buckets = Counter()
+        for value, n in hp_left.items():
+            buckets[min(3, (value - 1) * 4 // max(1, character.hp))] += n
+        shares = "  ".join(
+            f"{label} {buckets[i] / n_wins:.0%}"
+            for i, label in enumerate(("1-25%", "26-50%", "51-75%", "76-100%"))
+        )
+        print(f"{'HP left share':<15} {shares}")
+
+
+def load_matchup(args) -> Tuple[Combatant, List[Combatant]]:
+    """Character and monsters from the database, with any CLI overrides applied."""
+    from content_cache import content_cache
+    from database import execute_query
+    from tools import get_character_data
+
+    char = get_character_data(args.character, args.adventure_id)
+    if "error" in char:
+        raise SystemExit(char["error"])
+    character = character_combatant(char)
+    if args.full_hp:
+        character = character._replace(hp=char.get("max_hp") or character.hp)
+
+    monsters: List[Combatant] = []
+    if args.monster:
+        template = get_monster_stats(args.monster)
+        if "error" in template:
+            raise SystemExit(f"Monster {args.monster} not found")
+        for i in range(args.count):
+            name = template["name"] if args.count == 1 else f"{template['name']} {i + 1}"
+            monsters.append(monster_combatant(template, name))
+    else:
+        room = content_cache.get_room(args.room, char["adventure_id"])
+        if not room:
+            raise SystemExit(f"Room {args.room} not found")
+        instances = execute_query(
+            "SELECT instance_name, current_hp, monster_id FROM monster_instance WHERE room_id = ? AND status = 'alive'",
+            (room["id"],), fetch_all=True
+        )
+        for m in instances:
+            template = get_monster_stats(content_cache.get_monster_by_id(m["monster_id"])["name"])
+            monsters.append(monster_combatant(template, m["instance_name"], m["current_hp"]))
+        if not monsters:
+            raise SystemExit(f"No live monsters in {args.room}")
+
+    if args.monster_hp:
+        monsters = [m._replace(hp=args.monster_hp) for m in monsters]
+    if args.monster_ac:
+        monsters = [m._replace(ac=args.monster_ac) for m in monsters]
+    return character, monsters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--character", default="Kraven")
+    parser.add_argument("--adventure-id", type=int, default=None)
+    parser.add_argument("--room", default="room_1", help="fight the live monsters of this room")
+    parser.add_argument("--monster", help="fight this monster template instead of a room")
+    parser.add_argument("--count", type=int, default=1, help="how many of --monster")
+    parser.add_argument("--monster-hp", type=int, help="override every monster's HP")
+    parser.add_argument("--monster-ac", type=int, help="override every monster's AC")
+    parser.add_argument("--full-hp", action="store_true", help="start the character at max HP")
+    parser.add_argument("--encounters", type=int, default=100_000)
+    parser.add_argument("--max-rounds", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    character, monsters = load_matchup(args)
+    start = time.perf_counter()
+    result = run(character, monsters, args.encounters, args.processes, args.seed, args.max_rounds)
+    report(character, monsters, result, args.encounters, time.perf_counter() - start, args.processes)
+
+
+if __name__ == "__main__":
+    main()
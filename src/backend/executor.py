@@ -0,0 +1,20 @@
+"""
+The bounded thread pool for blocking work (sqlite3 queries, tools), so the
+event loop stays free. Shared by the agent, the session store and the API.
+"""
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "16"))
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking function on the bounded tool pool, in the caller's trace context."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(tool_executor, partial(context.run, func, *args, **kwargs))
@@ -0,0 +1,240 @@
+"""
+Local fake of the OpenAI chat completions API for offline benchmarks.
+
+The fake DM asks for `get_room_details` and `roll_dice` on the first
+(tool-enabled) request and answers the follow-up with a JSON narration,
+mirroring the two round trips of a real turn.
+
+It also mimics provider-side prompt caching so cache hit rates can be
+measured offline: the request prefix (tools, then messages, as sent) is
+cached in 128-token blocks once it reaches 1024 tokens, and `usage` reports
+the cached part as `prompt_tokens_details.cached_tokens`. Tokens are
+estimated at ~4 characters each.
+
+For load tests it can also misbehave like a busy provider: answer 429 (with
+Retry-After) to a random `error_rate` of requests and to any request beyond
+`capacity` in flight, and make a `slow_rate` of requests take `slow_latency`
+instead of `latency`.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+# Prompt caching as OpenAI describes it: prefixes of 1024+ tokens, in 128-token steps
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+CHARS_PER_TOKEN = 4
+
+
+class PrefixCache:
+    """Remembers every cacheable prefix seen and reports how much of a new prompt matches one."""
+
+    def __init__(self):
+        self.seen = set()
+
+    def usage(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = json.dumps(body.get("tools") or [], separators=(",", ":")) + \
+            json.dumps(body.get("messages") or [], separators=(",", ":"))
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+        cached = 0
+        digest = hashlib.sha256()
+        position = 0
+        for end in range(CACHE_MIN_TOKENS, prompt_tokens + 1, CACHE_BLOCK_TOKENS):
+            digest.update(prompt[position:end * CHARS_PER_TOKEN].encode())
+            position = end * CHARS_PER_TOKEN
+            # The digest covers the whole prefix up to `end`, so a hit means all of it matched
+            key = digest.copy().hexdigest()
+            if key in self.seen:
+                cached = end
+            self.seen.add(key)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": 0,
+            "total_tokens": prompt_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+
+def _completion(message: Dict[str, Any], finish_reason: str, model: str, usage: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": usage,
+    }
+
+
+def _chunk(delta: Dict[str, Any], finish_reason, model: str, chunk_id: str) -> str:
+    payload = {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+async def _stream(message: Dict[str, Any], finish_reason: str, model: str, token_delay: float,
+                  usage: Dict[str, Any] = None):
+    """Replay a complete message as OpenAI-style SSE chunks (plus a usage chunk when asked for)."""
+    chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    yield _chunk({"role": "assistant", "content": ""}, None, model, chunk_id)
+    if message.get("tool_calls"):
+        for index, call in enumerate(message["tool_calls"]):
+            yield _chunk({"tool_calls": [dict(call, index=index)]}, None, model, chunk_id)
+    else:
+        content = message["content"]
+        for start in range(0, len(content), 8):
+            await asyncio.sleep(token_delay)
+            yield _chunk({"content": content[start:start + 8]}, None, model, chunk_id)
+    yield _chunk({}, finish_reason, model, chunk_id)
+    if usage is not None:
+        yield f"data: {json.dumps({'id': chunk_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model, 'choices': [], 'usage': usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def _tool_call(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": f"call_{uuid.uuid4().hex[:12]}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)},
+    }
+
+
+def default_tool_calls(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Tool calls the fake DM makes on the first request of a turn."""
+    return [
+        _tool_call("get_room_details", {"room_key": "room_1"}),
+        _tool_call("roll_dice", {"notation": "1d20+3", "reason": "perception check"}),
+    ]
+
+
+def default_narration(body: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON reply the fake DM gives once tool results are in."""
+    return {
+        "narration": "Wind howls across the ledge as you peer into the blue haze of the chasm.",
+        "out_of_character": "Perception check resolved by the fake LLM.",
+    }
+
+
+def _rate_limited(retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"error": {"message": "Rate limit reached (fake LLM)", "type": "requests", "code": "rate_limit_exceeded"}},
+        status_code=429,
+        headers={"retry-after-ms": str(int(retry_after * 1000))},
+    )
+
+
+def create_fake_llm_app(latency: float = 0.05, token_delay: float = 0.005, error_rate: float = 0.0,
+                        capacity: int = 0, slow_rate: float = 0.0, slow_latency: float = 1.0,
+                        retry_after: float = 0.05, seed: int = 0) -> FastAPI:
+    """
+    Build an OpenAI-compatible app that sleeps `latency` seconds per request
+    (time to first token) and `token_delay` between streamed chunks, with
+    optional injected 429s and slow requests (see the module docstring).
+    """
+    app = FastAPI(title="Fake LLM")
+    app.state.latency = latency
+    app.state.token_delay = token_delay
+    app.state.error_rate = error_rate
+    app.state.capacity = capacity
+    app.state.slow_rate = slow_rate
+    app.state.slow_latency = slow_latency
+    app.state.retry_after = retry_after
+    app.state.rng = random.Random(seed)
+    app.state.request_count = 0
+    app.state.rate_limited = 0
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+    app.state.prefix_cache = PrefixCache()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.request_count += 1
+        over_capacity = app.state.capacity and app.state.in_flight >= app.state.capacity
+        if over_capacity or app.state.rng.random() < app.state.error_rate:
+            app.state.rate_limited += 1
+            return _rate_limited(app.state.retry_after)
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        try:
+            slow = app.state.rng.random() < app.state.slow_rate
+            await asyncio.sleep(app.state.slow_latency if slow else app.state.latency)
+        finally:
+            app.state.in_flight -= 1
+
+        model = body.get("model", "fake-model")
+        messages = body.get("messages", [])
+        has_tool_results = any(m.get("role") == "tool" for m in messages)
+        # Single-call mode puts room details and dice in the prompt; answer directly
+        prefetched = any(
+            m.get("role") == "system" and "(prefetched" in (m.get("content") or "") for m in messages
+        )
+        if body.get("tools") and not has_tool_results and not prefetched:
+            message = {"role": "assistant", "content": None, "tool_calls": default_tool_calls(body)}
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": json.dumps(default_narration(body))}
+            finish_reason = "stop"
+
+        usage = app.state.prefix_cache.usage(body)
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return StreamingResponse(
+                _stream(message, finish_reason, model, app.state.token_delay, usage if include_usage else None),
+                media_type="text/event-stream"
+            )
+        return _completion(message, finish_reason, model, usage)
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeLLMServer:
+    """Runs the fake LLM app with uvicorn on a background thread."""
+
+    def __init__(self, latency: float = 0.05, port: int = 0, token_delay: float = 0.005, **faults: Any):
+        self.app = create_fake_llm_app(latency, token_delay, **faults)
+        self.port = port or _free_port()
+        self.server = uvicorn.Server(
+            uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def __enter__(self) -> "FakeLLMServer":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    uvicorn.run(create_fake_llm_app(), host="127.0.0.1", port=8001)
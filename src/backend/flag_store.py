@@ -0,0 +1,164 @@
+"""
+Game flags (door states, quest progress, triggered traps) held in memory per
+adventure and backed by the game_flag table.
+
+An adventure's flags are loaded with one SELECT the first time a turn in it
+needs them and served from memory afterwards. A turn changes flags in its
+TurnState; the changes are written in the same transaction as the character
+row when the turn ends and applied to memory once that commits. Setting a
+flag to null deletes it.
+
+Flag names that start with a room key ("room_2.ward_broken",
+"room_2_door_open") belong to that room; any other name is adventure-wide.
+The prompt carries the current room's flags plus the adventure-wide ones.
+Values are stored as JSON (true, 3, "open").
+"""
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from database import execute_query, transaction
+
+logger = logging.getLogger(__name__)
+
+FLAG_PROMPT_LIMIT = int(os.getenv("FLAG_PROMPT_LIMIT", "24"))     # flags shown to the DM per turn
+MAX_FLAGS_PER_CALL = 32
+MAX_FLAG_VALUE_CHARS = 200
+
+FLAG_NAME = re.compile(r"^[A-Za-z0-9_.:\-]{1,64}$")
+_ROOM_SEPARATORS = re.compile(r"[._]")
+
+
+def encode_value(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def decode_value(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return text
+
+
+def check_flag_changes(flags: Any) -> Dict[str, Any]:
+    """Validate a set_flags payload; raises ValueError with a message for the DM."""
+    if not isinstance(flags, dict) or not flags:
+        raise ValueError("flags must be an object of flag name -> value")
+    if len(flags) > MAX_FLAGS_PER_CALL:
+        raise ValueError(f"At most {MAX_FLAGS_PER_CALL} flags per call")
+    for name, value in flags.items():
+        if not FLAG_NAME.match(name):
+            raise ValueError(f"Invalid flag name '{name}' (letters, digits, _ . : - up to 64 chars)")
+        if len(encode_value(value)) > MAX_FLAG_VALUE_CHARS:
+            raise ValueError(f"Value of '{name}' is too long")
+    return flags
+
+
+class FlagStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flags: Dict[int, Dict[str, Any]] = {}                # adventure_id -> name -> value
+        self._rooms: Dict[int, Dict[str, Optional[str]]] = {}      # adventure_id -> name -> room key
+
+    # -- reads ---------------------------------------------------------------
+
+    def load(self, adventure_id: Optional[int]) -> Dict[str, Any]:
+        """All flags of an adventure (read-only view); loads them on first use."""
+        if adventure_id is None:
+            return {}
+        flags = self._flags.get(adventure_id)
+        if flags is not None:
+            return flags
+        rows = execute_query(
+            "SELECT name, value FROM game_flag WHERE adventure_id = ?", (adventure_id,), fetch_all=True
+        )
+        loaded = {r['name']: decode_value(r['value']) for r in rows}
+        with self._lock:
+            return self._flags.setdefault(adventure_id, loaded)
+
+    def get_many(self, adventure_id: Optional[int], names: Iterable[str]) -> Dict[str, Any]:
+        flags = self.load(adventure_id)
+        return {name: flags.get(name) for name in names}
+
+    def room_of(self, adventure_id: int, name: str, room_keys: Iterable[str]) -> Optional[str]:
+        """The room key a flag name starts with (longest match), or None for adventure-wide flags."""
+        rooms = self._rooms.setdefault(adventure_id, {})
+        if name not in rooms:
+            keys = set(room_keys)
+            owner = None
+            for match in _ROOM_SEPARATORS.finditer(name):
+                if name[:match.start()] in keys:
+                    owner = name[:match.start()]
+            rooms[name] = owner
+        return rooms[name]
+
+    def relevant(self, adventure_id: Optional[int], room_key: Optional[str],
+                 room_keys: Iterable[str] = ()) -> Dict[str, Any]:
+        """Flags for the prompt: the room's own and the adventure-wide ones, in name order."""
+        flags = self.load(adventure_id)
+        if not flags:
+            return {}
+        room_keys = list(room_keys)
+        picked = {}
+        for name in sorted(flags):
+            if self.room_of(adventure_id, name, room_keys) in (None, room_key):
+                picked[name] = flags[name]
+                if len(picked) >= FLAG_PROMPT_LIMIT:
+                    break
+        return picked
+
+    # -- writes --------------------------------------------------------------
+
+    @staticmethod
+    def write(conn, adventure_id: int, changes: Dict[str, Any]) -> None:
+        """Write flag changes in the caller's transaction (null deletes the flag)."""
+        deleted = [(adventure_id, name) for name, value in changes.items() if value is None]
+        upserts = [(adventure_id, name, encode_value(value)) for name, value in changes.items() if value is not None]
+        if upserts:
+            conn.executemany(
+                """
+                INSERT INTO game_flag (adventure_id, name, value) VALUES (?, ?, ?)
+                ON CONFLICT (adventure_id, name) DO UPDATE SET value = excluded.value
+                """,
+                upserts
+            )
+        if deleted:
+            conn.executemany("DELETE FROM game_flag WHERE adventure_id = ? AND name = ?", deleted)
+
+    def apply(self, adventure_id: int, changes: Dict[str, Any]) -> None:
+        """Apply committed changes to memory (copy-on-write, so readers never see a half-applied set)."""
+        with self._lock:
+            flags = dict(self._flags.get(adventure_id, {}))
+            for name, value in changes.items():
+                if value is None:
+                    flags.pop(name, None)
+                else:
+                    flags[name] = value
+            self._flags[adventure_id] = flags
+
+    def set_many(self, adventure_id: int, changes: Dict[str, Any]) -> None:
+        """Write and apply changes outside a turn, in one transaction."""
+        self.load(adventure_id)
+        with transaction() as conn:
+            self.write(conn, adventure_id, changes)
+        self.apply(adventure_id, changes)
+
+    def invalidate(self, adventure_id: Optional[int] = None) -> None:
+        """Forget cached flags (all adventures by default); the next read reloads them."""
+        with self._lock:
+            if adventure_id is None:
+                self._flags.clear()
+                self._rooms.clear()
+            else:
+                self._flags.pop(adventure_id, None)
+                self._rooms.pop(adventure_id, None)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"adventures": len(self._flags), "flags": sum(len(f) for f in self._flags.values())}
+
+
+flag_store = FlagStore()
@@ -0,0 +1,382 @@
+"""
+The DM's reply format (GameResponse) and how replies are parsed.
+
+Every LLM call asks for structured output: a strict JSON schema generated
+from GameResponse (STRUCTURED_OUTPUT=json_schema, the default), plain JSON
+mode for providers without schema support (json_object), or nothing (off).
+
+Parsing is a single pass with a local repair path, so a malformed reply
+never costs another round trip:
+  1. valid JSON that matches the model            -> "ok"
+  2. fixable locally (code fences, prose around the object, trailing
+     commas, a reply cut off mid-object, misnamed or mistyped fields)
+                                                  -> "repaired"
+  3. anything else becomes plain narration        -> "raw"
+
+NarrationStream pulls the narration out of a reply while it is still
+streaming; the repair path uses it for replies cut off inside the narration.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "json_schema")   # json_schema | json_object | off
+
+RAW_TEXT_NOTE = "Model output raw text."
+SILENT_NARRATION = "The DM is silent."
+
+# Parse outcomes
+OK = "ok"
+REPAIRED = "repaired"
+RAW = "raw"
+
+
+class DiceRollRecord(BaseModel):
+    purpose: str
+    notation: str
+    result: int
+    dc: Optional[int] = None
+    success: Optional[bool] = None
+
+
+class GameResponse(BaseModel):
+    """The DM's reply for one turn. State changes are made with tools, not reported here."""
+    narration: str
+    out_of_character: Optional[str] = None
+    dice_rolls: List[DiceRollRecord] = []
+    next_prompt_suggestion: Optional[str] = None
+
+    def to_result(self) -> Dict[str, Any]:
+        """The response dict passed around the backend (empty optional fields left out)."""
+        result = self.model_dump(exclude_none=True)
+        if not result["dice_rolls"]:
+            del result["dice_rolls"]
+        return result
+
+
+# Field names the model sometimes uses instead of ours
+FIELD_ALIASES = {
+    "out_of_character_notes": "out_of_character",
+    "ooc": "out_of_character",
+    "notes": "out_of_character",
+    "text": "narration",
+    "message": "narration",
+    "response": "narration",
+    "next_prompt": "next_prompt_suggestion",
+}
+
+
+def strict_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A pydantic JSON schema in the form strict structured outputs require:
+    every object closed and every property required (optional ones are
+    nullable instead); titles and defaults dropped.
+    """
+    if isinstance(schema, list):
+        return [strict_schema(s) for s in schema]
+    if not isinstance(schema, dict):
+        return schema
+    out = {k: strict_schema(v) for k, v in schema.items() if k not in ("title", "default")}
+    if out.get("type") == "object" and "properties" in out:
+        out["additionalProperties"] = False
+        out["required"] = list(out["properties"])
+    return out
+
+
+GAME_RESPONSE_SCHEMA = json.loads(json.dumps(strict_schema(GameResponse.model_json_schema()), sort_keys=True))
+
+
+def response_format() -> Dict[str, Any]:
+    """`response_format` arguments for an LLM call, per STRUCTURED_OUTPUT."""
+    if STRUCTURED_OUTPUT == "json_schema":
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "game_response", "strict": True, "schema": GAME_RESPONSE_SCHEMA},
+        }}
+    if STRUCTURED_OUTPUT == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+# ---------------------------------------------------------------------------
+# Streaming
+# ---------------------------------------------------------------------------
+
+class NarrationStream:
+    """
+    Incrementally pulls the `narration` string out of a streamed JSON reply.
+
+    Feed it raw content deltas; it returns the newly decoded narration text
+    so it can be forwarded (e.g. to TTS) before the JSON object is complete.
+    Replies that do not start with `{` (after an optional code fence) are
+    treated as plain narration. `text` holds everything decoded so far.
+    """
+
+    _KEY = re.compile(r'"narration"\s*:\s*"')
+    _FENCE = re.compile(r"```[a-zA-Z]*\s*")
+    _ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', '\\': '\\', '/': '/'}
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = None
+        self.raw = None
+        self.done = False
+        self.parts: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        if self.raw is None:
+            stripped = self.buffer.lstrip()
+            if not stripped or ("```".startswith(stripped) and len(stripped) < 3):
+                return ""
+            if stripped.startswith("```"):
+                fence = self._FENCE.match(stripped)
+                if fence is None or fence.end() == len(stripped):
+                    return ""   # wait for the rest of the fence line
+                stripped = stripped[fence.end():]
+            self.raw = not stripped.startswith("{")
+            self.pos = len(self.buffer) - len(stripped) if self.raw else None
+
+        if self.raw:
+            text = self.buffer[self.pos:]
+            self.pos = len(self.buffer)
+            self.parts.append(text)
+            return text
+
+        if self.done:
+            return ""
+        if self.pos is None:
+            match = self._KEY.search(self.buffer)
+            if not match:
+                return ""
+            self.pos = match.end()
+
+        out = []
+        buf = self.buffer
+        i = self.pos
+        while i < len(buf):
+            c = buf[i]
+            if c == '\\':
+                if i + 1 >= len(buf):
+                    break
+                if buf[i + 1] == 'u':
+                    if i + 6 > len(buf):
+                        break
+                    try:
+                        code = int(buf[i + 2:i + 6], 16)
+                    except ValueError:
+                        code = 0xFFFD
+                    if 0xD800 <= code < 0xDC00:
+                        # High surrogate: wait for its pair and combine them
+                        if i + 12 > len(buf):
+                            break
+                        if buf[i + 6:i + 8] == "\\u":
+                            try:
+                                low = int(buf[i + 8:i + 12], 16)
+                            except ValueError:
+                                low = 0
+                            if 0xDC00 <= low < 0xE000:
+                                out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                                i += 12
+                                continue
+                        code = 0xFFFD
+                    out.append(chr(code))
+                    i += 6
+                    continue
+                out.append(self._ESCAPES.get(buf[i + 1], buf[i + 1]))
+                i += 2
+                continue
+            if c == '"':
+                self.done = True
+                i += 1
+                break
+            out.append(c)
+            i += 1
+        self.pos = i
+        text = "".join(out)
+        self.parts.append(text)
+        return text
+
+
+# ---------------------------------------------------------------------------
+# Parsing and repair
+# ---------------------------------------------------------------------------
+
+parse_stats = {OK: 0, REPAIRED: 0, RAW: 0, "empty": 0, "retries": 0}
+_stats_lock = threading.Lock()
+
+_FENCED = re.compile(r"^\s*```[a-zA-Z]*\s*(.*?)\s*(?:```\s*)?$", re.DOTALL)
+
+
+def _scan(text: str) -> Tuple[str, bool, List[str], List[int]]:
+    """
+    One pass over JSON-ish text. Returns the text with trailing commas
+    removed, whether it ends inside a string, the brackets still open, and
+    the positions (in the returned text) of commas between members.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    commas: List[int] = []
+    in_string = escaped = False
+    for c in text:
+        if in_string:
+            out.append(c)
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+            continue
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]":
+            # Drop a trailing comma before the closing bracket
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+                commas.pop()
+            if stack:
+                stack.pop()
+        elif c == "," and stack:
+            commas.append(len(out))
+        out.append(c)
+    return "".join(out), in_string, stack, commas
+
+
+def _close(text: str, in_string: bool, stack: List[str]) -> str:
+    """Close an unterminated string and every open bracket."""
+    if in_string:
+        if text.endswith("\\") and not text.endswith("\\\\"):
+            text = text[:-1]
+        text += '"'
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += "null"
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """Best-effort decode of a malformed JSON reply; None if it cannot be saved."""
+    fenced = _FENCED.match(text)
+    if fenced and text.lstrip().startswith("```"):
+        text = fenced.group(1)
+    start = text.find("{")
+    if start < 0:
+        return None
+    end = text.rfind("}")
+    # Prose after the object; a cut-off reply has no closing brace at the end
+    if end > start and not text[end + 1:].strip().startswith(("}", "]", ",")):
+        candidate = text[start:end + 1]
+        try:
+            return json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            pass
+    cleaned, in_string, stack, commas = _scan(text[start:])
+
+    # Truncated: close it where it stopped, then at each earlier member boundary
+    cuts = [len(cleaned)] + list(reversed(commas))
+    for cut in cuts[:20]:
+        if cut == len(cleaned):
+            candidate = _close(cleaned, in_string, stack)
+        else:
+            head, head_in_string, head_stack, _ = _scan(cleaned[:cut])
+            candidate = _close(head, head_in_string, head_stack)
+        try:
+            return json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def _coerce(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Rename aliased fields and stringify scalar narration/notes."""
+    fixed = {}
+    for key, value in data.items():
+        name = FIELD_ALIASES.get(key, key)
+        if name in fixed and key != name:
+            continue
+        fixed[name] = value
+    for name in ("narration", "out_of_character", "next_prompt_suggestion"):
+        value = fixed.get(name)
+        if isinstance(value, (int, float)):
+            fixed[name] = str(value)
+        elif isinstance(value, list) and all(isinstance(v, str) for v in value):
+            fixed[name] = (" " if name == "narration" else "; ").join(value)
+    return fixed
+
+
+def _validate(data: Any) -> Tuple[Optional[GameResponse], bool]:
+    """(response, changed) - invalid optional fields are dropped rather than failing the reply."""
+    if not isinstance(data, dict):
+        return None, False
+    try:
+        return GameResponse.model_validate(data), False
+    except ValidationError:
+        pass
+    data = _coerce(data)
+    for _ in range(len(data) + 1):
+        try:
+            return GameResponse.model_validate(data), True
+        except ValidationError as e:
+            bad = {err["loc"][0] for err in e.errors() if err["loc"]}
+            if "narration" in bad or not bad & set(data):
+                return None, True
+            data = {k: v for k, v in data.items() if k not in bad}
+    return None, True
+
+
+def _count(outcome: str) -> None:
+    with _stats_lock:
+        parse_stats[outcome] += 1
+
+
+def retry_rate() -> float:
+    """Share of parsed replies that needed another LLM call (PARSE_RETRIES in agent)."""
+    parsed = parse_stats[OK] + parse_stats[REPAIRED] + parse_stats[RAW] + parse_stats["empty"]
+    return parse_stats["retries"] / parsed if parsed else 0.0
+
+
+def parse_game_response(content: Optional[str]) -> Tuple[Dict[str, Any], str]:
+    """The model's final reply as a response dict, and how it was obtained (OK, REPAIRED or RAW)."""
+    if not content or not content.strip():
+        _count("empty")
+        return {"narration": SILENT_NARRATION}, OK
+
+    try:
+        response, changed = _validate(json.loads(content))
+        if response is not None:
+            _count(REPAIRED if changed else OK)
+            return response.to_result(), REPAIRED if changed else OK
+    except json.JSONDecodeError:
+        pass
+
+    response, _ = _validate(repair_json(content))
+    if response is not None:
+        _count(REPAIRED)
+        logger.info("Repaired malformed JSON from LLM locally.")
+        return response.to_result(), REPAIRED
+
+    # Fallback if model fails to output JSON despite instructions
+    logger.warning("Failed to parse JSON from LLM. Returning raw content.")
+    _count(RAW)
+    stream = NarrationStream()
+    stream.feed(content)
+    narration = stream.text.strip() or content.strip()
+    return {"narration": narration, "out_of_character": RAW_TEXT_NOTE}, RAW
@@ -1,123 +1,449 @@
-import sqlite3
+"""
+Database setup and content ingestion.
+
+Content (SRD rules and the adventure SQL script) is ingested incrementally:
+every source section - one rule heading, one adventure SQL statement - is
+hashed and the hashes are kept in the content_hash table. A sync only looks
+at sections whose hash changed, and upserts just the rows that differ, all in
+one transaction. Rows whose statement was removed from the source are deleted,
+unless player state still points at them (a character standing in a removed
+room); those are kept and reported. Characters, story logs and live monster
+HP/status are never touched, so content can be redeployed onto a database
+that is in play.
+
+Usage: python init_db.py            create or update the database (keeps player state)
+       python init_db.py --check    report pending migrations and content changes; opens the
+                                    database read-only
+       python init_db.py --reset    delete the database and build it from scratch
+"""
+import argparse
+import hashlib
+import json
+import logging
 import os
 import re
-from database import get_db_connection, DB_PATH
-import json
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import get_db_connection, close_db_connection, transaction, DB_PATH
+from content_cache import content_cache
+from flag_store import flag_store
+from migrations import SCHEMA_VERSION, migrate
+
+logger = logging.getLogger(__name__)
 
-# Absolute paths to source docs
-PROJECT_DOCS_DIR = r"g:\My Drive\Projects\Holodeck\Project Docs"
-SCHEMA_PATH = r"g:\My Drive\Projects\Holodeck\src\backend\schema.sql"
+# Source docs live in the repo, next to src/
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DOCS_DIR = os.getenv("PROJECT_DOCS_DIR", os.path.join(HERE, "..", "..", "Project Docs"))
+SCHEMA_PATH = os.path.join(HERE, "schema.sql")
 SRD_RULES_PATH = os.path.join(PROJECT_DOCS_DIR, "srd_rules_condensed.md")
 ADVENTURE_SQL_PATH = os.path.join(PROJECT_DOCS_DIR, "wailing_glacier_inserts.sql")
 
+# Sync content on API startup (a no-op costing a couple of file hashes when nothing changed)
+SYNC_CONTENT_ON_STARTUP = os.getenv("SYNC_CONTENT_ON_STARTUP", "1") == "1"
+
+# Adventure tables in foreign-key order:
+# (table, key columns, content columns, columns only written on insert)
+# The insert-only columns are live game state and survive content updates.
+CONTENT_TABLES = [
+    ("adventure", ("id",), ("name", "description", "starting_room_id"), ()),
+    ("room", ("id",), ("adventure_id", "room_key", "title", "short_description", "full_description"), ()),
+    ("room_exit", ("adventure_id", "from_room_id", "direction"), ("to_room_id", "description"), ()),
+    ("monster", ("id",), ("name", "srd_name", "base_hp", "base_ac", "meta_json"), ()),
+    ("monster_instance", ("adventure_id", "room_id", "instance_name"), ("monster_id", "notes"),
+     ("current_hp", "status")),
+]
+RULE_COLUMNS = ("category", "summary", "mechanics_json", "tags")
+# Player state that pins adventure rows: table -> (referencing table, column) pairs
+PLAYER_REFERENCES = {
+    "adventure": [("character", "adventure_id"), ("game_flag", "adventure_id"), ("story_log", "adventure_id")],
+    "room": [("character", "location_room_id")],
+}
+
+# (source, action, what) - e.g. ("rules", "update", "grappling")
+Change = Tuple[str, str, str]
+
+
+def remove_db_files():
+    """Delete the database file along with its WAL/shared-memory companions."""
+    close_db_connection()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(DB_PATH + suffix):
+            os.remove(DB_PATH + suffix)
+
 def init_db():
     print(f"Initializing database at {DB_PATH}...")
-    
-    # 1. Create Tables
-    with get_db_connection() as conn:
-        with open(SCHEMA_PATH, 'r') as f:
-            conn.executescript(f.read())
-    print("Schema initialized.")
 
-    # 2. Ingest Rules
-    ingest_rules()
+    # 1. Create or migrate tables
+    ensure_schema()
+    print("Schema ready.")
 
-    # 3. Ingest Adventure
-    ingest_adventure()
+    # 2. Ingest rules and adventure (only what changed)
+    changes = sync_content()
+    print_changes(changes)
 
-    # 4. Create Default Character
+    # 3. Create Default Character
     create_test_character()
 
     print("Database initialization complete!")
 
-def ingest_rules():
-    print("Ingesting SRD Rules...")
-    if not os.path.exists(SRD_RULES_PATH):
-        print(f"Warning: Rules file not found at {SRD_RULES_PATH}")
+def ensure_schema(conn=None) -> None:
+    """Create the schema on an empty database, otherwise apply pending migrations."""
+    conn = conn or get_db_connection()
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'adventure'").fetchone()
+    if exists:
+        migrate(conn)
         return
+    with open(SCHEMA_PATH, 'r') as f:
+        conn.executescript(f.read())
 
-    with open(SRD_RULES_PATH, 'r') as f:
-        content = f.read()
+def prepare_database() -> None:
+    """API startup: schema up to date and, unless disabled, content in sync with the docs."""
+    ensure_schema()
+    if SYNC_CONTENT_ON_STARTUP:
+        changes = sync_content()
+        if changes:
+            logger.info(f"Content sync applied {len(changes)} change(s)")
 
-    # Regex to find sections starting with ###
-    # This is a simple parser based on the known format
-    sections = re.split(r'^###\s+', content, flags=re.MULTILINE)[1:] # Skip preamble
-    
-    rules_to_insert = []
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-    for section in sections:
-        lines = section.strip().split('\n')
-        topic_name = lines[0].strip()
-        
-        # Parse fields
-        topic = ""
-        category = ""
-        summary = ""
-        mechanics = {}
-        tags = ""
-        
-        current_field = None
-        mechanics_buffer = []
-
-        for line in lines[1:]:
-            line = line.strip()
-            if not line: continue
-            
-            if line.startswith("- **Topic:**"):
-                topic = line.split(":", 1)[1].strip()
-            elif line.startswith("- **Category:**"):
-                category = line.split(":", 1)[1].strip()
-            elif line.startswith("- **Summary:**"):
-                summary = line.split(":", 1)[1].strip()
-            elif line.startswith("- **Tags:**"):
-                tags = line.split(":", 1)[1].strip()
-            elif line.startswith("- **Key Mechanics:**"):
-                current_field = "mechanics"
-            elif current_field == "mechanics":
-                if line.startswith("-"):
-                    mechanics_buffer.append(line.lstrip("- ").strip())
-        
-        # Build mechanics JSON
-        if mechanics_buffer:
-             mechanics_json = json.dumps({"points": mechanics_buffer})
-        else:
-            mechanics_json = "{}"
+def _read(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        logger.warning(f"Content source not found: {path}")
+        return None
+    with open(path, 'r', encoding="utf-8") as f:
+        return f.read()
+
+# ---------------------------------------------------------------------------
+# Sync
+# ---------------------------------------------------------------------------
+
+def sync_content(check: bool = False, conn=None) -> List[Change]:
+    """
+    Bring rules and adventure rows in line with the source docs.
+
+    Returns the changes made, or with `check=True` the changes that would be
+    made (nothing is written, so `conn` may be read-only). Unchanged sources
+    cost one file hash each.
+    """
+    sources = {"rules": _read(SRD_RULES_PATH), "adventure": _read(ADVENTURE_SQL_PATH)}
+    if check:
+        return _sync(conn or get_db_connection(), sources, write=False)
+
+    with transaction() as conn:
+        # adventure.starting_room_id points at rooms inserted after it
+        conn.execute("PRAGMA defer_foreign_keys = ON")
+        changes = _sync(conn, sources, write=True)
+    if changes:
+        content_cache.invalidate()
+        flag_store.invalidate()
+    return changes
+
+def _sync(conn, sources: Dict[str, Optional[str]], write: bool) -> List[Change]:
+    stored: Dict[str, Dict[str, str]] = {}
+    # Absent only on a database --check looks at before migrating it: every section is new
+    if _has_table(conn, "content_hash"):
+        for source, section, digest in conn.execute("SELECT source, section, hash FROM content_hash"):
+            stored.setdefault(source, {})[section] = digest
 
-        if topic and category:
-            rules_to_insert.append((topic, category, summary, mechanics_json, tags))
+    changes: List[Change] = []
+    for source, text in sources.items():
+        if text is None:
+            continue
+        known = stored.get(source, {})
+        if known.get("*") == _hash(text):
+            continue
 
-    if rules_to_insert:
-        with get_db_connection() as conn:
+        sections = split_rules(text) if source == "rules" else split_statements(text)
+        hashes = {label: _hash(body) for label, body in sections}
+        changed = [label for label, digest in hashes.items() if known.get(label) != digest]
+        removed = [label for label in known if label != "*" and label not in hashes]
+        if source == "rules" and not known:
+            # Ingested before content_hash existed (or by the old parser, whose topics kept a
+            # leading '** '): the rule rows are the only record of what was there before
+            removed = sorted({topic for (topic,) in conn.execute("SELECT topic FROM rule")} - set(hashes))
+        changes += [(source, "section changed", label) for label in changed]
+        changes += [(source, "section removed", label) for label in removed]
+
+        if source == "rules":
+            changes += sync_rules(conn, [parse_rule(body) for label, body in sections if label in changed],
+                                  removed, write)
+        elif changed or removed:
+            changes += sync_adventure(conn, text, write)
+
+        if write:
+            conn.execute("DELETE FROM content_hash WHERE source = ?", (source,))
             conn.executemany(
-                "INSERT INTO rule (topic, category, summary, mechanics_json, tags) VALUES (?, ?, ?, ?, ?)",
-                rules_to_insert
+                "INSERT INTO content_hash (source, section, hash) VALUES (?, ?, ?)",
+                [(source, label, digest) for label, digest in {**hashes, "*": _hash(text)}.items()]
             )
-            conn.commit()
-        print(f"Inserted {len(rules_to_insert)} rules.")
-    else:
-        print("No rules found to insert.")
+    return changes
 
-def ingest_adventure():
-    print("Ingesting Adventure Data...")
-    if not os.path.exists(ADVENTURE_SQL_PATH):
-        print(f"Warning: Adventure SQL not found at {ADVENTURE_SQL_PATH}")
+def _has_table(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+def print_changes(changes: List[Change]) -> None:
+    if not changes:
+        print("Content up to date.")
         return
+    for source, action, what in changes:
+        print(f"  {source:<9} {action:<15} {what}")
+    rows = sum(1 for c in changes if not c[1].startswith(("section", "keep")))
+    print(f"{len(changes)} change(s), {rows} row(s).")
 
-    with open(ADVENTURE_SQL_PATH, 'r') as f:
-        sql_content = f.read()
+# ---------------------------------------------------------------------------
+# Rules
+# ---------------------------------------------------------------------------
 
-    with get_db_connection() as conn:
-        try:
-            conn.executescript(sql_content)
-            conn.commit()
-            print("Adventure data inserted.")
-        except sqlite3.Error as e:
-            print(f"Error inserting adventure data: {e}")
-
-def create_test_character():
-    print("Creating/Resetting Test Character 'Kraven'...")
-    kraven_data = {
-        "name": "Kraven",
+def split_rules(content: str) -> List[Tuple[str, str]]:
+    """(topic, section text) for every ### heading; sections without a topic are skipped."""
+    sections = []
+    for section in re.split(r'^###\s+', content, flags=re.MULTILINE)[1:]:  # Skip preamble
+        rule = parse_rule(section)
+        if rule:
+            sections.append((rule[0], section.strip()))
+    return sections
+
+def parse_rule(section: str) -> Optional[Tuple[str, str, str, str, str]]:
+    """(topic, category, summary, mechanics_json, tags) for one ### section, or None."""
+    lines = section.strip().split('\n')
+
+    # Parse fields
+    topic = ""
+    category = ""
+    summary = ""
+    tags = ""
+
+    current_field = None
+    mechanics_buffer = []
+
+    for line in lines[1:]:
+        line = line.strip()
+        if not line: continue
+
+        if line.startswith("- **Topic:**"):
+            topic = line.split(":**", 1)[1].strip()
+        elif line.startswith("- **Category:**"):
+            category = line.split(":**", 1)[1].strip()
+        elif line.startswith("- **Summary:**"):
+            summary = line.split(":**", 1)[1].strip()
+        elif line.startswith("- **Tags:**"):
+            tags = line.split(":**", 1)[1].strip()
+        elif line.startswith("- **Key Mechanics:**"):
+            current_field = "mechanics"
+        elif current_field == "mechanics":
+            if line.startswith("-"):
+                mechanics_buffer.append(line.lstrip("- ").strip())
+
+    # Build mechanics JSON
+    if mechanics_buffer:
+        mechanics_json = json.dumps({"points": mechanics_buffer})
+    else:
+        mechanics_json = "{}"
+
+    if topic and category:
+        return (topic, category, summary, mechanics_json, tags)
+    return None
+
+def sync_rules(conn, rules: List[Tuple[str, str, str, str, str]], removed: List[str], write: bool) -> List[Change]:
+    """Upsert changed rules (keyed by topic), delete removed ones, and keep rule_fts in step."""
+    changes: List[Change] = []
+    for rule in rules:
+        topic, values = rule[0], rule[1:]
+        row = conn.execute(
+            f"SELECT id, {', '.join(RULE_COLUMNS)} FROM rule WHERE topic = ? ORDER BY id LIMIT 1", (topic,)
+        ).fetchone()
+        if row and tuple(row[1:]) == values:
+            continue
+        changes.append(("rules", "update" if row else "insert", topic))
+        if not write:
+            continue
+        if row:
+            rule_id = row[0]
+            conn.execute(
+                f"UPDATE rule SET {', '.join(f'{c} = ?' for c in RULE_COLUMNS)} WHERE id = ?", (*values, rule_id)
+            )
+            conn.execute("DELETE FROM rule_fts WHERE rowid = ?", (rule_id,))
+        else:
+            rule_id = conn.execute(
+                f"INSERT INTO rule (topic, {', '.join(RULE_COLUMNS)}) VALUES (?, ?, ?, ?, ?)", rule
+            ).lastrowid
+        conn.execute(
+            "INSERT INTO rule_fts (rowid, topic, summary, tags, mechanics) VALUES (?, ?, ?, ?, ?)",
+            rule_index_entry(rule_id, topic, rule[2], rule[4], rule[3])
+        )
+
+    for topic in removed:
+        ids = [r[0] for r in conn.execute("SELECT id FROM rule WHERE topic = ?", (topic,))]
+        if not ids:
+            continue
+        changes.append(("rules", "delete", topic))
+        if write:
+            for rule_id in ids:
+                conn.execute("DELETE FROM rule_fts WHERE rowid = ?", (rule_id,))
+                conn.execute("DELETE FROM rule WHERE id = ?", (rule_id,))
+    return changes
+
+def rule_index_entry(rule_id, topic, summary, tags, mechanics_json):
+    """A rule_fts row for one rule."""
+    try:
+        points = json.loads(mechanics_json or "{}").get("points", [])
+    except ValueError:
+        points = []
+    # Tags are comma-separated; spaces let the tokenizer split them
+    return (rule_id, topic, summary, (tags or "").replace(",", " "), " ".join(points))
+
+def rebuild_rule_index(conn):
+    """Repopulate the rule_fts full-text index from the rule table."""
+    conn.execute("DELETE FROM rule_fts")
+    rows = conn.execute("SELECT id, topic, summary, tags, mechanics_json FROM rule").fetchall()
+    conn.executemany(
+        "INSERT INTO rule_fts (rowid, topic, summary, tags, mechanics) VALUES (?, ?, ?, ?, ?)",
+        [rule_index_entry(*row) for row in rows]
+    )
+
+# ---------------------------------------------------------------------------
+# Adventure
+# ---------------------------------------------------------------------------
+
+def split_statements(sql: str) -> List[Tuple[str, str]]:
+    """(label, statement) for every statement; labels look like 'INSERT INTO room' or 'UPDATE adventure #2'."""
+    statements, buffer = [], ""
+    for line in sql.splitlines(keepends=True):
+        if not buffer and (not line.strip() or line.lstrip().startswith("--")):
+            continue
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ""
+    if buffer.strip():
+        statements.append(buffer.strip())
+
+    labelled, seen = [], {}
+    for statement in statements:
+        words = re.sub(r"--[^\n]*", "", statement).replace("(", " ").split()
+        label = " ".join(words[:3] if words[0].upper() == "INSERT" else words[:2])
+        seen[label] = seen.get(label, 0) + 1
+        labelled.append((label if seen[label] == 1 else f"{label} #{seen[label]}", statement))
+    return labelled
+
+def load_adventure_rows(sql: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Run the adventure script against an empty in-memory schema and return its rows per table."""
+    scratch = sqlite3.connect(":memory:")
+    scratch.row_factory = sqlite3.Row
+    try:
+        with open(SCHEMA_PATH, 'r') as f:
+            scratch.executescript(f.read())
+        scratch.executescript(sql)
+        rows = {}
+        for table, keys, content, initial in CONTENT_TABLES:
+            columns = ", ".join(keys + content + initial)
+            rows[table] = [dict(r) for r in scratch.execute(f"SELECT {columns} FROM {table} ORDER BY rowid")]
+        return rows
+    finally:
+        scratch.close()
+
+def _row_label(table: str, key: Tuple) -> str:
+    return f"{table} {key[0] if len(key) == 1 else key}"
+
+def sync_adventure(conn, sql: str, write: bool) -> List[Change]:
+    """
+    Insert new adventure rows, update changed content columns and delete rows
+    the source no longer has; live monster state is kept.
+    """
+    changes: List[Change] = []
+    source_rows = load_adventure_rows(sql)
+    for table, keys, content, initial in CONTENT_TABLES:
+        match = " AND ".join(f"{k} = ?" for k in keys)
+        for row in source_rows[table]:
+            key = tuple(row[k] for k in keys)
+            label = _row_label(table, key)
+            live = conn.execute(f"SELECT {', '.join(content)} FROM {table} WHERE {match}", key).fetchone()
+            if live is None:
+                changes.append(("adventure", "insert", label))
+                if write:
+                    columns = keys + content + initial
+                    conn.execute(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        tuple(row[c] for c in columns)
+                    )
+                continue
+            different = [c for c in content if live[c] != row[c]]
+            if not different:
+                continue
+            changes.append(("adventure", "update", f"{label}: {', '.join(different)}"))
+            if write:
+                conn.execute(
+                    f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in different)} WHERE {match}",
+                    (*(row[c] for c in different), *key)
+                )
+
+    changes += _delete_removed_rows(conn, source_rows, write)
+    return changes
+
+def _delete_removed_rows(conn, source_rows: Dict[str, List[Dict[str, Any]]], write: bool) -> List[Change]:
+    """
+    Delete content rows the source no longer has. The source is authoritative
+    for the adventures it defines; an adventure it dropped goes with all its
+    rows, unless player state still points at it. Rows of adventures loaded
+    some other way (e.g. copies made by bench_soak) are left alone.
+    """
+    changes: List[Change] = []
+
+    def pinned(table, key):
+        return [
+            f"{ref_table}.{column}" for ref_table, column in PLAYER_REFERENCES.get(table, [])
+            if conn.execute(f"SELECT 1 FROM {ref_table} WHERE {column} = ? LIMIT 1", key).fetchone()
+        ]
+
+    sourced = {row["id"] for row in source_rows["adventure"]}
+    dropped, deleted = set(), set()
+    for (adventure_id,) in conn.execute("SELECT id FROM adventure").fetchall():
+        if adventure_id in sourced:
+            continue
+        users = pinned("adventure", (adventure_id,))
+        if users:
+            changes.append(("adventure", "keep (in use)", f"{_row_label('adventure', (adventure_id,))}: {', '.join(users)}"))
+        else:
+            dropped.add(adventure_id)
+
+    # Children first, so deleting a room never leaves exits or monsters pointing at it
+    for table, keys, _, _ in reversed(CONTENT_TABLES):
+        wanted = {tuple(row[k] for k in keys) for row in source_rows[table]}
+        # Every table but monster (shared templates) belongs to an adventure
+        scoped = table != "monster"
+        columns = ", ".join(keys + (("adventure_id",) if table not in ("monster", "adventure") and "adventure_id" not in keys else ()))
+        for live in conn.execute(f"SELECT {columns} FROM {table}").fetchall():
+            key = tuple(live[k] for k in keys)
+            if key in wanted:
+                continue
+            adventure_id = live["id"] if table == "adventure" else (live["adventure_id"] if scoped else None)
+            if scoped and adventure_id not in sourced and adventure_id not in dropped:
+                continue
+            label = _row_label(table, key)
+            users = pinned(table, key) if table != "adventure" else []
+            if table == "monster" and any(
+                ("monster_instance", tuple(instance)) not in deleted for instance in conn.execute(
+                    "SELECT adventure_id, room_id, instance_name FROM monster_instance WHERE monster_id = ?", key
+                )
+            ):
+                users = ["monster_instance.monster_id"]
+            if users:
+                changes.append(("adventure", "keep (in use)", f"{label}: {', '.join(users)}"))
+                continue
+            changes.append(("adventure", "delete", label))
+            deleted.add((table, key))
+            if write:
+                conn.execute(f"DELETE FROM {table} WHERE {' AND '.join(f'{k} = ?' for k in keys)}", key)
+    return changes
+
+def create_test_character(name: str = "Kraven", adventure_id: int = 1, quiet: bool = False):
+    """Create a level 3 fighter called `name` in the starting room of `adventure_id`."""
+    if not quiet:
+        print(f"Creating/Resetting Test Character '{name}' in adventure {adventure_id}...")
+    character_data = {
+        "name": name,
         "class": "Fighter",
         "level": 3,
         "hp": 24,
@@ -135,34 +461,60 @@ def create_test_character():
 
     with get_db_connection() as conn:
         # Check if exists
-        exists = conn.execute("SELECT id FROM character WHERE name = ?", ("Kraven",)).fetchone()
+        exists = conn.execute(
+            "SELECT id FROM character WHERE name = ? AND adventure_id = ?", (name, adventure_id)
+        ).fetchone()
         
         if not exists:
+            adventure = conn.execute(
+                "SELECT starting_room_id FROM adventure WHERE id = ?", (adventure_id,)
+            ).fetchone()
+            if not adventure:
+                print(f"Adventure {adventure_id} not found; character '{name}' not created.")
+                return
             conn.execute("""
                 INSERT INTO character (
                     adventure_id, name, class, level, hp, max_hp, 
                     abilities_json, skills_json, inventory_json, gold, location_room_id
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
-                1, # Adventure 1
-                kraven_data["name"],
-                kraven_data["class"],
-                kraven_data["level"],
-                kraven_data["hp"],
-                kraven_data["max_hp"],
-                json.dumps(kraven_data["abilities"]),
-                json.dumps(kraven_data["skills"]),
-                json.dumps(kraven_data["inventory"]),
-                kraven_data["gold"],
-                1 # Start in Room 1
+                adventure_id,
+                character_data["name"],
+                character_data["class"],
+                character_data["level"],
+                character_data["hp"],
+                character_data["max_hp"],
+                json.dumps(character_data["abilities"]),
+                json.dumps(character_data["skills"]),
+                json.dumps(character_data["inventory"]),
+                character_data["gold"],
+                adventure["starting_room_id"]
             ))
             conn.commit()
-            print("Created character 'Kraven'.")
-        else:
-            print("Character 'Kraven' already exists.")
+            if not quiet:
+                print(f"Created character '{name}'.")
+        elif not quiet:
+            print(f"Character '{name}' already exists.")
 
 if __name__ == "__main__":
-    # Remove existing DB to start fresh
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="report the content diff without writing")
+    parser.add_argument("--reset", action="store_true", help="delete the database first (loses player state)")
+    args = parser.parse_args()
+
+    if args.check:
+        if not os.path.exists(DB_PATH):
+            print(f"No database at {DB_PATH}; init_db.py would build it from scratch.")
+            raise SystemExit(1)
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            print(f"Schema version {version}; {SCHEMA_VERSION - version} migration(s) pending.")
+        changes = sync_content(check=True, conn=conn)
+        conn.close()
+        print_changes(changes)
+        raise SystemExit(1 if changes or version < SCHEMA_VERSION else 0)
+    if args.reset:
+        remove_db_files()
     init_db()
@@ -0,0 +1,487 @@
+"""
+Gateway between the agent and the LLM provider.
+
+Every chat completion goes through `gateway.create`, which takes the same
+arguments as `client.chat.completions.create` plus a priority:
+
+- Admission control: at most LLM_MAX_CONCURRENCY calls in flight, and token
+  buckets for requests and tokens per minute (LLM_RPM, LLM_TPM; 0 = no
+  limit). A call's tokens are estimated up front and corrected from `usage`
+  when the reply arrives.
+- Priority queue: calls wait in priority order (combat, then normal turns,
+  then idle chatter), first come first served within a priority. The queue
+  holds at most LLM_MAX_QUEUE calls and a call waits at most
+  LLM_QUEUE_TIMEOUT_SECONDS; past either it fails fast with GatewayOverloaded
+  instead of piling up.
+- Coalescing: identical non-streaming requests in flight at the same time
+  share one provider call.
+- Retries: 429s, 5xx, timeouts and connection errors are retried up to
+  LLM_MAX_RETRIES times with full-jitter exponential backoff, and a
+  Retry-After from the provider pauses the whole queue. Streams are retried
+  only if they fail before the first chunk.
+- Hedging: with LLM_HEDGE_AFTER_SECONDS set, a non-streaming call still
+  unanswered after that long is sent a second time, if there is spare
+  capacity, and the first reply wins.
+
+Queue depth, in-flight calls, waits and retry/hedge counters are served by
+/stats and /metrics, and each call's queue wait is traced as an `llm_queue`
+span. LLM_GATEWAY=0 calls the provider directly (with the SDK's own retries).
+"""
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from context_builder import count_message_tokens, count_tokens
+from tracing import DURATION_BUCKETS, span
+
+logger = logging.getLogger(__name__)
+
+LLM_GATEWAY = os.getenv("LLM_GATEWAY", "1") == "1"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+# Bucket size, in seconds of the per-minute rate, i.e. how big a burst may be
+LLM_BURST_SECONDS = float(os.getenv("LLM_BURST_SECONDS", "10"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "256"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+LLM_COALESCE = os.getenv("LLM_COALESCE", "1") == "1"
+# Completion tokens assumed per call until the provider reports usage
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "400"))
+
+# Priorities, most urgent first
+COMBAT, NORMAL, IDLE = 0, 1, 2
+PRIORITY_NAMES = {COMBAT: "combat", NORMAL: "normal", IDLE: "idle"}
+
+COMBAT_WORDS = re.compile(
+    r"\b(attack|attacks|strike|stab|slash|shoot|fire at|swing|hit|punch|kick|cast|smite|parry|block|dodge|"
+    r"disengage|grapple|shove|charge|flee|defend|initiative|fight|kill)\b"
+)
+IDLE_CHATTER = re.compile(
+    r"^\s*(\(|ooc\b|hi\b|hello\b|hey\b|thanks\b|thank you\b|lol\b|haha|ok\b|okay\b|cool\b|nice\b|brb\b|"
+    r"what do you think\b|who are you\b)"
+)
+
+_client = None
+
+
+def get_client():
+    """
+    The OpenAI client, created on first use so importing the SDK stays off
+    the startup path (or its recording/replaying stand-in, see llm_replay).
+    """
+    global _client
+    if _client is None:
+        from llm_replay import wrap_client
+        _client = wrap_client(_openai_client)
+    return _client
+
+
+def _openai_client():
+    from openai import AsyncOpenAI
+    options = {}
+    if gateway.enabled:
+        # The gateway retries through its own queue; SDK retries would bypass it
+        options["max_retries"] = 0
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("LLM_BASE_URL") or None,
+        **options
+    )
+
+
+def classify_priority(player_input: str) -> int:
+    """Queue priority for a turn: fighting goes first, out-of-character chatter last."""
+    text = player_input.lower()
+    if COMBAT_WORDS.search(text):
+        return COMBAT
+    if IDLE_CHATTER.match(text):
+        return IDLE
+    return NORMAL
+
+
+class GatewayOverloaded(Exception):
+    """The call was shed: the queue is full or the wait ran past LLM_QUEUE_TIMEOUT_SECONDS."""
+
+
+class TokenBucket:
+    """Refills at `per_minute` / 60 per second, holding at most LLM_BURST_SECONDS worth."""
+
+    def __init__(self, per_minute: int, burst_seconds: float = LLM_BURST_SECONDS):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (calls bigger than the bucket wait for a full one)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def adjust(self, amount: float) -> None:
+        """Give back (positive) or charge (negative) the difference between estimate and actual use."""
+        self.level = min(self.capacity, self.level + amount)
+
+
+_tools_tokens: Dict[int, int] = {}
+
+
+def prompt_tokens(kwargs: Dict[str, Any]) -> int:
+    """Estimated prompt tokens of a request: its messages plus the tool schemas."""
+    tools = kwargs.get("tools")
+    tools_tokens = 0
+    if tools:
+        # The tool list is the same module constant on every call; count it once
+        tools_tokens = _tools_tokens.get(id(tools))
+        if tools_tokens is None:
+            tools_tokens = _tools_tokens[id(tools)] = count_tokens(json.dumps(tools))
+    return count_message_tokens(kwargs.get("messages") or []) + tools_tokens
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    return str(value)
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """Identity of a request, for coalescing duplicates."""
+    raw = json.dumps(kwargs, sort_keys=True, separators=(",", ":"), default=_jsonable)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """The provider's Retry-After (or retry-after-ms), in seconds."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    import openai
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status in (408, 409, 429) or (status is not None and status >= 500)
+
+
+# Marks a coalesced call whose leader was cancelled; followers then make their own call
+_LEADER_GONE = object()
+
+
+class LLMGateway:
+    def __init__(self, enabled: bool = LLM_GATEWAY, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 rpm: int = LLM_RPM, tpm: int = LLM_TPM, max_queue: int = LLM_MAX_QUEUE,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS, max_retries: int = LLM_MAX_RETRIES,
+                 retry_base: float = LLM_RETRY_BASE_SECONDS, retry_max: float = LLM_RETRY_MAX_SECONDS,
+                 hedge_after: float = LLM_HEDGE_AFTER_SECONDS, coalesce: bool = LLM_COALESCE):
+        self.enabled = enabled
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.hedge_after = hedge_after
+        self.coalesce = coalesce
+
+        # [priority, seq, tokens, waiter]; abandoned entries stay until they reach the top
+        self._heap: List[list] = []
+        self._seq = itertools.count()
+        self._queued: Dict[int, int] = defaultdict(int)   # priority -> calls waiting
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._wake = None
+        self._coalescing: Dict[str, asyncio.Future] = {}
+        self.stats: Dict[str, int] = defaultdict(int)
+        self.waits: Dict[int, Deque[float]] = {p: deque(maxlen=1000) for p in PRIORITY_NAMES}
+        # Prometheus histogram of queue waits per priority: [bucket counts..., sum, count]
+        self._wait_histogram: Dict[int, List[float]] = {
+            p: [0] * (len(DURATION_BUCKETS) + 2) for p in PRIORITY_NAMES
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._queued.values())
+
+    # -- admission -------------------------------------------------------------
+
+    def estimate_tokens(self, kwargs: Dict[str, Any]) -> int:
+        return prompt_tokens(kwargs) + LLM_COMPLETION_TOKENS_ESTIMATE
+
+    def _delay(self, tokens: int, now: float) -> float:
+        delay = self._paused_until - now
+        if self.requests is not None:
+            delay = max(delay, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.wait_time(tokens, now))
+        return delay
+
+    def _pump(self) -> None:
+        """Admit waiting calls in priority order while there is capacity."""
+        while self._heap:
+            priority, _, tokens, waiter = self._heap[0]
+            if waiter.done():
+                heapq.heappop(self._heap)
+                continue
+            if self.in_flight >= self.max_concurrency:
+                return
+            delay = self._delay(tokens, time.monotonic())
+            if delay > 0:
+                if self._wake is not None:
+                    self._wake.cancel()
+                self._wake = asyncio.get_running_loop().call_later(delay, self._pump)
+                return
+            heapq.heappop(self._heap)
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+            self._queued[priority] -= 1
+            waiter.set_result(None)
+
+    async def _acquire(self, priority: int, tokens: int) -> None:
+        if self.queue_depth >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise GatewayOverloaded(f"LLM queue is full ({self.max_queue} waiting)")
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, [priority, next(self._seq), tokens, waiter])
+        self._queued[priority] += 1
+        enqueued = time.perf_counter()
+        self._pump()
+        try:
+            with span("llm_queue", priority=PRIORITY_NAMES[priority]):
+                await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the caller gave up: hand the slot back
+                self._release(tokens, None)
+            else:
+                self._queued[priority] -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["timeouts"] += 1
+                raise GatewayOverloaded(f"Waited over {self.queue_timeout:.0f}s for the LLM") from None
+            raise
+        self._record_wait(priority, time.perf_counter() - enqueued)
+
+    def _release(self, estimate: int, used: Optional[int]) -> None:
+        self.in_flight -= 1
+        if used is not None and self.tokens is not None:
+            self.tokens.adjust(estimate - used)
+        try:
+            self._pump()
+        except RuntimeError:
+            # Released outside the event loop (a stream finalized at shutdown)
+            pass
+
+    def _record_wait(self, priority: int, seconds: float) -> None:
+        self.waits[priority].append(seconds)
+        values = self._wait_histogram[priority]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                values[i] += 1
+        values[-2] += seconds
+        values[-1] += 1
+
+    # -- calls -----------------------------------------------------------------
+
+    async def create(self, priority: int = NORMAL, **kwargs: Any) -> Any:
+        """`client.chat.completions.create(**kwargs)` through the queue, with retries."""
+        if not self.enabled:
+            return await get_client().chat.completions.create(**kwargs)
+        self.stats["requests"] += 1
+        if kwargs.get("stream") or not self.coalesce:
+            return await self._call(priority, kwargs)
+
+        key = request_key(kwargs)
+        while key in self._coalescing:
+            self.stats["coalesced"] += 1
+            result = await asyncio.shield(self._coalescing[key])
+            if result is not _LEADER_GONE:
+                return result
+        shared = asyncio.get_running_loop().create_future()
+        self._coalescing[key] = shared
+        try:
+            result = await self._call(priority, kwargs)
+        except asyncio.CancelledError:
+            shared.set_result(_LEADER_GONE)
+            raise
+        except Exception as e:
+            shared.set_exception(e)
+            shared.exception()   # followers re-raise it; don't warn when there are none
+            raise
+        else:
+            shared.set_result(result)
+            return result
+        finally:
+            del self._coalescing[key]
+
+    async def _call(self, priority: int, kwargs: Dict[str, Any]) -> Any:
+        estimate = self.estimate_tokens(kwargs)
+        for attempt in range(self.max_retries + 1):
+            try:
+                if kwargs.get("stream"):
+                    return await self._open_stream(priority, estimate, kwargs)
+                return await self._hedged(priority, estimate, kwargs)
+            except GatewayOverloaded:
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.stats["failures"] += 1
+                    raise
+                delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+                if getattr(e, "status_code", None) == 429:
+                    self.stats["rate_limited"] += 1
+                    hint = retry_after(e)
+                    if hint is not None:
+                        delay = max(delay, hint)
+                        # Everyone waits out the provider's limit, not just this call
+                        self._paused_until = max(self._paused_until, time.monotonic() + hint)
+                self.stats["retries"] += 1
+                logger.warning(f"LLM call failed ({type(e).__name__}: {e}); retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _once(self, priority: int, estimate: int, kwargs: Dict[str, Any]) -> Any:
+        await self._acquire(priority, estimate)
+        used = None
+        try:
+            response = await get_client().chat.completions.create(**kwargs)
+            usage = getattr(response, "usage", None)
+            used = getattr(usage, "total_tokens", None)
+            return response
+        finally:
+            self._release(estimate, used)
+
+    def _can_hedge(self, estimate: int) -> bool:
+        """Hedge only with spare capacity, so hedges never delay queued calls."""
+        return (self.queue_depth == 0 and self.in_flight < self.max_concurrency
+                and self._delay(estimate, time.monotonic()) <= 0)
+
+    async def _hedged(self, priority: int, estimate: int, kwargs: Dict[str, Any]) -> Any:
+        if self.hedge_after <= 0:
+            return await self._once(priority, estimate, kwargs)
+        primary = asyncio.ensure_future(self._once(priority, estimate, kwargs))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done and self._can_hedge(estimate):
+                self.stats["hedged"] += 1
+                tasks.add(asyncio.ensure_future(self._once(priority, estimate, kwargs)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _open_stream(self, priority: int, estimate: int, kwargs: Dict[str, Any]) -> AsyncIterator[Any]:
+        await self._acquire(priority, estimate)
+        try:
+            stream = await get_client().chat.completions.create(**kwargs)
+        except BaseException:
+            self._release(estimate, None)
+            raise
+        return self._stream_and_release(stream, estimate)
+
+    async def _stream_and_release(self, stream: AsyncIterator[Any], estimate: int) -> AsyncIterator[Any]:
+        """Pass the chunks through; the slot is held until the stream ends or is dropped."""
+        used = None
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    used = chunk.usage.total_tokens
+                yield chunk
+        finally:
+            self._release(estimate, used)
+
+    # -- observability ---------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = {}
+        for priority, samples in self.waits.items():
+            ordered = sorted(samples)
+            waits[PRIORITY_NAMES[priority]] = {
+                "samples": len(ordered),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1) if ordered else None,
+                "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 1) if ordered else None,
+            }
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth,
+            "queued": {PRIORITY_NAMES[p]: n for p, n in sorted(self._queued.items()) if n},
+            "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "wait": waits,
+            **dict(self.stats),
+        }
+
+    def render_metrics(self) -> str:
+        """Gauges, counters and the queue-wait histogram in the Prometheus text format."""
+        lines = [
+            "# HELP holodeck_llm_queue_depth LLM calls waiting for admission.",
+            "# TYPE holodeck_llm_queue_depth gauge",
+        ]
+        for priority, name in PRIORITY_NAMES.items():
+            lines.append(f'holodeck_llm_queue_depth{{priority="{name}"}} {self._queued.get(priority, 0)}')
+        lines += [
+            "# HELP holodeck_llm_in_flight LLM calls in flight.",
+            "# TYPE holodeck_llm_in_flight gauge",
+            f"holodeck_llm_in_flight {self.in_flight}",
+            "# HELP holodeck_llm_gateway_events_total Gateway events (requests, retries, rate_limited, coalesced, hedged...).",
+            "# TYPE holodeck_llm_gateway_events_total counter",
+        ]
+        for event, count in sorted(self.stats.items()):
+            lines.append(f'holodeck_llm_gateway_events_total{{event="{event}"}} {count}')
+        lines += [
+            "# HELP holodeck_llm_queue_wait_seconds Time LLM calls waited for admission.",
+            "# TYPE holodeck_llm_queue_wait_seconds histogram",
+        ]
+        for priority, name in PRIORITY_NAMES.items():
+            values = self._wait_histogram[priority]
+            for bound, count in zip(DURATION_BUCKETS, values):
+                lines.append(f'holodeck_llm_queue_wait_seconds_bucket{{priority="{name}",le="{bound}"}} {count}')
+            lines.append(f'holodeck_llm_queue_wait_seconds_bucket{{priority="{name}",le="+Inf"}} {values[-1]}')
+            lines.append(f'holodeck_llm_queue_wait_seconds_sum{{priority="{name}"}} {values[-2]:.6f}')
+            lines.append(f'holodeck_llm_queue_wait_seconds_count{{priority="{name}"}} {values[-1]}')
+        return "\n".join(lines) + "\n"
+
+
+gateway = LLMGateway()
@@ -0,0 +1,260 @@
+"""
+Record and replay LLM calls, for offline end-to-end runs and benchmarks.
+
+LLM_REPLAY=record wraps the real client: every chat completion (streamed or
+not) is answered by the provider as usual and also appended to the cassette
+at LLM_CASSETTE, one JSON line per call, with the request, the response (or
+its chunks) and how long the provider took. LLM_REPLAY=replay answers every
+call from the cassette instead, without touching the network.
+
+A replayed call is matched on the exact request first. Failing that, it
+falls back to the request's shape: stream or not, tool_choice, the last line
+of the last user message (the player's input), and the tools whose results
+it carries. So a cassette survives prompt and schema edits, as long as the
+scripted turns stay the same. Matches are consumed in recorded order, and
+the last one is reused once they run out. A call with no match raises
+ReplayMiss.
+
+Tool calls in a cassette run for real on replay, so with DICE_SEED set (and
+the same session ids) a replayed session reproduces the recorded state.
+LLM_REPLAY_SPEED=1 replays the recorded provider latency; the default of 0
+answers at once.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from llm_gateway import prompt_tokens, request_key
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+LLM_REPLAY = os.getenv("LLM_REPLAY", "off")      # off | record | replay
+LLM_CASSETTE = os.getenv("LLM_CASSETTE", os.path.join(HERE, "cassettes", "wailing_glacier.jsonl"))
+LLM_REPLAY_SPEED = float(os.getenv("LLM_REPLAY_SPEED", "0"))
+
+CASSETTE_VERSION = 1
+
+# Calls recorded or replayed, how they matched, and the prompt tokens sent
+replay_stats = {"recorded": 0, "replayed": 0, "exact": 0, "loose": 0, "misses": 0, "prompt_tokens": 0}
+
+
+class ReplayMiss(Exception):
+    """No recorded call matches the request."""
+
+
+def _dump(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    return value
+
+
+def _field(message: Any, name: str) -> Any:
+    return message.get(name) if isinstance(message, dict) else getattr(message, name, None)
+
+
+def loose_key(kwargs: Dict[str, Any]) -> str:
+    """The request's shape: everything a scripted turn keeps when the prompt around it changes."""
+    messages = kwargs.get("messages") or []
+    user_lines = next(
+        ((_field(m, "content") or "").strip().splitlines() for m in reversed(messages) if _field(m, "role") == "user"),
+        []
+    )
+    tool_results = [_field(m, "name") or "" for m in messages if _field(m, "role") == "tool"]
+    return json.dumps([bool(kwargs.get("stream")), kwargs.get("tool_choice"), user_lines[-1] if user_lines else "",
+                       tool_results])
+
+
+def request_keys(kwargs: Dict[str, Any]) -> Tuple[str, str]:
+    # Messages may hold SDK objects (the assistant's tool calls); key on their JSON form
+    return request_key(kwargs), loose_key(kwargs)
+
+
+class Cassette:
+    """Recorded calls, indexed for replay, or an open file to record into."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta: Dict[str, Any] = {}
+        self.entries: List[Dict[str, Any]] = []
+        # key -> positions in `entries`, in recorded order
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        self._loose: Dict[str, List[int]] = defaultdict(list)
+        self._used = set()
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        cassette = cls(path)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "cassette" in entry:
+                    cassette.meta = entry
+                    continue
+                cassette._exact[entry["key"]].append(len(cassette.entries))
+                cassette._loose[entry["loose_key"]].append(len(cassette.entries))
+                cassette.entries.append(entry)
+        recorded_seed = cassette.meta.get("dice_seed")
+        if recorded_seed != os.getenv("DICE_SEED"):
+            logger.warning(f"Cassette {path} was recorded with DICE_SEED={recorded_seed}; "
+                           f"tool results will differ from the recording")
+        return cassette
+
+    def _take(self, positions: List[int]) -> Optional[Dict[str, Any]]:
+        """The first unused match, or the last match again once all are used."""
+        for i in positions:
+            if i not in self._used:
+                self._used.add(i)
+                return self.entries[i]
+        return self.entries[positions[-1]] if positions else None
+
+    def rewind(self) -> None:
+        """Start consuming matches from the beginning again (e.g. for another benchmark round)."""
+        with self._lock:
+            self._used.clear()
+
+    def find(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        exact, loose = request_keys(kwargs)
+        with self._lock:
+            entry = self._take(self._exact.get(exact, []))
+            if entry is not None:
+                replay_stats["exact"] += 1
+                return entry
+            entry = self._take(self._loose.get(loose, []))
+            if entry is not None:
+                replay_stats["loose"] += 1
+                return entry
+        replay_stats["misses"] += 1
+        raise ReplayMiss(f"No recorded LLM call for {loose} in {self.path}")
+
+    def record(self, kwargs: Dict[str, Any], elapsed: float, response: Any = None,
+               chunks: Optional[List[Any]] = None) -> None:
+        exact, loose = request_keys(kwargs)
+        entry = {
+            "key": exact,
+            "loose_key": loose,
+            "elapsed": round(elapsed, 4),
+            # The tool schemas are the same on every call; the names are enough to read the cassette
+            "request": json.loads(json.dumps(
+                {**kwargs, "tools": [t["function"]["name"] for t in kwargs.get("tools") or []]}, default=_dump
+            )),
+        }
+        if chunks is not None:
+            entry["chunks"] = [_dump(c) for c in chunks]
+        else:
+            entry["response"] = _dump(response)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "w", encoding="utf-8")
+                self._file.write(json.dumps({
+                    "cassette": CASSETTE_VERSION,
+                    "dice_seed": os.getenv("DICE_SEED"),
+                    "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                }) + "\n")
+            self._file.write(json.dumps(entry, sort_keys=True, ensure_ascii=False) + "\n")
+            self._file.flush()
+        replay_stats["recorded"] += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class _Completions:
+    def __init__(self, create):
+        self.create = create
+
+
+class _Chat:
+    def __init__(self, create):
+        self.completions = _Completions(create)
+
+
+class ReplayClient:
+    """Stands in for AsyncOpenAI: `chat.completions.create` answers from a cassette."""
+
+    def __init__(self, cassette: Cassette, speed: float = LLM_REPLAY_SPEED):
+        self.cassette = cassette
+        self.speed = speed
+        self.chat = _Chat(self._create)
+
+    async def _create(self, **kwargs: Any) -> Any:
+        from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+        entry = self.cassette.find(kwargs)
+        replay_stats["replayed"] += 1
+        replay_stats["prompt_tokens"] += prompt_tokens(kwargs)
+        if self.speed:
+            await asyncio.sleep(entry["elapsed"] * self.speed)
+        if "chunks" in entry:
+            return self._replay_chunks([ChatCompletionChunk.model_validate(c) for c in entry["chunks"]])
+        return ChatCompletion.model_validate(entry["response"])
+
+    @staticmethod
+    async def _replay_chunks(chunks: List[Any]) -> AsyncIterator[Any]:
+        for chunk in chunks:
+            yield chunk
+
+
+class RecordingClient:
+    """Wraps the real client and writes every call to a cassette."""
+
+    def __init__(self, client: Any, cassette: Cassette):
+        self.client = client
+        self.cassette = cassette
+        self.chat = _Chat(self._create)
+
+    async def _create(self, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        replay_stats["prompt_tokens"] += prompt_tokens(kwargs)
+        response = await self.client.chat.completions.create(**kwargs)
+        if not kwargs.get("stream"):
+            self.cassette.record(kwargs, time.perf_counter() - started, response=response)
+            return response
+        return self._record_chunks(kwargs, response, started)
+
+    async def _record_chunks(self, kwargs: Dict[str, Any], stream: AsyncIterator[Any], started: float) -> AsyncIterator[Any]:
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+        # Only complete streams are worth replaying
+        self.cassette.record(kwargs, time.perf_counter() - started, chunks=chunks)
+
+
+def wrap_client(make_client) -> Any:
+    """The client for the configured LLM_REPLAY mode; `make_client` builds the real one."""
+    if LLM_REPLAY == "replay":
+        logger.info(f"Replaying LLM calls from {LLM_CASSETTE}")
+        return ReplayClient(Cassette.load(LLM_CASSETTE))
+    client = make_client()
+    if LLM_REPLAY == "record":
+        logger.info(f"Recording LLM calls to {LLM_CASSETTE}")
+        return RecordingClient(client, Cassette(LLM_CASSETTE))
+    return client
+
+
+def use(mode: str, cassette: Optional[str] = None) -> None:
+    """Switch mode (and cassette) at runtime; the next LLM call builds a matching client."""
+    global LLM_REPLAY, LLM_CASSETTE
+    import llm_gateway
+    if isinstance(llm_gateway._client, RecordingClient):
+        llm_gateway._client.cassette.close()
+    LLM_REPLAY = mode
+    if cassette:
+        LLM_CASSETTE = cassette
+    llm_gateway._client = None
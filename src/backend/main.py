@@ -18,14 +18,43 @@ logger = logging.getLogger("api")
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import traceback
+import json
 
-from agent import process_player_action
-from tools import get_character_data, get_room_details, execute_query
+from agent import (
+    process_player_action, stream_player_action, turn_stats, TURN_MODE,
+    prompt_cache_stats, cached_token_ratio, PROMPT_PREFIX_HASH
+)
+from executor import run_blocking
+from response_cache import response_cache
+from turn_state import TurnState
+from content_cache import content_cache
+from session_store import session_store
+from init_db import prepare_database
+from command_router import router_snapshot
+from flag_store import flag_store
+from llm_gateway import gateway
+from game_response import DiceRollRecord, STRUCTURED_OUTPUT, parse_stats, retry_rate
+import tracing
+from contextlib import asynccontextmanager
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Migrate the schema and ingest any content that changed since the last start
+    await run_blocking(prepare_database)
+    tracing.setup_exporter()
+    # Load static adventure content (rooms, exits, monsters, rules) up front
+    await run_blocking(content_cache.warm)
+    session_store.start()
+    yield
+    # Persist any story_log lines still queued
+    await session_store.stop()
+    tracing.shutdown_exporter()
 
-app = FastAPI(title="Holodeck MVP")
+app = FastAPI(title="Holodeck MVP", lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -39,21 +68,50 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     message: str
     character_name: str
+    # Which adventure the character plays in; needed once names repeat across
+    # adventures (without it the oldest character with that name is used)
+    adventure_id: Optional[int] = None
+    # Defaults to the character (per adventure); history is kept server-side per session
+    session_id: Optional[str] = None
+    # Deprecated: ignored, the server reads history from its session store
     session_history: List[Dict[str, Any]] = []
 
+    @property
+    def session_key(self) -> str:
+        if self.session_id:
+            return self.session_id
+        if self.adventure_id is not None:
+            return f"{self.adventure_id}:{self.character_name}"
+        return self.character_name
+
 class ChatResponse(BaseModel):
     narration: str
     out_of_character: Optional[str] = None
+    dice_rolls: List[DiceRollRecord] = []
+    next_prompt_suggestion: Optional[str] = None
     updated_state: Optional[Dict[str, Any]] = None
 
+def response_body(response_data: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    """The /chat payload (also the `done` event of /chat/stream)."""
+    return {
+        "narration": response_data.get("narration", ""),
+        "out_of_character": response_data.get("out_of_character", ""),
+        "dice_rolls": response_data.get("dice_rolls", []),
+        "next_prompt_suggestion": response_data.get("next_prompt_suggestion"),
+        "updated_state": state
+    }
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     logger.info(f"Chat request received from {request.character_name}: {request.message}")
     try:
-        response_data = process_player_action(
+        history = await session_store.get_history(request.session_key)
+        response_data = await process_player_action(
             request.message, 
             request.character_name, 
-            request.session_history
+            history,
+            request.adventure_id,
+            request.session_key
         )
         logger.info("Agent processing complete.")
     except Exception as e:
@@ -61,30 +119,107 @@ async def chat(request: ChatRequest):
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
     
-    # Get fresh state to return
-    state = get_character_data(request.character_name)
+    # State after the turn comes back with the result; no re-read needed
+    state = response_data.get("updated_state") or {}
+    await record_turn(request, state, response_data)
+
+    return response_body(response_data, state)
+
+async def record_turn(request: ChatRequest, state: Dict[str, Any], response_data: Dict[str, Any]) -> None:
+    """
+    Append the turn to the request's session (story_log needs the character's
+    adventure). Failed turns are left out, so their error text never reaches
+    the model as history or the story as narration.
+    """
+    if response_data.get("failed") or "adventure_id" not in state:
+        return
+    await session_store.append_turn(
+        request.session_key, state["adventure_id"], request.character_name,
+        request.message, response_data.get("narration", "")
+    )
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Server-Sent Events variant of /chat.
 
+    Emits `tool_call` / `tool_result` events during the tool phase, `narration`
+    events carrying text deltas as the model generates them, and a final `done`
+    event with the same payload as /chat (including `updated_state`).
+    """
+    logger.info(f"Stream request received from {request.character_name}: {request.message}")
+
+    async def event_source():
+        try:
+            history = await session_store.get_history(request.session_key)
+            async for event in stream_player_action(
+                request.message,
+                request.character_name,
+                history,
+                request.adventure_id,
+                request.session_key
+            ):
+                if event["event"] != "final":
+                    yield sse_event(event["event"], event["data"])
+                    continue
+
+                response_data = event["data"]
+                state = response_data.get("updated_state") or {}
+                await record_turn(request, state, response_data)
+                yield sse_event("done", response_body(response_data, state))
+        except Exception as e:
+            logger.error(f"Error in stream processing: {e}")
+            logger.error(traceback.format_exc())
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/session/history")
+async def get_session_history(session_id: str):
+    """Recent conversation for a session, e.g. to restore the chat after a reconnect."""
+    return {"session_id": session_id, "history": await session_store.get_history(session_id)}
+
+@app.get("/state")
+async def get_state(character_name: str, adventure_id: Optional[int] = None):
+    """Character state with its room title and key (same shape as `updated_state` from /chat)."""
+    turn = await run_blocking(TurnState.load, character_name, adventure_id)
+    if not turn.found:
+        raise HTTPException(status_code=404, detail=turn.character["error"])
+    return turn.snapshot()
+
+@app.get("/stats")
+async def get_stats():
+    """Counters for tuning: how turns were resolved, cache hits/misses, local command routing, cached game flags, the LLM gateway queue, provider prompt caching and reply parsing."""
     return {
-        "narration": response_data.get("narration", ""),
-        "out_of_character": response_data.get("out_of_character", ""),
-        "updated_state": state
+        "turn_mode": TURN_MODE,
+        "turns": dict(turn_stats),
+        "response_cache": response_cache.snapshot(),
+        "prompt_cache": {
+            **prompt_cache_stats,
+            "cached_ratio": round(cached_token_ratio(), 4),
+            "prefix_hash": PROMPT_PREFIX_HASH,
+        },
+        "router": router_snapshot(),
+        "flags": flag_store.snapshot(),
+        "llm_gateway": gateway.snapshot(),
+        "parse": {
+            **parse_stats,
+            "structured_output": STRUCTURED_OUTPUT,
+            "retry_rate": round(retry_rate(), 4),
+        }
     }
 
-@app.get("/state")
-async def get_state(character_name: str):
-    state = get_character_data(character_name)
-    if "error" in state:
-        raise HTTPException(status_code=404, detail=state["error"])
-    
-    # Enrich with room title if possible
-    # (Assuming we store room_id, need to fetch room title)
-    if "location_room_id" in state:
-        room = execute_query("SELECT title, room_key FROM room WHERE id = ?", (state["location_room_id"],), fetch_one=True)
-        if room:
-            state["location_title"] = room["title"]
-            state["location_key"] = room["room_key"]
-    
-    return state
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Per-phase turn latency, DB query, token and LLM gateway metrics in the Prometheus text format."""
+    return PlainTextResponse(tracing.metrics.render() + gateway.render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/health")
 async def health_check():
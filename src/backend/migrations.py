@@ -0,0 +1,86 @@
+"""
+Schema migrations for existing databases.
+
+schema.sql always describes the latest schema and stamps `PRAGMA user_version`
+with SCHEMA_VERSION, so fresh databases need nothing from here. Databases
+created by an older schema.sql are brought up to date by `migrate()`, which
+applies every step newer than their user_version in one transaction. A step
+is SQL, or a function of the connection for work SQL alone cannot do.
+"""
+import logging
+from typing import Callable, List, Tuple, Union
+
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+def _index_rules(conn) -> None:
+    # init_db imports this module
+    from init_db import rebuild_rule_index
+    rebuild_rule_index(conn)
+
+
+# (version, description, statements)
+MIGRATIONS: List[Tuple[int, str, List[Union[str, Callable]]]] = [
+    (1, "story_log sessions", [
+        "ALTER TABLE story_log ADD COLUMN session_id TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_story_log_session ON story_log (session_id, turn_index)",
+    ]),
+    (2, "indexes for hot lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_character_name ON character (name)",
+        "CREATE INDEX IF NOT EXISTS idx_room_exit_from ON room_exit (from_room_id)",
+        "CREATE INDEX IF NOT EXISTS idx_monster_instance_room ON monster_instance (room_id, status)",
+    ]),
+    (3, "content section hashes", [
+        """
+        CREATE TABLE IF NOT EXISTS content_hash (
+            source      TEXT NOT NULL,
+            section     TEXT NOT NULL,
+            hash        TEXT NOT NULL,
+            updated_at  TEXT DEFAULT (datetime('now')),
+            PRIMARY KEY (source, section)
+        )
+        """,
+    ]),
+    (4, "rule full-text index", [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS rule_fts USING fts5(
+            topic,
+            summary,
+            tags,
+            mechanics,
+            tokenize = 'porter unicode61'
+        )
+        """,
+        _index_rules,
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn=None) -> int:
+    """Apply pending migrations; returns the resulting schema version."""
+    conn = conn or get_db_connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    if not pending:
+        return version
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for number, description, statements in pending:
+            logger.info(f"Applying migration {number}: {description}")
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            version = number
+        conn.execute(f"PRAGMA user_version = {version}")
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return version
@@ -0,0 +1,165 @@
+"""
+Opt-in cache of final turn responses.
+
+Turns that resolve without side effects (no tools, or only read-only lookups)
+are cached under a key built from the normalized player input, a hash of the
+state that shapes the reply and the model name. That state is the compact
+character sheet exactly as the prompt shows it (name, level, HP, gold,
+inventory, conditions, location, ...), the room's live monsters, the flags
+and the prompt. The sheet carries the character's name, which the narration
+may use, so entries are per character: two players asking the same thing in
+the same room do not share a reply. Entries live in an LRU in memory with a
+TTL, and optionally in a SQLite file so they survive restarts.
+
+Enable with LLM_CACHE=memory or LLM_CACHE=sqlite (default: off).
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from context_builder import compact_sheet
+from database import connect
+
+LLM_CACHE = os.getenv("LLM_CACHE", "off")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize_input(player_input: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(_NON_WORD.sub(" ", player_input.lower()).split())
+
+
+def state_hash(char_data: Dict[str, Any], flags: Optional[Dict[str, Any]] = None, prompt: str = "",
+               monsters: Optional[List[List[Any]]] = None) -> str:
+    """Hash of the state that can change the DM's reply to the same input."""
+    state = {
+        # Every sheet field the prompt shows: a purchase or a pickup changes the answer
+        "sheet": compact_sheet(char_data),
+        # [id, hp, alive] per instance: killing the harpy changes the room's description
+        "monsters": monsters or [],
+        "flags": flags or {},
+        "prompt": hashlib.sha256(prompt.encode()).hexdigest()[:16],
+    }
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, mode: str = LLM_CACHE, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 ttl: float = LLM_CACHE_TTL_SECONDS, path: str = LLM_CACHE_PATH):
+        self.mode = mode
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bypasses": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("memory", "sqlite")
+
+    def key_for(self, player_input: str, char_data: Dict[str, Any], model: str,
+                flags: Optional[Dict[str, Any]] = None, prompt: str = "",
+                monsters: Optional[List[List[Any]]] = None) -> str:
+        raw = f"{model}\x00{normalize_input(player_input)}\x00{state_hash(char_data, flags, prompt, monsters)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    # -- disk store ----------------------------------------------------------
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache (expires_at)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    # -- lookups (blocking when mode is sqlite; call off the event loop) -------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return dict(value)
+                del self._entries[key]
+
+        if self.mode == "sqlite":
+            row = self._db().execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row:
+                value = json.loads(row["value"])
+                self._remember(key, value, row["expires_at"])
+                with self._lock:
+                    self.stats["hits"] += 1
+                    self.stats["disk_hits"] += 1
+                return dict(value)
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        with self._lock:
+            self.stats["stores"] += 1
+        if self.mode == "sqlite":
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+            conn.commit()
+
+    def bypass(self) -> None:
+        """Count a turn that could not be cached (side-effecting tools)."""
+        with self._lock:
+            self.stats["bypasses"] += 1
+
+    def _remember(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.mode == "sqlite":
+            self._db().execute("DELETE FROM llm_cache")
+            self._db().commit()
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "mode": self.mode,
+            "entries": len(self._entries),
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,156 @@
+"""
+In-memory room graph of an adventure: exits as adjacency maps, exit
+validation and shortest paths, all without SQL.
+
+Built by content_cache from the `room` and `room_exit` rows when it warms.
+Rooms are numbered densely inside each graph so a breadth-first search works
+on plain integer arrays, which keeps path queries fast on generated
+adventures with thousands of rooms.
+
+Shortest paths (fewest exits taken) are precomputed from every room when an
+adventure has at most ROOM_GRAPH_PRECOMPUTE_ROOMS rooms. Bigger adventures
+search on demand and keep the search trees of the last ROOM_GRAPH_PATH_CACHE
+start rooms.
+"""
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+ROOM_GRAPH_PRECOMPUTE_ROOMS = int(os.getenv("ROOM_GRAPH_PRECOMPUTE_ROOMS", "256"))
+ROOM_GRAPH_PATH_CACHE = int(os.getenv("ROOM_GRAPH_PATH_CACHE", "1024"))
+
+_UNREACHED = -1
+
+
+class AdventureGraph:
+    """Rooms and exits of one adventure."""
+
+    def __init__(self, adventure_id: int, rooms: Iterable[Dict[str, Any]], exits: Iterable[Dict[str, Any]]):
+        self.adventure_id = adventure_id
+        self.room_ids: List[int] = []
+        self.index: Dict[int, int] = {}             # room id -> dense index
+        self.room_keys: Dict[str, int] = {}         # room_key -> room id
+        keys: List[str] = []
+        for room in rooms:
+            self.index[room["id"]] = len(self.room_ids)
+            self.room_ids.append(room["id"])
+            self.room_keys[room["room_key"]] = room["id"]
+            keys.append(room["room_key"])
+
+        # from room id -> {direction: exit row} and {to room id: exit row}
+        self.by_direction: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self.by_target: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        # from room id -> exits as the DM sees them (direction, target key, description)
+        self.summaries: Dict[int, List[Dict[str, Any]]] = {}
+        self.adjacency: List[List[int]] = [[] for _ in self.room_ids]
+        for e in exits:
+            source, target = e["from_room_id"], e["to_room_id"]
+            if source not in self.index or target not in self.index:
+                continue
+            self.by_direction.setdefault(source, {})[e["direction"]] = e
+            # The first exit to a room is the one paths take
+            if target not in self.by_target.setdefault(source, {}):
+                self.by_target[source][target] = e
+                self.adjacency[self.index[source]].append(self.index[target])
+            self.summaries.setdefault(source, []).append({
+                "direction": e["direction"],
+                "room_key": keys[self.index[target]],
+                "description": e["description"],
+            })
+
+        self._lock = threading.Lock()
+        self._trees: "OrderedDict[int, array]" = OrderedDict()   # start index -> BFS parent array
+        self.precomputed = len(self.room_ids) <= ROOM_GRAPH_PRECOMPUTE_ROOMS
+        if self.precomputed:
+            for start in range(len(self.room_ids)):
+                self._trees[start] = self._search(start)
+
+    def __len__(self) -> int:
+        return len(self.room_ids)
+
+    # -- exits ---------------------------------------------------------------
+
+    def exits(self, room_id: int) -> List[Dict[str, Any]]:
+        """Exit rows leaving `room_id`."""
+        return list(self.by_direction.get(room_id, {}).values())
+
+    def exit_summaries(self, room_id: int) -> List[Dict[str, Any]]:
+        return self.summaries.get(room_id, [])
+
+    def exit_via(self, room_id: int, direction: str) -> Optional[Dict[str, Any]]:
+        """The exit taken by moving `direction` from `room_id`, if there is one."""
+        return self.by_direction.get(room_id, {}).get(direction)
+
+    def exit_to(self, room_id: int, target_room_id: int) -> Optional[Dict[str, Any]]:
+        """The exit from `room_id` straight into `target_room_id`, if there is one."""
+        return self.by_target.get(room_id, {}).get(target_room_id)
+
+    # -- paths ---------------------------------------------------------------
+
+    def _search(self, start: int) -> array:
+        """Breadth-first search from dense index `start`: the parent of every room reached."""
+        parents = array("i", [_UNREACHED]) * len(self.room_ids)
+        parents[start] = start
+        frontier = [start]
+        adjacency = self.adjacency
+        while frontier:
+            following = []
+            for node in frontier:
+                for neighbour in adjacency[node]:
+                    if parents[neighbour] == _UNREACHED:
+                        parents[neighbour] = node
+                        following.append(neighbour)
+            frontier = following
+        return parents
+
+    def _tree(self, start: int) -> array:
+        with self._lock:
+            tree = self._trees.get(start)
+            if tree is not None:
+                if not self.precomputed:
+                    self._trees.move_to_end(start)
+                return tree
+        tree = self._search(start)
+        with self._lock:
+            self._trees[start] = tree
+            if len(self._trees) > ROOM_GRAPH_PATH_CACHE:
+                self._trees.popitem(last=False)
+        return tree
+
+    def path(self, from_room_id: int, to_room_id: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        The exits to take, in order, to get from one room to another by the
+        fewest moves ([] when already there), or None if it cannot be reached.
+        """
+        start, goal = self.index.get(from_room_id), self.index.get(to_room_id)
+        if start is None or goal is None:
+            return None
+        parents = self._tree(start)
+        if parents[goal] == _UNREACHED:
+            return None
+        rooms = [goal]
+        while rooms[-1] != start:
+            rooms.append(parents[rooms[-1]])
+        ids = [self.room_ids[i] for i in reversed(rooms)]
+        return [self.by_target[a][b] for a, b in zip(ids, ids[1:])]
+
+    def distance(self, from_room_id: int, to_room_id: int) -> Optional[int]:
+        """Moves on the shortest path, or None if there is no path."""
+        steps = self.path(from_room_id, to_room_id)
+        return None if steps is None else len(steps)
+
+
+def build_graphs(rooms: Iterable[Dict[str, Any]], exits: Iterable[Dict[str, Any]]) -> Dict[int, AdventureGraph]:
+    """One graph per adventure from all room and exit rows."""
+    rooms_by_adventure: Dict[int, List[Dict[str, Any]]] = {}
+    for room in rooms:
+        rooms_by_adventure.setdefault(room["adventure_id"], []).append(room)
+    exits_by_adventure: Dict[int, List[Dict[str, Any]]] = {}
+    for e in exits:
+        exits_by_adventure.setdefault(e["adventure_id"], []).append(e)
+    return {
+        adventure_id: AdventureGraph(adventure_id, adventure_rooms, exits_by_adventure.get(adventure_id, []))
+        for adventure_id, adventure_rooms in rooms_by_adventure.items()
+    }
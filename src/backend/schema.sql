@@ -34,6 +34,8 @@ CREATE TABLE room_exit (
     UNIQUE (adventure_id, from_room_id, direction)
 );
 
+CREATE INDEX idx_room_exit_from ON room_exit (from_room_id);
+
 CREATE TABLE monster (
     id              INTEGER PRIMARY KEY,
     name            TEXT NOT NULL,          -- display name, e.g. 'Frost Harpy'
@@ -58,6 +60,8 @@ CREATE TABLE monster_instance (
     FOREIGN KEY (monster_id) REFERENCES monster(id)
 );
 
+CREATE INDEX idx_monster_instance_room ON monster_instance (room_id, status);
+
 CREATE TABLE character (
     id              INTEGER PRIMARY KEY,
     adventure_id    INTEGER NOT NULL,
@@ -80,6 +84,8 @@ CREATE TABLE character (
     FOREIGN KEY (location_room_id) REFERENCES room(id)
 );
 
+CREATE INDEX idx_character_name ON character (name);
+
 CREATE TABLE game_flag (
     id              INTEGER PRIMARY KEY,
     adventure_id    INTEGER NOT NULL,
@@ -97,9 +103,12 @@ CREATE TABLE story_log (
     speaker_type    TEXT NOT NULL,      -- 'player' or 'dm'
     speaker_name    TEXT,               -- 'Kraven' or 'DM'
     content         TEXT NOT NULL,      -- text of the utterance or narration
+    session_id      TEXT,               -- play session the line belongs to
     FOREIGN KEY (adventure_id) REFERENCES adventure(id)
 );
 
+CREATE INDEX idx_story_log_session ON story_log (session_id, turn_index);
+
 CREATE TABLE rule (
     id              INTEGER PRIMARY KEY,
     topic           TEXT NOT NULL,      -- e.g. 'ability checks', 'grappling'
@@ -109,3 +118,26 @@ CREATE TABLE rule (
     tags            TEXT,               -- comma-separated tags for search
     created_at      TEXT DEFAULT (datetime('now'))
 );
+
+-- Full-text index over rules for rules_lookup (BM25-ranked).
+-- rowid = rule.id; kept in step by init_db.sync_rules.
+CREATE VIRTUAL TABLE rule_fts USING fts5(
+    topic,
+    summary,
+    tags,
+    mechanics,
+    tokenize = 'porter unicode61'
+);
+
+-- Hash of every ingested source section (a rule heading, an adventure SQL
+-- statement, or '*' for the whole file), so init_db only re-ingests what changed.
+CREATE TABLE content_hash (
+    source          TEXT NOT NULL,      -- 'rules' or 'adventure'
+    section         TEXT NOT NULL,      -- rule topic, statement label, or '*'
+    hash            TEXT NOT NULL,      -- sha256 of the section text
+    updated_at      TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (source, section)
+);
+
+-- Bump together with migrations.SCHEMA_VERSION
+PRAGMA user_version = 4;
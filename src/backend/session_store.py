@@ -0,0 +1,153 @@
+"""
+Server-side play sessions backed by the story_log table.
+
+Each session keeps its recent conversation in an in-memory ring buffer that
+the agent reads from, so clients no longer upload history with every turn.
+Every line is also appended to story_log; writes are queued and flushed in
+batches (one transaction per flush) either every STORY_LOG_FLUSH_SECONDS or
+once STORY_LOG_BATCH_SIZE lines are pending. A session not in memory (new
+process, evicted, reconnect) is reloaded from its latest story_log rows.
+"""
+import asyncio
+import logging
+import os
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from database import execute_query, transaction
+from executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+SESSION_WINDOW = int(os.getenv("SESSION_WINDOW", "40"))                 # messages kept per session
+MAX_SESSIONS_IN_MEMORY = int(os.getenv("MAX_SESSIONS_IN_MEMORY", "10000"))
+STORY_LOG_BATCH_SIZE = int(os.getenv("STORY_LOG_BATCH_SIZE", "64"))
+STORY_LOG_FLUSH_SECONDS = float(os.getenv("STORY_LOG_FLUSH_SECONDS", "1.0"))
+
+
+class Session:
+    def __init__(self, session_id: str, next_turn_index: int, lines: List[Dict[str, str]]):
+        self.session_id = session_id
+        self.next_turn_index = next_turn_index
+        self.history: Deque[Dict[str, str]] = deque(lines, maxlen=SESSION_WINDOW)
+
+
+class SessionStore:
+    def __init__(self):
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._pending: List[Tuple] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+
+    # -- loading -----------------------------------------------------------
+
+    @staticmethod
+    def _load(session_id: str) -> Session:
+        rows = execute_query(
+            """
+            SELECT turn_index, speaker_type, content FROM story_log
+            WHERE session_id = ?
+            ORDER BY turn_index DESC
+            LIMIT ?
+            """,
+            (session_id, SESSION_WINDOW),
+            fetch_all=True
+        )
+        rows.reverse()
+        lines = [
+            {"role": "user" if r['speaker_type'] == 'player' else "assistant", "content": r['content']}
+            for r in rows
+        ]
+        next_turn_index = rows[-1]['turn_index'] + 1 if rows else 0
+        return Session(session_id, next_turn_index, lines)
+
+    async def _get(self, session_id: str) -> Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            # Unflushed lines may belong to this session; persist them before reading
+            await self.flush()
+            loaded = await run_blocking(self._load, session_id)
+            # Another request may have loaded it while we waited
+            session = self._sessions.setdefault(session_id, loaded)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > MAX_SESSIONS_IN_MEMORY:
+            self._sessions.popitem(last=False)
+        return session
+
+    # -- public API --------------------------------------------------------
+
+    async def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        """Recent messages for the session, oldest first (role/content)."""
+        session = await self._get(session_id)
+        return list(session.history)
+
+    async def append_turn(self, session_id: str, adventure_id: int, character_name: str,
+                          player_input: str, narration: str) -> None:
+        """Record one player line and one DM reply."""
+        session = await self._get(session_id)
+        for speaker_type, speaker_name, role, content in (
+            ("player", character_name, "user", player_input),
+            ("dm", "DM", "assistant", narration),
+        ):
+            if not content:
+                continue
+            session.history.append({"role": role, "content": content})
+            self._pending.append(
+                (adventure_id, session.next_turn_index, speaker_type, speaker_name, content, session_id)
+            )
+            session.next_turn_index += 1
+
+        if len(self._pending) >= STORY_LOG_BATCH_SIZE:
+            asyncio.ensure_future(self.flush())
+
+    async def flush(self) -> int:
+        """Write all pending lines to story_log in one transaction."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            try:
+                await run_blocking(self._write, batch)
+            except Exception as e:
+                logger.error(f"story_log flush failed, will retry: {e}")
+                self._pending[:0] = batch
+                return 0
+            return len(batch)
+
+    @staticmethod
+    def _write(batch: List[Tuple]) -> None:
+        with transaction() as conn:
+            conn.executemany(
+                """
+                INSERT INTO story_log (adventure_id, turn_index, speaker_type, speaker_name, content, session_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                batch
+            )
+
+    # -- background flushing ----------------------------------------------
+
+    async def _flush_periodically(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(STORY_LOG_FLUSH_SECONDS)
+            await self.flush()
+
+    def start(self) -> None:
+        self._stopping = False
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_periodically())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+
+session_store = SessionStore()
@@ -0,0 +1,202 @@
+"""
+Tool registry: the functions the DM may call and their OpenAI schemas.
+
+Each tool's schema is generated once, at import, from its Python signature in
+tools.py: parameter names, JSON types (from the annotations) and which
+parameters are required (no default). Descriptions come from the docstring's
+first paragraph and from the per-parameter notes in the registry. Parameters
+the turn fills in itself (`adventure_id`, `rng`) are never shown to the model.
+
+The schemas are built with sorted keys and serialized canonically, so the
+static part of every request (system prompt plus tools) is byte-identical
+from call to call and process to process, which is what provider-side
+prompt caching keys on.
+"""
+import hashlib
+import inspect
+import json
+import typing
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+from tools import (
+    roll_dice, get_room_details, update_character_data,
+    rules_lookup, get_monster_stats, move_character, find_path, get_flags, set_flags
+)
+
+# Tool side-effect classes, used to decide what may run concurrently
+PURE = "pure"            # no I/O at all, runs inline on the event loop
+READ_ONLY = "read_only"  # reads the DB, runs on the tool pool in parallel
+MUTATING = "mutating"    # writes the DB, serialized per character
+
+# Parameters filled in from the turn, never by the model
+SCOPE_PARAM = "adventure_id"
+RNG_PARAM = "rng"
+
+
+class ToolSpec(NamedTuple):
+    func: Callable[..., Dict[str, Any]]
+    kind: str
+    # Takes `adventure_id`, filled in from the turn rather than by the model
+    scoped: bool = False
+    # Takes `rng`, the session's dice roller
+    seeded: bool = False
+    # Tool description; defaults to the first paragraph of the docstring
+    description: Optional[str] = None
+    # Per parameter: a description, or schema keys merged over the generated ones
+    params: Dict[str, Any] = {}
+    # Served by the turn's TurnState (same name) whenever a turn is running
+    per_turn: bool = False
+
+
+CHANGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "field": {"type": "string", "enum": ["hp", "gold", "inventory"]},
+        "operation": {"type": "string", "enum": ["increment", "decrement", "set", "add_item", "remove_item"]},
+        "value": {
+            "description": "Integer for hp/gold; for inventory an item like {\"name\": \"Torch\", \"qty\": 1}",
+            "anyOf": [
+                {"type": "integer"},
+                {
+                    "type": "object",
+                    "properties": {"name": {"type": "string"}, "qty": {"type": "integer"}},
+                    "required": ["name"]
+                }
+            ]
+        }
+    },
+    "required": ["field", "operation", "value"]
+}
+
+TOOL_REGISTRY: Dict[str, ToolSpec] = {
+    "roll_dice": ToolSpec(roll_dice, PURE, seeded=True,
+        description="Roll dice using 5e notation: 1d20+3, 2d6+1d4+2, 4d6kh3, 2d20kl1.",
+        params={
+            "notation": "Dice notation e.g. 1d20+5",
+            "reason": "Reason for the roll",
+            "mode": {"enum": ["normal", "advantage", "disadvantage"], "description": "Advantage or disadvantage on the d20"},
+            "critical": "Critical hit: double the damage dice",
+        }),
+    "get_room_details": ToolSpec(get_room_details, READ_ONLY, scoped=True,
+        description="Get details about a specific room.",
+        params={"room_key": "The unique key of the room e.g. room_1"}),
+    "rules_lookup": ToolSpec(rules_lookup, READ_ONLY,
+        description="Search the D&D 5e rules. Returns the best matching rules, most relevant first.",
+        params={
+            "topic": "The rule topic or keywords to search for",
+            "limit": "Maximum number of rules to return (default 3)",
+        }),
+    "get_monster_stats": ToolSpec(get_monster_stats, READ_ONLY,
+        description="Get a monster's full stat block (AC, HP, abilities, attacks) by template name.",
+        params={"monster_name": "Template name, e.g. Frost Harpy"}),
+    "update_character_data": ToolSpec(update_character_data, MUTATING, scoped=True,
+        description="Update character stats (HP, Gold, Inventory). All changes are applied together or not at all.",
+        params={"changes": {"items": CHANGE_SCHEMA}}),
+    "move_character": ToolSpec(move_character, MUTATING, scoped=True,
+        description="Move the character to an adjacent room via one of its exits, by room key or exit direction.",
+        params={
+            "room_key": "Target room key (e.g. room_2)",
+            "direction": "Exit direction from the current room (e.g. back, deeper)",
+        }),
+    "find_path": ToolSpec(find_path, READ_ONLY, scoped=True,
+        description="Shortest route between two rooms: the exits to take, in order.",
+        params={"to_room_key": "Destination room key", "from_room_key": "Starting room key, usually the current room"}),
+    "get_flags": ToolSpec(get_flags, READ_ONLY, scoped=True, per_turn=True,
+        description="Read several game flags at once (null for flags never set).",
+        params={"names": {"items": {"type": "string"}, "description": "Flag names, e.g. [\"room_2.ward_broken\"]"}}),
+    "set_flags": ToolSpec(set_flags, MUTATING, scoped=True, per_turn=True,
+        description="Set several game flags at once (door states, quest progress, triggered traps). "
+                    "Null clears a flag. Prefix flags that belong to one room with its key, e.g. room_2.ward_broken.",
+        params={"flags": "Flag name -> value (true/false, number or short string)"}),
+}
+
+
+# ---------------------------------------------------------------------------
+# Schema generation
+# ---------------------------------------------------------------------------
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", dict: "object", list: "array"}
+
+
+def json_type(annotation: Any) -> Dict[str, Any]:
+    """JSON schema for a type annotation (Optional is unwrapped; unknown types allow anything)."""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is Union:
+        options = [a for a in args if a is not type(None)]
+        return json_type(options[0]) if len(options) == 1 else {"anyOf": [json_type(a) for a in options]}
+    if origin is typing.Literal:
+        return {**json_type(type(args[0])), "enum": list(args)}
+    if origin in (list, List):
+        return {"type": "array", "items": json_type(args[0]) if args else {}}
+    if origin in (dict, Dict):
+        return {"type": "object"}
+    if annotation in _JSON_TYPES:
+        return {"type": _JSON_TYPES[annotation]}
+    return {}
+
+
+def injected_params(spec: ToolSpec) -> set:
+    return {p for p, on in ((SCOPE_PARAM, spec.scoped), (RNG_PARAM, spec.seeded)) if on}
+
+
+def tool_schema(name: str, spec: ToolSpec) -> Dict[str, Any]:
+    """The OpenAI function schema for one registered tool."""
+    signature = inspect.signature(spec.func)
+    hints = typing.get_type_hints(spec.func)
+    hidden = injected_params(spec)
+    unknown = set(spec.params) - set(signature.parameters)
+    if unknown:
+        raise TypeError(f"{name}: registry describes unknown parameters {sorted(unknown)}")
+
+    properties, required = {}, []
+    for param in signature.parameters.values():
+        if param.name in hidden:
+            continue
+        schema = json_type(hints.get(param.name, Any))
+        extra = spec.params.get(param.name)
+        if isinstance(extra, str):
+            schema["description"] = extra
+        elif extra:
+            schema.update(extra)
+        properties[param.name] = schema
+        if param.default is inspect.Parameter.empty:
+            required.append(param.name)
+
+    description = spec.description or inspect.getdoc(spec.func).split("\n\n")[0].replace("\n", " ")
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        },
+    }
+
+
+def _sorted(value: Any) -> Any:
+    """`value` with every dict rebuilt in sorted key order (the SDK keeps insertion order)."""
+    if isinstance(value, dict):
+        return {k: _sorted(value[k]) for k in sorted(value)}
+    if isinstance(value, list):
+        return [_sorted(v) for v in value]
+    return value
+
+
+def canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def build_tool_schemas() -> List[Dict[str, Any]]:
+    """Schemas for every registered tool, in name order with sorted keys."""
+    return [_sorted(tool_schema(name, TOOL_REGISTRY[name])) for name in sorted(TOOL_REGISTRY)]
+
+
+# Built once at import and reused for every request
+TOOLS: List[Dict[str, Any]] = build_tool_schemas()
+TOOLS_JSON = canonical_json(TOOLS)
+
+
+def prefix_hash(system_prompt: str) -> str:
+    """Fingerprint of the static request prefix (system prompt plus tools)."""
+    return hashlib.sha256(f"{system_prompt}\x00{TOOLS_JSON}".encode()).hexdigest()[:16]
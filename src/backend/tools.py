@@ -1,84 +1,101 @@
-import random
-import re
+import copy
 import json
-from typing import Dict, Any, List, Optional
-from database import execute_query
+from typing import Dict, Any, List, Optional, Tuple
+from database import execute_query, transaction
+from content_cache import content_cache
+from dice import DiceError, DiceRoller, default_roller
+from flag_store import check_flag_changes, flag_store
 
-def roll_dice(notation: str, reason: str = "") -> Dict[str, Any]:
+def roll_dice(notation: str, reason: str = "", mode: Optional[str] = None, critical: bool = False,
+              rng: Optional[DiceRoller] = None) -> Dict[str, Any]:
     """
-    Rolls dice based on standard notation (e.g., '1d20+5', '2d6').
+    Rolls dice in 5e notation (e.g. '1d20+5', '2d6+1d4+3', '4d6kh3', '1d20+2 adv').
+    `mode` is advantage/disadvantage; `critical` doubles the damage dice.
     """
     try:
-        # Simple parser for XdY+Z or XdY-Z
-        match = re.match(r"(\d+)d(\d+)([\+\-]\d+)?", notation.strip().lower())
-        if not match:
-             # Fallback for simple "d20"
-            if notation.strip().lower() == "d20":
-                match = re.search(r"()d(\d+)", "1d20")
-            elif notation.strip().lower().startswith("d"):
-                 match = re.search(r"()d(\d+)", "1" + notation.strip().lower())
-            
-            if not match:
-                return {"error": f"Invalid dice notation: {notation}"}
-
-        num_dice = int(match.group(1) or 1)
-        die_faces = int(match.group(2))
-        modifier_str = match.group(3) or "+0"
-        modifier = int(modifier_str)
-
-        rolls = [random.randint(1, die_faces) for _ in range(num_dice)]
-        total = sum(rolls) + modifier
-
-        return {
-            "purpose": reason,
-            "notation": notation,
-            "total": total,
-            "individual_rolls": rolls,
-            "modifier": modifier,
-            "result_str": f"{rolls} {modifier_str} = {total}"
-        }
-    except Exception as e:
-        return {"error": f"Dice roll failed: {str(e)}"}
-
-def get_room_details(room_key: str, adventure_id: int = 1) -> Dict[str, Any]:
-    """Retrieve details for a specific dungeon room."""
-    # Get Room
-    room_query = "SELECT * FROM room WHERE room_key = ? AND adventure_id = ?"
-    room = execute_query(room_query, (room_key, adventure_id), fetch_one=True)
+        result = (rng or default_roller).roll(notation, mode, critical)
+    except DiceError as e:
+        return {"error": str(e)}
+
+    terms = result.pop("terms")
+    if len(terms) == 1 and terms[0]["sign"] > 0:
+        kept = terms[0]["kept"]
+        dice_str = str(kept)
+    else:
+        kept = [r for t in terms for r in t["kept"]]
+        dice_str = " ".join(f"{'-' if t['sign'] < 0 else ''}{t['kept']}" for t in terms)
+    result["purpose"] = reason
+    result["notation"] = notation
+    result["individual_rolls"] = kept
+    result["result_str"] = f"{dice_str} {result['modifier']:+d} = {result['total']}"
+    # Per-term detail only when the flat list would hide something
+    if len(terms) > 1 or len(kept) != len(terms[0]["rolls"]):
+        result["terms"] = terms
+    return result
+
+def room_monster_state(room_id: Optional[int]) -> List[List[Any]]:
+    """[id, hp, alive] for every monster instance in a room, dead ones included."""
+    if room_id is None:
+        return []
+    rows = execute_query(
+        "SELECT id, current_hp, status FROM monster_instance WHERE room_id = ? ORDER BY id",
+        (room_id,), fetch_all=True
+    )
+    return [[r['id'], r['current_hp'], r['status'] == 'alive'] for r in rows]
+
+def get_room_details(room_key: str, adventure_id: int) -> Dict[str, Any]:
+    """Retrieve details for a specific dungeon room in an adventure."""
+    # Room and exits are static content served from the cache
+    room = content_cache.get_room(room_key, adventure_id)
     
     if not room:
         return {"error": f"Room {room_key} not found."}
 
-    # Get Exits
-    exits_query = "SELECT * FROM room_exit WHERE from_room_id = ?"
-    exits = execute_query(exits_query, (room['id'],), fetch_all=True)
+    # Precomputed by the room graph and shared between calls; only ever serialized
+    exits = content_cache.get_graph(room['adventure_id']).exit_summaries(room['id'])
 
-    # Get Monsters
+    # Live monster state is the only part that has to come from the DB
     monsters_query = """
-        SELECT mi.instance_name, mi.current_hp, mi.status, m.name as template_name
-        FROM monster_instance mi
-        JOIN monster m ON mi.monster_id = m.id
-        WHERE mi.room_id = ? AND mi.status = 'alive'
+        SELECT instance_name, current_hp, status, monster_id
+        FROM monster_instance
+        WHERE room_id = ? AND status = 'alive'
     """
     monsters = execute_query(monsters_query, (room['id'],), fetch_all=True)
+    for m in monsters:
+        template = content_cache.get_monster_by_id(m.pop('monster_id'))
+        m['template_name'] = template['name'] if template else None
 
     return {
         "room_key": room['room_key'],
         "title": room['title'],
         "short_description": room['short_description'],
         "full_description": room['full_description'],
-        "exits": [dict(e) for e in exits],
-        "monsters": [dict(m) for m in monsters]
+        "exits": exits,
+        "monsters": monsters
     }
 
-def get_character_data(name: str) -> Dict[str, Any]:
+# Names are only unique within an adventure; without one, the oldest match wins
+CHARACTER_MATCH = "name = ? AND (? IS NULL OR adventure_id = ?)"
+
+def find_character_id(name: str, adventure_id: Optional[int] = None) -> Optional[int]:
+    """Id of the character a name (and optional adventure) resolves to, or None."""
+    row = execute_query(
+        f"SELECT id FROM character WHERE {CHARACTER_MATCH} ORDER BY id LIMIT 1",
+        (name, adventure_id, adventure_id), fetch_one=True
+    )
+    return row['id'] if row else None
+
+def get_character_data(name: str, adventure_id: Optional[int] = None) -> Dict[str, Any]:
     """Read the current character state."""
-    query = "SELECT * FROM character WHERE name = ?"
-    char = execute_query(query, (name,), fetch_one=True)
+    query = f"SELECT * FROM character WHERE {CHARACTER_MATCH} ORDER BY id LIMIT 1"
+    char = execute_query(query, (name, adventure_id, adventure_id), fetch_one=True)
     
     if not char:
         return {"error": f"Character {name} not found."}
+    return character_from_row(char)
 
+def character_from_row(char) -> Dict[str, Any]:
+    """Character row as a dict, with its *_json columns decoded."""
     # Parse JSON fields
     data = dict(char)
     for field in ['abilities_json', 'skills_json', 'inventory_json', 'conditions_json']:
@@ -90,16 +107,66 @@ def get_character_data(name: str) -> Dict[str, Any]:
                 pass
     return data
 
-def update_character_data(character_name: str, changes: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Modify character stats or inventory."""
-    char = get_character_data(character_name)
-    if "error" in char:
-        return char
+def _apply_number(field: str, current: int, op: str, val: Any, ceiling: Optional[int] = None) -> int:
+    val = int(val)
+    if op == "decrement":
+        return max(0, current - val)
+    if op == "increment":
+        new_val = current + val
+        return min(ceiling, new_val) if ceiling is not None else new_val
+    if op == "set":
+        return val
+    raise ValueError(f"Unsupported operation '{op}' for {field}")
 
-    char_id = char['id']
-    
-    success = True
+def _apply_inventory(inventory: List[Dict[str, Any]], op: str, val: Any) -> str:
+    """Apply one inventory change in place and return a message."""
+    if op == "set":
+        if not isinstance(val, list):
+            raise ValueError("inventory set expects a list of items")
+        inventory[:] = val
+        return "Inventory replaced"
+
+    # Accept {"name": "Torch", "qty": 2} or just "Torch"
+    item = val if isinstance(val, dict) else {"name": val}
+    name = str(item.get("name", "")).strip()
+    qty = int(item.get("qty", 1))
+    if not name or qty < 1:
+        raise ValueError(f"Invalid inventory item: {val}")
+
+    existing = next((i for i in inventory if i.get("name", "").lower() == name.lower()), None)
+    if existing:
+        name = existing["name"]
+
+    if op in ("add_item", "increment"):
+        if existing:
+            existing["qty"] = existing.get("qty", 1) + qty
+        else:
+            inventory.append({"name": name, "qty": qty})
+        return f"Added {qty} {name}"
+
+    if op in ("remove_item", "decrement"):
+        held = existing.get("qty", 1) if existing else 0
+        if held < qty:
+            raise ValueError(f"Cannot remove {qty} {name}: only {held} carried")
+        if held == qty:
+            inventory.remove(existing)
+        else:
+            existing["qty"] = held - qty
+        return f"Removed {qty} {name}"
+
+    raise ValueError(f"Unsupported operation '{op}' for inventory")
+
+def compute_character_changes(char: Dict[str, Any], changes: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Work out the column updates for `changes` against a character's current
+    hp, max_hp, gold and inventory (a list) without touching `char`.
+
+    Returns (updates, messages); `updates` maps hp/gold/inventory_json to new
+    values. Raises ValueError/TypeError if any change is invalid.
+    """
+    updates = {}
     messages = []
+    inventory = copy.deepcopy(char.get('inventory') or [])
 
     for change in changes:
         field = change.get("field")
@@ -107,96 +174,167 @@ def update_character_data(character_name: str, changes: List[Dict[str, Any]]) ->
         val = change.get("value")
 
         if field == "hp":
-            current = char['hp']
-            if op == "decrement":
-                new_val = max(0, current - val)
-            elif op == "increment":
-                new_val = min(char['max_hp'], current + val)
-            elif op == "set":
-                new_val = val
-            else:
-                continue
-            
-            execute_query("UPDATE character SET hp = ? WHERE id = ?", (new_val, char_id), commit=True)
-            messages.append(f"HP updated to {new_val}")
+            current = updates.get("hp", char['hp'])
+            updates["hp"] = _apply_number(field, current, op, val, ceiling=char['max_hp'])
+            messages.append(f"HP updated to {updates['hp']}")
 
         elif field == "gold":
-            current = char['gold']
-            if op == "decrement":
-                new_val = max(0, current - val)
-            elif op == "increment":
-                new_val = current + val
-            elif op == "set":
-                new_val = val
-            else:
-                continue
-            
-            execute_query("UPDATE character SET gold = ? WHERE id = ?", (new_val, char_id), commit=True)
-            messages.append(f"Gold updated to {new_val}")
-        
-        # Simple inventory (just add/remove items by name for MVP)
+            current = updates.get("gold", char['gold'])
+            updates["gold"] = _apply_number(field, current, op, val)
+            messages.append(f"Gold updated to {updates['gold']}")
+
         elif field == "inventory":
-            inv = char.get("inventory", [])
-            # Implementation could be complex, for MVP just simple modifications
-            # Assume val is {name: "Item", qty: 1}
-            # This requires better JSON handling, keeping it simple for now
-            pass 
-
-    return {"success": success, "messages": messages}
-
-def rules_lookup(topic: str) -> Dict[str, Any]:
-    """Lookup a condensed 5e SRD rule by topic."""
-    # Simple semantic search using LIKE
-    query = """
-        SELECT topic, summary, mechanics_json 
-        FROM rule 
-        WHERE topic LIKE ? OR tags LIKE ? 
-        LIMIT 1
+            messages.append(_apply_inventory(inventory, op, val))
+            updates["inventory_json"] = json.dumps(inventory)
+
+        else:
+            raise ValueError(f"Unsupported field '{field}'")
+
+    return updates, messages
+
+def update_character_data(character_name: str, changes: List[Dict[str, Any]],
+                          adventure_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Modify character stats or inventory.
+
+    All changes are computed in memory and written with a single UPDATE in one
+    transaction; if any change is invalid nothing is applied.
     """
-    search_term = f"%{topic}%"
-    rule = execute_query(query, (search_term, search_term), fetch_one=True)
+    with transaction() as conn:
+        char = conn.execute(
+            f"SELECT id, hp, max_hp, gold, inventory_json FROM character WHERE {CHARACTER_MATCH} ORDER BY id LIMIT 1",
+            (character_name, adventure_id, adventure_id)
+        ).fetchone()
+        if not char:
+            return {"error": f"Character {character_name} not found."}
+
+        current = dict(char)
+        current['inventory'] = json.loads(char['inventory_json'] or "[]")
+        try:
+            updates, messages = compute_character_changes(current, changes)
+        except (TypeError, ValueError) as e:
+            return {"success": False, "error": str(e), "messages": []}
+
+        if updates:
+            # Column names come from the fixed set above, never from input
+            assignments = ", ".join(f"{column} = ?" for column in updates)
+            conn.execute(
+                f"UPDATE character SET {assignments}, updated_at = datetime('now') WHERE id = ?",
+                (*updates.values(), char['id'])
+            )
+
+    return {"success": True, "messages": messages}
+
+def rules_lookup(topic: str, limit: int = 3) -> Dict[str, Any]:
+    """Search the condensed 5e SRD rules; returns the best matches by relevance."""
+    limit = max(1, min(int(limit), 10))
+    rules = content_cache.search_rules(topic, limit)
     
-    if rule:
-        res = dict(rule)
-        if res.get('mechanics_json'):
-             try:
-                 res['mechanics'] = json.loads(res['mechanics_json'])
-                 del res['mechanics_json']
-             except:
-                 pass
-        return res
+    if rules:
+        return {"query": topic, "results": [dict(r) for r in rules]}
     return {"message": f"No specific rule found for '{topic}'."}
 
 def get_monster_stats(monster_name: str) -> Dict[str, Any]:
-    """Retrieve a monster template from SQLite by name."""
-    query = "SELECT * FROM monster WHERE name = ? OR srd_name = ?"
-    monster = execute_query(query, (monster_name, monster_name), fetch_one=True)
+    """Retrieve a monster template by name."""
+    monster = content_cache.get_monster(monster_name)
     
     if monster:
-        res = dict(monster)
-        if res.get('meta_json'):
-            try:
-                res.update(json.loads(res['meta_json']))
-                del res['meta_json']
-            except:
-                pass
-        return res
+        return dict(monster)
     return {"error": "Monster not found"}
 
-def move_character(character_name: str, room_key: str) -> Dict[str, Any]:
-    """Move a character to a new room."""
-    char = get_character_data(character_name)
-    if "error" in char:
-        return char
+def plan_move(adventure_id: Optional[int], from_room_id: Optional[int],
+              room_key: Optional[str] = None, direction: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Check a move against the adventure's room graph (no SQL): the target must
+    be one exit away from the current room. Returns {"room": target room,
+    "exit": exit taken} or {"error": ...}. A character with no location yet
+    may be placed in any room.
+    """
+    graph = content_cache.get_graph(adventure_id)
+    if graph is None:
+        return {"error": f"Adventure {adventure_id} has no rooms."}
+    exits = ", ".join(e["direction"] for e in graph.exits(from_room_id)) or "none"
+
+    if direction:
+        exit_row = graph.exit_via(from_room_id, direction)
+        if exit_row is None:
+            return {"error": f"No exit '{direction}' from here. Exits: {exits}."}
+        target = content_cache.get_room_by_id(exit_row["to_room_id"])
+        if room_key and room_key != target["room_key"]:
+            return {"error": f"The '{direction}' exit leads to {target['room_key']}, not {room_key}."}
+        return {"room": target, "exit": exit_row}
 
-    # Verify room exists
-    room = execute_query("SELECT id FROM room WHERE room_key = ?", (room_key,), fetch_one=True)
-    if not room:
+    if not room_key:
+        return {"error": "Give the target room_key or an exit direction."}
+    target = content_cache.get_room(room_key, adventure_id)
+    if not target:
         return {"error": f"Room {room_key} not found"}
+    if from_room_id is None or from_room_id not in graph.index:
+        return {"room": target, "exit": None}
+    if target["id"] == from_room_id:
+        return {"error": f"Already in {room_key}."}
 
-    execute_query(
-        "UPDATE character SET location_room_id = ? WHERE id = ?", 
-        (room['id'], char['id']), 
-        commit=True
-    )
-    return {"success": True, "message": f"Moved {character_name} to {room_key}"}
+    exit_row = graph.exit_to(from_room_id, target["id"])
+    if exit_row is None:
+        path = graph.path(from_room_id, target["id"])
+        if path is None:
+            return {"error": f"{room_key} cannot be reached from here. Exits: {exits}."}
+        route = ", ".join(step["direction"] for step in path)
+        return {"error": f"{room_key} is not next to this room; the way there is: {route}. Move one exit at a time."}
+    return {"room": target, "exit": exit_row}
+
+def move_character(character_name: str, room_key: Optional[str] = None, direction: Optional[str] = None,
+                   adventure_id: Optional[int] = None) -> Dict[str, Any]:
+    """Move a character to an adjacent room in their own adventure, by room key or exit direction."""
+    with transaction() as conn:
+        char = conn.execute(
+            f"SELECT id, adventure_id, location_room_id FROM character WHERE {CHARACTER_MATCH} ORDER BY id LIMIT 1",
+            (character_name, adventure_id, adventure_id)
+        ).fetchone()
+        if not char:
+            return {"error": f"Character {character_name} not found."}
+
+        move = plan_move(char['adventure_id'], char['location_room_id'], room_key, direction)
+        if "error" in move:
+            return move
+        conn.execute(
+            "UPDATE character SET location_room_id = ?, updated_at = datetime('now') WHERE id = ?",
+            (move["room"]["id"], char['id'])
+        )
+
+    return {"success": True, "message": f"Moved {character_name} to {move['room']['room_key']}"}
+
+def find_path(to_room_key: str, from_room_key: str, adventure_id: int) -> Dict[str, Any]:
+    """Shortest route between two rooms of an adventure, as the exits to take in order."""
+    graph = content_cache.get_graph(adventure_id)
+    source = content_cache.get_room(from_room_key, adventure_id)
+    target = content_cache.get_room(to_room_key, adventure_id)
+    if graph is None or not source or not target:
+        return {"error": f"Room {from_room_key if not source else to_room_key} not found."}
+    path = graph.path(source["id"], target["id"])
+    if path is None:
+        return {"reachable": False, "from": from_room_key, "to": to_room_key}
+    return {
+        "reachable": True, "from": from_room_key, "to": to_room_key, "moves": len(path),
+        "steps": [
+            {"direction": step["direction"], "room_key": content_cache.get_room_by_id(step["to_room_id"])["room_key"]}
+            for step in path
+        ],
+    }
+
+
+def get_flags(names: List[str], adventure_id: int) -> Dict[str, Any]:
+    """Current values of game flags (null for flags never set)."""
+    if not isinstance(names, list) or not names:
+        return {"error": "names must be a non-empty list of flag names"}
+    return {"flags": flag_store.get_many(adventure_id, names)}
+
+
+def set_flags(flags: Dict[str, Any], adventure_id: int) -> Dict[str, Any]:
+    """Set several game flags at once in one transaction; a null value clears the flag."""
+    try:
+        check_flag_changes(flags)
+        flag_store.set_many(adventure_id, flags)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    return {"success": True, "flags": flags}
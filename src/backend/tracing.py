@@ -0,0 +1,274 @@
+"""
+Per-turn spans and Prometheus metrics.
+
+A turn is traced as a tree of spans: the root `turn` span, then one span per
+phase (context fetch, each LLM call, each tool execution, JSON parse, state
+flush and snapshot). Every span records its duration, the SQLite statements
+run while it was open (through a trace callback on each connection) and any
+token counts reported by the provider. When the root span closes, its phases
+are folded into the metrics served by /metrics and one summary line is
+logged.
+
+The current span lives in a context variable, so it follows the turn across
+`await`s and into the tool pool (`executor.run_blocking` copies the context
+into the worker thread).
+
+Spans can also be exported over OTLP: set OTEL_EXPORTER_OTLP_ENDPOINT and
+install opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http.
+TRACING=0 turns all of this into no-ops.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING", "1") == "1"
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+
+# Histogram buckets for phase durations, in seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "parent", "children", "start", "duration", "db_queries", "otel")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.children: List["Span"] = []
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        # Statements run while this span (or one of its children) was open
+        self.db_queries = 0
+        self.otel = None
+
+    def add(self, key: str, value: int) -> None:
+        """Accumulate a numeric attribute, e.g. token counts."""
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def walk(self) -> Iterator["Span"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def add_to_span(**values: int) -> None:
+    """Add numeric attributes to the open span, if any."""
+    span_ = _current.get()
+    if span_ is not None:
+        for key, value in values.items():
+            span_.add(key, value)
+
+
+def count_query(statement: str) -> None:
+    """sqlite3 trace callback: charge one statement to the open span and its ancestors."""
+    span_ = _current.get()
+    while span_ is not None:
+        span_.db_queries += 1
+        span_ = span_.parent
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a child of the open span. Opening a span while none is
+    open starts a new trace, which is recorded to the metrics when it closes.
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+
+    parent = _current.get()
+    current = Span(name, parent, attrs)
+    if parent is not None:
+        parent.children.append(current)
+    if _tracer is not None:
+        current.otel = _start_otel_span(current)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Closed from another context (e.g. an abandoned stream); just restore the parent
+            _current.set(parent)
+        if current.otel is not None:
+            _end_otel_span(current)
+        if parent is None:
+            metrics.record(current)
+            logger.info(summarize(current))
+
+
+def summarize(root: Span) -> str:
+    """One line per trace: total time and queries, then each phase."""
+    label = " ".join(f"{k}={v}" for k, v in root.attrs.items() if k in ("character", "mode", "error"))
+    phases = []
+    for s in root.walk():
+        if s is root:
+            continue
+        text = f"{s.name}{'[' + s.attrs['tool'] + ']' if 'tool' in s.attrs else ''} {s.duration * 1000:.0f}ms/{s.db_queries}q"
+        if "outcome" in s.attrs:
+            text += f"/{s.attrs['outcome']}"
+        if "prompt_tokens" in s.attrs:
+            text += f"/{s.attrs['prompt_tokens']}tok({s.attrs.get('cached_tokens', 0)} cached)"
+        phases.append(text)
+    phases = ", ".join(phases)
+    return f"{root.name} {label} {root.duration * 1000:.0f}ms/{root.db_queries}q: {phases}"
+
+
+# ---------------------------------------------------------------------------
+# Prometheus metrics
+# ---------------------------------------------------------------------------
+
+class Metrics:
+    """Histograms and counters per phase, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (root, phase, tool) -> [bucket counts..., sum, count]
+        self.durations: Dict[Tuple[str, str, str], List[float]] = {}
+        self.db_queries: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.tokens: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.errors: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.outcomes: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def record(self, root: Span) -> None:
+        with self._lock:
+            for s in root.walk():
+                labels = (root.name, s.name, s.attrs.get("tool", ""))
+                values = self.durations.setdefault(labels, [0] * (len(DURATION_BUCKETS) + 2))
+                for i, bound in enumerate(DURATION_BUCKETS):
+                    if s.duration <= bound:
+                        values[i] += 1
+                values[-2] += s.duration
+                values[-1] += 1
+                self.db_queries[labels] += s.db_queries
+                for kind in ("prompt_tokens", "cached_tokens", "completion_tokens"):
+                    if kind in s.attrs:
+                        self.tokens[(s.name, kind.replace("_tokens", ""))] += s.attrs[kind]
+                if "error" in s.attrs:
+                    self.errors[(s.name, s.attrs["error"])] += 1
+                if "outcome" in s.attrs:
+                    self.outcomes[(s.name, s.attrs["outcome"])] += 1
+
+    def render(self) -> str:
+        lines = [
+            "# HELP holodeck_span_duration_seconds Duration of each traced phase.",
+            "# TYPE holodeck_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (root, phase, tool), values in sorted(self.durations.items()):
+                labels = f'trace="{root}",phase="{phase}",tool="{tool}"'
+                for bound, count in zip(DURATION_BUCKETS, values):
+                    lines.append(f'holodeck_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'holodeck_span_duration_seconds_bucket{{{labels},le="+Inf"}} {values[-1]}')
+                lines.append(f"holodeck_span_duration_seconds_sum{{{labels}}} {values[-2]:.6f}")
+                lines.append(f"holodeck_span_duration_seconds_count{{{labels}}} {values[-1]}")
+
+            lines += [
+                "# HELP holodeck_span_db_queries_total SQLite statements run during each phase.",
+                "# TYPE holodeck_span_db_queries_total counter",
+            ]
+            for (root, phase, tool), count in sorted(self.db_queries.items()):
+                lines.append(f'holodeck_span_db_queries_total{{trace="{root}",phase="{phase}",tool="{tool}"}} {count}')
+
+            lines += [
+                "# HELP holodeck_llm_tokens_total Tokens reported by the LLM provider, per call.",
+                "# TYPE holodeck_llm_tokens_total counter",
+            ]
+            for (phase, kind), count in sorted(self.tokens.items()):
+                lines.append(f'holodeck_llm_tokens_total{{phase="{phase}",kind="{kind}"}} {count}')
+
+            lines += [
+                "# HELP holodeck_span_errors_total Phases that ended with an exception.",
+                "# TYPE holodeck_span_errors_total counter",
+            ]
+            for (phase, error), count in sorted(self.errors.items()):
+                lines.append(f'holodeck_span_errors_total{{phase="{phase}",error="{error}"}} {count}')
+
+            lines += [
+                "# HELP holodeck_span_outcomes_total How phases ended, e.g. parse=ok/repaired/raw.",
+                "# TYPE holodeck_span_outcomes_total counter",
+            ]
+            for (phase, outcome), count in sorted(self.outcomes.items()):
+                lines.append(f'holodeck_span_outcomes_total{{phase="{phase}",outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# ---------------------------------------------------------------------------
+# Optional OTLP export
+# ---------------------------------------------------------------------------
+
+_tracer = None
+_provider = None
+
+
+def setup_exporter() -> bool:
+    """Start exporting spans over OTLP/HTTP when OTEL_EXPORTER_OTLP_ENDPOINT is set."""
+    global _tracer, _provider
+    if not (TRACING_ENABLED and OTLP_ENDPOINT) or _tracer is not None:
+        return _tracer is not None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        logger.warning(
+            "OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk and "
+            "opentelemetry-exporter-otlp-proto-http are not installed; spans are not exported"
+        )
+        return False
+
+    # The exporter reads OTEL_EXPORTER_OTLP_ENDPOINT (and headers etc.) itself
+    _provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "holodeck")}))
+    _provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    _tracer = _provider.get_tracer("holodeck")
+    logger.info(f"Exporting spans to {OTLP_ENDPOINT}")
+    return True
+
+
+def shutdown_exporter() -> None:
+    """Flush and stop the OTLP exporter."""
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = _provider = None
+
+
+def _start_otel_span(current: Span):
+    from opentelemetry import trace
+
+    parent = current.parent.otel if current.parent is not None else None
+    context = trace.set_span_in_context(parent) if parent is not None else None
+    return _tracer.start_span(current.name, context=context)
+
+
+def _end_otel_span(current: Span) -> None:
+    attributes = {k: v for k, v in current.attrs.items() if isinstance(v, (str, bool, int, float))}
+    attributes["db.queries"] = current.db_queries
+    current.otel.set_attributes(attributes)
+    current.otel.end()
@@ -0,0 +1,164 @@
+"""
+Turn-scoped unit of work for the acting character.
+
+A turn reads the character row once. Mutating tool calls aimed at that
+character change the in-memory copy, and the changes are written back with a
+single UPDATE when the turn ends. The enriched state returned to the client
+(character plus current room title and key) is built from the same copy, so
+/chat needs no extra reads afterwards.
+
+Tool calls that target any other character still go straight to the
+database. Turns for one character are serialized by the agent, so nothing
+else writes the row while a turn holds it.
+
+Game flags work the same way: they are read from flag_store's in-memory copy
+of the adventure, set_flags changes stay on the turn, and the changes are
+written with the character UPDATE in one transaction at the end of the turn.
+"""
+import copy
+import json
+from typing import Any, Dict, List, Optional
+
+from content_cache import content_cache
+from database import execute_query, transaction
+from dice import DiceRoller
+from flag_store import check_flag_changes, flag_store
+from tools import CHARACTER_MATCH, character_from_row, compute_character_changes, plan_move
+
+
+class TurnState:
+    def __init__(self, character_name: str, character: Dict[str, Any], adventure_id: Optional[int] = None,
+                 dice: Optional[DiceRoller] = None):
+        self.character_name = character_name
+        # Decoded character row, or {"error": ...} when it does not exist
+        self.character = character
+        self.adventure_id = character.get("adventure_id", adventure_id)
+        # The session's roller, so a turn's rolls can be replayed
+        self.dice = dice
+        self._dirty: Dict[str, Any] = {}    # column -> new value
+        self._flag_changes: Dict[str, Any] = {}     # flag name -> new value (None deletes)
+
+    @classmethod
+    def load(cls, character_name: str, adventure_id: Optional[int] = None,
+             dice: Optional[DiceRoller] = None) -> "TurnState":
+        row = execute_query(
+            f"SELECT * FROM character WHERE {CHARACTER_MATCH} ORDER BY id LIMIT 1",
+            (character_name, adventure_id, adventure_id),
+            fetch_one=True
+        )
+        character = character_from_row(row) if row else {"error": f"Character {character_name} not found."}
+        turn = cls(character_name, character, adventure_id, dice)
+        # Warm the adventure's flags here so flag reads during the turn cost no round trip
+        flag_store.load(turn.adventure_id)
+        return turn
+
+    @property
+    def found(self) -> bool:
+        return "error" not in self.character
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty or self._flag_changes)
+
+    def owns(self, character_name: Optional[str]) -> bool:
+        """Whether a tool call on `character_name` targets this turn's character."""
+        return self.found and character_name == self.character.get("name")
+
+    # -- in-memory versions of the mutating tools (same names and results) ---
+
+    def update_character_data(self, character_name: str, changes: List[Dict[str, Any]],
+                              adventure_id: Optional[int] = None) -> Dict[str, Any]:
+        try:
+            updates, messages = compute_character_changes(self.character, changes)
+        except (TypeError, ValueError) as e:
+            return {"success": False, "error": str(e), "messages": []}
+
+        for column, value in updates.items():
+            self._dirty[column] = value
+            if column == "inventory_json":
+                self.character["inventory"] = json.loads(value)
+            else:
+                self.character[column] = value
+        return {"success": True, "messages": messages}
+
+    def move_character(self, character_name: str, room_key: Optional[str] = None, direction: Optional[str] = None,
+                       adventure_id: Optional[int] = None) -> Dict[str, Any]:
+        move = plan_move(self.adventure_id, self.character.get("location_room_id"), room_key, direction)
+        if "error" in move:
+            return move
+        room = move["room"]
+        self.character["location_room_id"] = room["id"]
+        self._dirty["location_room_id"] = room["id"]
+        return {"success": True, "message": f"Moved {character_name} to {room['room_key']}"}
+
+    # -- game flags ------------------------------------------------------------
+
+    def get_flags(self, names: List[str], adventure_id: Optional[int] = None) -> Dict[str, Any]:
+        if not isinstance(names, list) or not names:
+            return {"error": "names must be a non-empty list of flag names"}
+        flags = flag_store.get_many(self.adventure_id, names)
+        for name in names:
+            if name in self._flag_changes:
+                flags[name] = self._flag_changes[name]
+        return {"flags": flags}
+
+    def set_flags(self, flags: Dict[str, Any], adventure_id: Optional[int] = None) -> Dict[str, Any]:
+        if self.adventure_id is None:
+            return {"success": False, "error": "No adventure for this turn."}
+        try:
+            check_flag_changes(flags)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+        self._flag_changes.update(flags)
+        return {"success": True, "flags": flags}
+
+    def relevant_flags(self) -> Dict[str, Any]:
+        """Flags for the prompt: the current room's and the adventure-wide ones, with this turn's changes."""
+        graph = content_cache.get_graph(self.adventure_id)
+        room = content_cache.get_room_by_id(self.character.get("location_room_id"))
+        flags = flag_store.relevant(
+            self.adventure_id, room["room_key"] if room else None, graph.room_keys if graph else ()
+        )
+        if self._flag_changes:
+            flags = {**flags, **self._flag_changes}
+            flags = {name: value for name, value in flags.items() if value is not None}
+        return flags
+
+    # -- end of turn ---------------------------------------------------------
+
+    def flush(self) -> bool:
+        """
+        Write all changes made this turn (one character UPDATE plus the flag
+        upserts) in one transaction; returns whether anything was written.
+        """
+        if not self.dirty:
+            return False
+        dirty, self._dirty = self._dirty, {}
+        flag_changes, self._flag_changes = self._flag_changes, {}
+        try:
+            with transaction() as conn:
+                if dirty:
+                    # Column names come from the tools above, never from input
+                    assignments = ", ".join(f"{column} = ?" for column in dirty)
+                    conn.execute(
+                        f"UPDATE character SET {assignments}, updated_at = datetime('now') WHERE id = ?",
+                        (*dirty.values(), self.character["id"])
+                    )
+                if flag_changes:
+                    flag_store.write(conn, self.adventure_id, flag_changes)
+        except Exception:
+            self._dirty = {**dirty, **self._dirty}
+            self._flag_changes = {**flag_changes, **self._flag_changes}
+            raise
+        if flag_changes:
+            flag_store.apply(self.adventure_id, flag_changes)
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State for the client: the character plus its current room's title and key."""
+        state = copy.deepcopy(self.character)
+        room = content_cache.get_room_by_id(state.get("location_room_id"))
+        if room:
+            state["location_title"] = room["title"]
+            state["location_key"] = room["room_key"]
+        return state
@@ -1,56 +1,82 @@
-from agent import process_player_action
-from tools import get_character_data
-from init_db import init_db
-import json
-import sqlite3
-
-def test_game_loop():
-    print("--- Starting Verification ---")
-    
-    # 1. Reset DB
-    import os
-    if os.path.exists("holodeck.db"):
-        os.remove("holodeck.db")
-    init_db()
-    
-    character_name = "Kraven"
-    history = []
-
-    # 2. Test 1: Initial Look
-    print("\n[Test 1] Action: 'Look around'")
-    response = process_player_action("Look around", character_name, history)
-    print("Response:", json.dumps(response, indent=2))
-    
-    if not response.get("narration"):
-        print("FAIL: No narration in response.")
-        return
-    else:
-        print("PASS: Narration received.")
-    
-    history.append({"role": "user", "content": "Look around"})
-    history.append({"role": "assistant", "content": response.get("narration")})
-
-    # 3. Test 2: Move to Room 2
-    # We need to make sure the AI knows about the exit.
-    print("\n[Test 2] Action: 'I enter the tunnel to the glacier'")
-    response = process_player_action("I enter the tunnel to the glacier", character_name, history)
-    print("Response:", json.dumps(response, indent=2))
-
-    # Verify DB update
-    char_data = get_character_data(character_name)
-    # Room 1 is ID 1. Room 2 is ID 2.
-    # The exit from Room 1 to Room 2 is 'inward' -> Room 2.
-    # We hope the AI called update_character_data or similar, OR just narrated it.
-    # In MVP, we rely on the AI to call tools or for us to parse the response actions if we had them.
-    # But my agent.py currently just returns the narration and executes tools internally.
-    # Does 'agent.py' handle location updates?
-    # The tool `update_character_data` only handles hp/gold/inventory/conditions?
-    # Wait, `update_character_data` in `tools.py` does NOT handle location?
-    # I should check `tools.py`. It probably doesn't based on my memory.
-    # I need to fix `tools.py` to allow location updates if the AI decides to move the player.
-    # Or add `update_location` tool.
-    
-    print(f"Current Location ID: {char_data.get('location_room_id')}")
+"""
+End-to-end check of the game loop: the bench_suite scenarios through the API.
+
+Plays every scenario once on a throwaway database, with the LLM replayed
+from the recorded cassette (no network, no API key) and dice seeded, then
+checks that every turn produced narration and that the world ended up where
+the script leaves it: the potion drunk, the dice rolled, Kraven down in
+room_3 and the murals' flag set. Exits non-zero on any failure.
+
+--live plays the same lines against the provider in OPENAI_API_KEY /
+LLM_BASE_URL instead; the model is free to play them differently, so only
+the narration checks apply.
+
+Usage: python verify_game_loop.py [--live] [--cassette PATH]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+from bench_suite import CASSETTE_PATH, FAILED, SCENARIOS, SUITE_DICE_SEED, play_turn
+from bench_utils import setup_database
+
+
+def check(failures, ok, message):
+    print(f"{'PASS' if ok else 'FAIL'}: {message}")
+    if not ok:
+        failures.append(message)
+
+
+async def main(args):
+    import httpx
+    import llm_replay
+    from flag_store import flag_store
+    from main import app
+
+    if not args.live:
+        llm_replay.use("replay", args.cassette)
+
+    failures = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://verify", timeout=120) as http:
+        rolls = 0
+        for scenario, (endpoint, lines) in SCENARIOS.items():
+            print(f"\n--- {scenario} ({endpoint}) ---")
+            for line in lines:
+                result = await play_turn(http, endpoint, scenario, line)
+                narration = result.get("narration") or ""
+                rolls += len(result.get("dice_rolls") or [])
+                print(f"> {line}\n  {narration[:100]}")
+                check(failures, narration and narration not in FAILED and result.get("event") != "error",
+                      f"'{line}' was narrated")
+
+        state = (await http.get("/state", params={"character_name": "Kraven"})).json()
+
+    if not args.live:
+        print("\n--- final state ---")
+        items = [item.get("name") if isinstance(item, dict) else item for item in state.get("inventory") or []]
+        check(failures, "Potion of Healing" not in items, "the potion of healing was drunk")
+        check(failures, rolls > 0, f"dice were rolled ({rolls})")
+        check(failures, state.get("location_key") == "room_3", f"Kraven is in room_3 ({state.get('location_key')})")
+        flags = flag_store.get_many(state.get("adventure_id"), ["room_1.handholds_found", "room_2.murals_read"])
+        check(failures, all(flags.values()), f"the search and the murals set their flags {flags}")
+        check(failures, llm_replay.replay_stats["misses"] == 0, "every LLM call was on the cassette")
+
+    print(f"\n{'FAILED: ' + str(len(failures)) + ' check(s)' if failures else 'All checks passed.'}")
+    return 1 if failures else 0
+
 
 if __name__ == "__main__":
-    test_game_loop()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="call the real provider instead of the cassette")
+    parser.add_argument("--cassette", default=CASSETTE_PATH)
+    args = parser.parse_args()
+
+    os.environ["DICE_SEED"] = SUITE_DICE_SEED
+    if not args.live:
+        os.environ.setdefault("OPENAI_API_KEY", "replay")
+    import logging
+    logging.disable(logging.WARNING)
+    setup_database()
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,85 @@
+"""
+Check of DM reply parsing: every reply below must come out with the expected
+outcome (ok / repaired / raw) and narration, and NarrationStream must pull
+the same narration out of the reply fed one character at a time. Also times
+parse_game_response per outcome. Exits non-zero on any mismatch.
+
+Usage: python verify_game_response.py [--iterations 20000]
+"""
+import argparse
+import logging
+import sys
+import time
+
+from game_response import GAME_RESPONSE_SCHEMA, NarrationStream, parse_game_response
+
+VALID = '{"narration": "The harpy shrieks.", "out_of_character": null, "dice_rolls": [{"purpose": "attack", "notation": "1d20+5", "result": 17, "dc": 13, "success": true}], "next_prompt_suggestion": null}'
+
+# (label, reply, expected outcome, expected narration)
+CASES = [
+    ("valid", VALID, "ok", "The harpy shrieks."),
+    ("minimal", '{"narration": "You wait."}', "ok", "You wait."),
+    ("escapes", '{"narration": "caf\\u00e9 \\ud83d\\ude00 \\"hi\\""}', "ok", 'café 😀 "hi"'),
+    ("empty", "", "ok", "The DM is silent."),
+    ("code fence", '```json\n{"narration": "Snow falls."}\n```', "repaired", "Snow falls."),
+    ("prose around", 'Here you go: {"narration": "Snow falls."} Enjoy!', "repaired", "Snow falls."),
+    ("trailing commas", '{"narration": "Snow, ice.", "dice_rolls": [],}', "repaired", "Snow, ice."),
+    ("raw newline", '{"narration": "Line one\nline two"}', "repaired", "Line one\nline two"),
+    ("cut in narration", '{"narration": "The ice cracks under', "repaired", "The ice cracks under"),
+    ("cut in later field", '{"narration": "The ice cracks.", "out_of_character": "Rolled 1', "repaired", "The ice cracks."),
+    ("cut in dice_rolls", '{"narration": "The ice cracks.", "dice_rolls": [{"purpose": "save", "nota', "repaired", "The ice cracks."),
+    ("aliased fields", '{"text": "The ice cracks.", "out_of_character_notes": "DC 12"}', "repaired", "The ice cracks."),
+    ("bad optional field", '{"narration": "The ice cracks.", "dice_rolls": "none"}', "repaired", "The ice cracks."),
+    ("plain text", "The ice cracks under your boots.", "raw", "The ice cracks under your boots."),
+    ("no narration", '{"foo": 1}', "raw", '{"foo": 1}'),
+]
+
+# Streaming sees the reply as sent: it cannot rename fields, and prose before
+# the object is forwarded as plain narration
+STREAM_DIFFERS = {"aliased fields", "prose around"}
+
+
+def check_cases() -> int:
+    failures = 0
+    for label, reply, outcome, narration in CASES:
+        result, got = parse_game_response(reply)
+        stream = NarrationStream()
+        for c in reply:
+            stream.feed(c)
+        streamed = stream.text.strip() if reply else "The DM is silent."
+        ok = got == outcome and result["narration"] == narration
+        if outcome != "raw" and label not in STREAM_DIFFERS and streamed != narration:
+            ok = False
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<20} {got:<9} {result['narration']!r:.50}"
+              + ("" if ok else f"  (expected {outcome} {narration!r}, streamed {streamed!r})"))
+    return failures
+
+
+def time_parsing(iterations: int) -> None:
+    for outcome in ("ok", "repaired", "raw"):
+        replies = [reply for _, reply, expected, _ in CASES if expected == outcome and reply]
+        start = time.perf_counter()
+        for i in range(iterations):
+            parse_game_response(replies[i % len(replies)])
+        elapsed = time.perf_counter() - start
+        print(f"parse latency {outcome:<9} {elapsed / iterations * 1e6:7.1f}us per reply")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"schema properties: {sorted(GAME_RESPONSE_SCHEMA['properties'])}")
+    failures = check_cases()
+    time_parsing(args.iterations)
+    if failures:
+        print(f"{failures} case(s) failed")
+        sys.exit(1)
+    print("all cases passed")
+
+
+if __name__ == "__main__":
+    main()
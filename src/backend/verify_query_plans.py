@@ -0,0 +1,198 @@
+"""
+Query-plan regression check for the hot lookups in tools.py and main.py.
+
+Builds a synthetic multi-adventure database (default 10k rooms, 100k
+characters), exercises every tool and API lookup while tracing the SQL it
+runs, then EXPLAINs each distinct statement. Exits non-zero if any of them
+falls back to a full table scan. With --bench it also times each statement.
+
+Usage: python verify_query_plans.py [--rooms 10000] [--characters 100000] [--bench]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+
+ADVENTURES = 10
+MONSTER_TEMPLATES = 50
+
+# Statements that are meant to read whole tables (content cache warm-up)
+ALLOWED_FULL_SCANS = re.compile(r"^SELECT \* FROM (room|room_exit|monster|rule) ORDER BY id$")
+
+
+def generate_synthetic_data(conn, rooms: int, characters: int, seed: int = 7) -> None:
+    """Fill an empty schema with `rooms` rooms and `characters` characters across ADVENTURES adventures."""
+    rng = random.Random(seed)
+    rooms_per_adventure = max(1, rooms // ADVENTURES)
+
+    conn.executemany(
+        "INSERT INTO adventure (id, name, description) VALUES (?, ?, ?)",
+        [(a, f"Synthetic Adventure {a}", "Generated for query-plan checks") for a in range(1, ADVENTURES + 1)]
+    )
+
+    room_rows, exit_rows = [], []
+    room_id = 0
+    for a in range(1, ADVENTURES + 1):
+        for i in range(rooms_per_adventure):
+            room_id += 1
+            room_rows.append((room_id, a, f"room_{i + 1}", f"Room {i + 1}", "A cold room.", "A very cold room."))
+            if i > 0:
+                exit_rows.append((a, room_id, "back", room_id - 1, "The way you came."))
+                exit_rows.append((a, room_id - 1, "deeper", room_id, "Further in."))
+    conn.executemany(
+        "INSERT INTO room (id, adventure_id, room_key, title, short_description, full_description) VALUES (?, ?, ?, ?, ?, ?)",
+        room_rows
+    )
+    conn.executemany(
+        "INSERT INTO room_exit (adventure_id, from_room_id, direction, to_room_id, description) VALUES (?, ?, ?, ?, ?)",
+        exit_rows
+    )
+    conn.executemany(
+        "UPDATE adventure SET starting_room_id = ? WHERE id = ?",
+        [((a - 1) * rooms_per_adventure + 1, a) for a in range(1, ADVENTURES + 1)]
+    )
+
+    conn.executemany(
+        "INSERT INTO monster (id, name, srd_name, base_hp, base_ac, meta_json) VALUES (?, ?, ?, ?, ?, ?)",
+        [(m, f"Monster {m}", f"Srd {m}", 10 + m, 10 + m % 8, json.dumps({"ac": 10 + m % 8, "hp": 10 + m}))
+         for m in range(1, MONSTER_TEMPLATES + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO monster_instance (adventure_id, room_id, monster_id, instance_name, current_hp, status) VALUES (?, ?, ?, ?, ?, ?)",
+        [((r - 1) // rooms_per_adventure + 1, r, rng.randint(1, MONSTER_TEMPLATES), f"Foe {r}", 20,
+          "alive" if rng.random() < 0.8 else "dead")
+         for r in range(1, room_id + 1, 2)]
+    )
+
+    inventory = json.dumps([{"name": "Torch", "qty": 3}])
+    char_rows = []
+    for c in range(1, characters + 1):
+        a = rng.randint(1, ADVENTURES)
+        location = (a - 1) * rooms_per_adventure + rng.randint(1, rooms_per_adventure)
+        char_rows.append((a, f"Hero{c}", "Fighter", 3, 24, 24, '{"str":16}', '{}', inventory, 15, location))
+    conn.executemany(
+        """INSERT INTO character (adventure_id, name, class, level, hp, max_hp, abilities_json,
+           skills_json, inventory_json, gold, location_room_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        char_rows
+    )
+    conn.commit()
+
+
+def statement_shape(sql: str) -> str:
+    """Collapse literals so the same statement with different values groups together."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(\.\d+)?\b", "?", sql)
+    return " ".join(sql.split())
+
+
+def exercise_hot_paths(characters: int) -> None:
+    """Run every tool and API lookup that touches the database."""
+    import main
+    import tools
+    from session_store import session_store
+
+    name = f"Hero{characters // 2}"
+    adventure_id = tools.get_character_data(name)["adventure_id"]
+    tools.get_character_data(name, adventure_id)
+    tools.update_character_data(name, [
+        {"field": "hp", "operation": "decrement", "value": 1},
+        {"field": "inventory", "operation": "add_item", "value": {"name": "Rope"}},
+    ], adventure_id)
+    # Moves are checked against the room graph; at least one of these has an exit
+    tools.move_character(name, direction="deeper")
+    tools.move_character(name, direction="back", adventure_id=adventure_id)
+    tools.get_room_details("room_1", adventure_id)
+    tools.rules_lookup("grapple")
+    tools.get_monster_stats("Monster 7")
+    tools.set_flags({"room_1.door_open": True, "quest.started": None}, adventure_id)
+    from flag_store import flag_store
+    flag_store.invalidate(adventure_id)
+    tools.get_flags(["room_1.door_open"], adventure_id)
+    session_store._load(name)
+
+    async def api_calls():
+        await main.get_state(character_name=name)
+        await main.get_session_history(session_id=name)
+    asyncio.run(api_calls())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10_000)
+    parser.add_argument("--characters", type=int, default=100_000)
+    parser.add_argument("--bench", action="store_true", help="also time each hot statement")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="holodeck-plans-"), "holodeck.db")
+    os.environ.setdefault("OPENAI_API_KEY", "verify")
+    import logging
+    logging.disable(logging.INFO)
+
+    from database import get_db_connection
+    conn = get_db_connection()
+    with open(os.path.join(HERE, "schema.sql")) as f:
+        conn.executescript(f.read())
+    start = time.perf_counter()
+    generate_synthetic_data(conn, args.rooms, args.characters)
+    conn.execute("ANALYZE")
+    print(f"Generated {args.rooms} rooms / {args.characters} characters in {time.perf_counter() - start:.1f}s")
+
+    from content_cache import content_cache
+    content_cache.warm()
+
+    # Trace every statement the hot paths run, on this thread and on the tool
+    # pool the API handlers hand their queries to
+    statements = {}
+    def trace(sql):
+        if sql.lstrip().upper().startswith(("SELECT", "UPDATE", "INSERT", "DELETE")):
+            statements.setdefault(statement_shape(sql), sql)
+    conn.set_trace_callback(trace)
+
+    import executor
+    executor.tool_executor.shutdown(wait=True)
+    executor.tool_executor = ThreadPoolExecutor(
+        max_workers=1, initializer=lambda: get_db_connection().set_trace_callback(trace)
+    )
+
+    exercise_hot_paths(args.characters)
+    executor.tool_executor.shutdown(wait=True)
+    conn.set_trace_callback(None)
+
+    failures = 0
+    for shape, sql in sorted(statements.items()):
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        scans = [
+            step for step in plan
+            if step.startswith("SCAN ") and "VIRTUAL TABLE" not in step and "USING" not in step
+        ]
+        full_scan = bool(scans) and not ALLOWED_FULL_SCANS.match(shape)
+        failures += full_scan
+        print(f"{'FAIL' if full_scan else 'ok  '}  {shape}")
+        for step in plan:
+            print(f"        {step}")
+
+        if args.bench and sql.lstrip().upper().startswith("SELECT"):
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                conn.execute(sql).fetchall()
+            per_query = (time.perf_counter() - start) / args.iterations
+            print(f"        {per_query * 1e6:.1f} us/query")
+
+    if failures:
+        print(f"\n{failures} statement(s) use a full table scan.")
+        sys.exit(1)
+    print(f"\nAll {len(statements)} statements use indexes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Upgrade check: a database built by the first release must come through API
+startup (migrations + content sync) intact.
+
+Builds a database the way the first init_db did - fixtures/schema_v0.sql, the
+rules parsed with its parser (which kept the closing '**' of every label, so
+topics read "** grappled"), the adventure script run as-is, one character -
+then runs init_db.prepare_database() on it twice and checks that:
+  - the schema is at the current version,
+  - every rule is there once, under its fixed topic, and indexed once,
+  - rules_lookup finds one match per rule,
+  - the character kept its state,
+  - a second startup changes nothing.
+Exits non-zero on any failure.
+
+Usage: python verify_upgrade.py
+"""
+import json
+import os
+import re
+import sqlite3
+import tempfile
+
+from bench_utils import HERE
+
+V0_SCHEMA_PATH = os.path.join(HERE, "fixtures", "schema_v0.sql")
+
+
+def v0_rules(content):
+    """Rules as the first init_db parsed them."""
+    rules = []
+    for section in re.split(r'^###\s+', content, flags=re.MULTILINE)[1:]:
+        fields, points, in_mechanics = {}, [], False
+        for line in section.strip().split('\n')[1:]:
+            line = line.strip()
+            for label in ("Topic", "Category", "Summary", "Tags"):
+                if line.startswith(f"- **{label}:**"):
+                    fields[label] = line.split(":", 1)[1].strip()
+            if line.startswith("- **Key Mechanics:**"):
+                in_mechanics = True
+            elif in_mechanics and line.startswith("-"):
+                points.append(line.lstrip("- ").strip())
+        if fields.get("Topic") and fields.get("Category"):
+            rules.append((fields["Topic"], fields["Category"], fields.get("Summary", ""),
+                          json.dumps({"points": points}) if points else "{}", fields.get("Tags", "")))
+    return rules
+
+
+def build_v0_database(path, rules_path, adventure_path):
+    conn = sqlite3.connect(path)
+    with open(V0_SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    with open(rules_path, encoding="utf-8") as f:
+        rules = v0_rules(f.read())
+    conn.executemany("INSERT INTO rule (topic, category, summary, mechanics_json, tags) VALUES (?, ?, ?, ?, ?)", rules)
+    with open(adventure_path, encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.execute(
+        """INSERT INTO character (adventure_id, name, class, level, hp, max_hp, abilities_json, skills_json,
+                                    inventory_json, gold, location_room_id)
+           VALUES (1, 'Kraven', 'Fighter', 3, 11, 24, '{}', '{}', '[]', 42, 3)"""
+    )
+    conn.commit()
+    conn.close()
+    return len(rules)
+
+
+def check(failures, ok, message):
+    print(f"{'PASS' if ok else 'FAIL'}: {message}")
+    if not ok:
+        failures.append(message)
+
+
+def main():
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="holodeck-upgrade-"), "holodeck.db")
+    import logging
+    logging.disable(logging.WARNING)
+    import init_db
+    from content_cache import content_cache
+    from database import get_db_connection
+    from migrations import SCHEMA_VERSION
+
+    legacy = build_v0_database(os.environ["DB_PATH"], init_db.SRD_RULES_PATH, init_db.ADVENTURE_SQL_PATH)
+    print(f"v0 database with {legacy} rules at {os.environ['DB_PATH']}")
+
+    failures = []
+    init_db.prepare_database()
+    conn = get_db_connection()
+    count = lambda sql: conn.execute(sql).fetchone()[0]
+
+    check(failures, count("PRAGMA user_version") == SCHEMA_VERSION, f"schema at version {SCHEMA_VERSION}")
+    check(failures, count("SELECT count(*) FROM rule") == legacy, f"{legacy} rules ({count('SELECT count(*) FROM rule')})")
+    check(failures, count("SELECT count(*) FROM rule WHERE topic LIKE '**%'") == 0, "no topic keeps the old '**' prefix")
+    check(failures, count("SELECT count(*) FROM rule_fts") == legacy, f"{legacy} rules indexed ({count('SELECT count(*) FROM rule_fts')})")
+    matches = [r["topic"] for r in content_cache.search_rules("grappling", limit=10)]
+    bare = [topic.lstrip("* ") for topic in matches]
+    check(failures, bare.count("grappled") == 1 and len(set(bare)) == len(bare),
+          f"rules_lookup('grappling') finds each rule once {matches}")
+    kraven = conn.execute("SELECT hp, gold, location_room_id FROM character WHERE name = 'Kraven'").fetchone()
+    check(failures, tuple(kraven) == (11, 42, 3), f"Kraven kept hp, gold and room {tuple(kraven)}")
+    check(failures, not init_db.sync_content(), "a second startup changes nothing")
+
+    print(f"\n{'FAILED: ' + str(len(failures)) + ' check(s)' if failures else 'All checks passed.'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,9 +1,11 @@
 import React, { useState, useEffect } from 'react';
 import ChatInterface from './components/ChatInterface';
 import GameStatus from './components/GameStatus';
-import { sendMessage, getGameState } from './api';
+import { streamMessage, getGameState, getSessionHistory } from './api';
 
 const CHARACTER_NAME = "Kraven"; // Hardcoded for MVP
+const SESSION_ID = CHARACTER_NAME; // One server-side session per character for now
+const GREETING = { role: 'assistant', content: "Welcome to the Wailing Glacier. The cold wind bites at your face..." };
 
 function App() {
   const [history, setHistory] = useState([]);
@@ -13,10 +15,19 @@ function App() {
   // Initial load
   useEffect(() => {
     refreshState();
-    // Add initial greeting if history is empty
-    setHistory([{ role: 'assistant', content: "Welcome to the Wailing Glacier. The cold wind bites at your face..." }]);
+    restoreHistory();
   }, []);
 
+  const restoreHistory = async () => {
+    try {
+      const session = await getSessionHistory(SESSION_ID);
+      // Add initial greeting if history is empty
+      setHistory(session.history?.length ? session.history : [GREETING]);
+    } catch (e) {
+      setHistory([GREETING]);
+    }
+  };
+
   const refreshState = async () => {
     try {
       const state = await getGameState(CHARACTER_NAME);
@@ -33,9 +44,15 @@ function App() {
     setLoading(true);
 
     try {
-      // Send to backend (convert history to format backend expects)
-      // Backend expects session_history with 'role' and 'content'
-      const response = await sendMessage(text, CHARACTER_NAME, newHistory);
+      // Backend keeps the conversation per session; only the new message is sent.
+      // Narration tokens are shown as they arrive; the final event replaces them.
+      let streamed = '';
+      const response = await streamMessage(text, CHARACTER_NAME, SESSION_ID, {
+        onNarration: (delta) => {
+          streamed += delta;
+          setHistory([...newHistory, { role: 'assistant', content: streamed }]);
+        }
+      });
 
       const assistantMsg = {
         role: 'assistant',
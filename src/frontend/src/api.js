@@ -5,11 +5,12 @@ export async function checkHealth() {
     return res.json();
 }
 
-export async function sendMessage(message, characterName, session_history) {
+// History is kept server-side per session; only the new message is sent.
+export async function sendMessage(message, characterName, sessionId) {
     const res = await fetch(`${API_URL}/chat`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message, character_name: characterName, session_history })
+        body: JSON.stringify({ message, character_name: characterName, session_id: sessionId })
     });
     if (!res.ok) {
         const errorData = await res.json().catch(() => ({}));
@@ -18,6 +19,62 @@ export async function sendMessage(message, characterName, session_history) {
     return res.json();
 }
 
+// Streams a turn from /chat/stream (Server-Sent Events).
+// handlers: onToolCall({name, arguments}), onToolResult({name, result}),
+//           onNarration(delta) for each narration token chunk.
+// Resolves with the final payload ({narration, out_of_character, updated_state}).
+export async function streamMessage(message, characterName, sessionId, handlers = {}) {
+    const res = await fetch(`${API_URL}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        body: JSON.stringify({ message, character_name: characterName, session_id: sessionId })
+    });
+    if (!res.ok || !res.body) {
+        const errorData = await res.json().catch(() => ({}));
+        throw new Error(errorData.detail || `Request failed with status ${res.status}`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let final = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            for (const line of raw.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            if (!data) continue;
+            const payload = JSON.parse(data);
+
+            if (event === 'tool_call') handlers.onToolCall?.(payload);
+            else if (event === 'tool_result') handlers.onToolResult?.(payload);
+            else if (event === 'narration') handlers.onNarration?.(payload.delta);
+            else if (event === 'done') final = payload;
+            else if (event === 'error') throw new Error(payload.detail || 'Stream failed');
+        }
+    }
+
+    if (!final) throw new Error('Stream ended before the turn completed');
+    return final;
+}
+
+export async function getSessionHistory(sessionId) {
+    const res = await fetch(`${API_URL}/session/history?session_id=${encodeURIComponent(sessionId)}`);
+    return res.json();
+}
+
 export async function getGameState(characterName) {
     const res = await fetch(`${API_URL}/state?character_name=${characterName}`);
     return res.json();